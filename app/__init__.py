@@ -4,15 +4,41 @@ Fábrica de aplicação Flask
 """
 
 import os
+import atexit
 import logging
 import sys
 from flask import Flask
 from flask_pymongo import PyMongo
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from app.config import config
+from app.utils.conexao_mongo import conexao_mongo, opcoes_cliente
+from app.utils.instrumentacao_mongo import instrumentacao_mongo
+from app.utils import cache_http, metricas, profiler
+from app.utils.executor import fila_nativa, iniciar_thread_nativa
+from app.utils.provedor_json import ProvedorJSON
 
 # Instância do MongoDB
 mongo = PyMongo()
 
+# Thread que grava os logs da fila no arquivo (ver _setup_logging)
+_listener_log = None
+
+
+class _ListenerLog(QueueListener):
+    """QueueListener que grava em uma thread nativa também com workers gevent"""
+    
+    def start(self):
+        self._esperar = iniciar_thread_nativa(self._monitor)
+    
+    def stop(self):
+        self.enqueue_sentinel()
+        self._esperar()
+        # Fecha o arquivo agora: liberado só na finalização do interpretador,
+        # o handler gera erros de lock com o gevent
+        for handler in self.handlers:
+            handler.close()
+        self.handlers = ()
+
 def _check_dependencies():
     """Verifica dependências críticas na inicialização"""
     logger = logging.getLogger(__name__)
@@ -57,29 +83,34 @@ def create_app(config_name='development'):
     # Verifica dependências críticas (comentado - pode travar em inicializações)
     # _check_dependencies()
     
-    # Configurações
-    app.config['MONGO_URI'] = os.getenv('MONGO_URI', 'mongodb://localhost:27017/comissao_db')
-    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
-    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB
-    app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', './uploads')
+    # Configurações (app/config.py, valores lidos das variáveis de ambiente)
+    app.config.from_object(config.get(config_name, config['default']))
+    
+    # Serialização JSON com orjson (ObjectId, datetime, Decimal128, NumPy)
+    app.json = ProvedorJSON(app)
     
     # Criar pasta de uploads se não existir
     if not os.path.exists(app.config['UPLOAD_FOLDER']):
         os.makedirs(app.config['UPLOAD_FOLDER'])
     
-    # Inicializa MongoDB
-    mongo.init_app(app)
+    # Inicializa MongoDB (pool/timeouts da configuração, contagem de comandos
+    # por requisição, métricas do pool e falha rápida com o banco fora)
+    instrumentacao_mongo.init_app(app)
+    conexao_mongo.init_app(app)
+    mongo.init_app(
+        app,
+        event_listeners=[instrumentacao_mongo.listener, *conexao_mongo.listeners],
+        **opcoes_cliente(app.config)
+    )
+    
+    # Métricas Prometheus (latência por rota)
+    metricas.init_app(app)
+    
+    # Profiler de requisições lentas / sob demanda
+    profiler.init_app(app)
     
-    # Desabilita cache para modo desenvolvimento
-    @app.after_request
-    def disable_cache(response):
-        response.cache_control.no_cache = True
-        response.cache_control.no_store = True
-        response.cache_control.must_revalidate = True
-        response.cache_control.max_age = 0
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
-        return response
+    # Compressão e cache HTTP (desabilitado em desenvolvimento)
+    cache_http.init_app(app)
     
     # Setup de logging
     _setup_logging(app)
@@ -96,25 +127,57 @@ def create_app(config_name='development'):
     return app
 
 
+def _formatter_log():
+    """Formatter JSON (python-json-logger) ou texto se a lib não estiver instalada"""
+    try:
+        from pythonjsonlogger import jsonlogger
+        return jsonlogger.JsonFormatter(
+            '%(asctime)s %(levelname)s %(name)s %(message)s %(pathname)s %(lineno)d',
+            rename_fields={'levelname': 'nivel', 'name': 'logger', 'asctime': 'data'},
+            json_ensure_ascii=False
+        )
+    except ImportError:
+        return logging.Formatter(
+            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
+        )
+
+
 def _setup_logging(app):
-    """Configura logging da aplicação"""
+    """Configura logging da aplicação
+    
+    Os registros dos loggers 'app.*' vão para uma fila (QueueHandler) e uma
+    thread (QueueListener) grava no arquivo rotativo em JSON, tirando o I/O
+    de disco da thread da requisição. LOG_LEVEL=DEBUG habilita os dumps
+    completos de payloads (resumos, linhas de upload).
+    """
+    global _listener_log
     
     if not os.path.exists('logs'):
         os.mkdir('logs')
     
-    file_handler = RotatingFileHandler(
-        'logs/comissao.log',
-        maxBytes=10240000,
-        backupCount=10
-    )
-    
-    file_handler.setFormatter(logging.Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-    ))
+    nivel = getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO)
+    app.logger.setLevel(nivel)
+    
+    # create_app pode ser chamado mais de uma vez no mesmo processo (testes,
+    # benchmarks): a fila e o arquivo são configurados uma única vez
+    if _listener_log is None:
+        file_handler = RotatingFileHandler(
+            'logs/comissao.log',
+            maxBytes=10240000,
+            backupCount=10
+        )
+        file_handler.setFormatter(_formatter_log())
+        file_handler.setLevel(logging.DEBUG)
+        
+        # Fila original: com o monkey patching do gevent, queue.SimpleQueue
+        # vira cooperativa e não pode ser lida pela thread nativa
+        fila = fila_nativa()
+        _listener_log = _ListenerLog(fila, file_handler, respect_handler_level=True)
+        _listener_log.start()
+        atexit.register(_listener_log.stop)
+        
+        app.logger.addHandler(QueueHandler(fila))
     
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.setLevel(logging.INFO)
     app.logger.info('Sistema de Comissão iniciado')
 
 
@@ -148,5 +211,7 @@ def _register_cli_commands(app):
     def init_db():
         """Inicializa o banco de dados"""
         print("Inicializando banco de dados...")
-        # Aqui você pode criar índices, coleções iniciais, etc
+        from app.services import PeriodoService
+        PeriodoService.garantir_indices()
+        print("✓ Índices de período criados")
         print("✓ Banco de dados inicializado")
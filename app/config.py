@@ -11,9 +11,54 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
     MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/comissao_db')
     
+    # Cliente do MongoDB (um pool por processo do gunicorn: o total de
+    # conexões no servidor é workers x MONGO_MAX_POOL_SIZE)
+    MONGO_APPNAME = os.getenv('MONGO_APPNAME', 'comissao')
+    MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 10))
+    MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', 0))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 300000))  # Fecha conexões ociosas há 5 min
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000))  # Espera por conexão livre no pool
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))  # Padrão do pymongo: 30 s
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000))
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', 60000))  # Maior operação (relatórios do mês)
+    MONGO_COMPRESSORS = os.getenv('MONGO_COMPRESSORS', 'zstd,zlib')  # Em ordem de preferência ('' = sem compressão)
+    MONGO_READ_PREFERENCE = os.getenv('MONGO_READ_PREFERENCE', 'primary')
+    
     # Upload
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', './uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
+    UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', os.cpu_count() or 1))  # Processos no upload em lote
+    UPLOAD_ZIP_MAX_ARQUIVOS = int(os.getenv('UPLOAD_ZIP_MAX_ARQUIVOS', 100))  # Arquivos por .zip no upload em lote
+    UPLOAD_ZIP_MAX_BYTES = int(os.getenv('UPLOAD_ZIP_MAX_BYTES', 256 * 1024 * 1024))  # Total descompactado por .zip
+    RELATORIO_WORKERS = int(os.getenv('RELATORIO_WORKERS', 1))  # Processos no cálculo do resumo/simulação (1 = sem paralelismo)
+    
+    # Instrumentação do MongoDB
+    MONGO_N_MAIS_1_LIMITE = int(os.getenv('MONGO_N_MAIS_1_LIMITE', 20))  # Repetições do mesmo comando por requisição
+    SAUDE_MONGO_TIMEOUT = float(os.getenv('SAUDE_MONGO_TIMEOUT', 2))  # Segundos para o ping em /api/saude
+    
+    # Profiler de requisições (cabeçalho X-Perfil, ?perfil= ou limiar de latência)
+    PROFILER_HABILITADO = os.getenv('PROFILER_HABILITADO', 'False').lower() in ('true', '1')
+    PROFILER_LIMIAR_MS = float(os.getenv('PROFILER_LIMIAR_MS', 0))  # 0 = só sob demanda
+    PROFILER_INTERVALO_MS = float(os.getenv('PROFILER_INTERVALO_MS', 5))  # Intervalo de amostragem
+    PROFILER_MAX_ARQUIVOS = int(os.getenv('PROFILER_MAX_ARQUIVOS', 50))
+    PROFILER_PASTA = os.getenv('PROFILER_PASTA', os.path.join('logs', 'perfis'))
+    
+    # Cache HTTP e compressão (app/utils/cache_http.py)
+    CACHE_HTTP_HABILITADO = os.getenv('CACHE_HTTP_HABILITADO', 'False').lower() in ('true', '1')  # False = no-cache em tudo
+    CACHE_ESTATICOS_MAX_AGE = int(os.getenv('CACHE_ESTATICOS_MAX_AGE', 31536000))  # 1 ano: URL muda com o conteúdo
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))  # Bytes
+    COMPRESS_ALGORITHM = os.getenv('COMPRESS_ALGORITHM', 'br,gzip')  # Em ordem de preferência
+    COMPRESS_STREAMS = False  # O Flask-Compress acumularia o streaming NDJSON inteiro para comprimir
+    
+    # Snapshots Arrow das linhas por lote (mmap compartilhado entre os workers) (app/utils/snapshot_linhas.py)
+    SNAPSHOT_LINHAS_HABILITADO = os.getenv('SNAPSHOT_LINHAS_HABILITADO', 'True').lower() in ('true', '1')
+    SNAPSHOT_LINHAS_PASTA = os.getenv('SNAPSHOT_LINHAS_PASTA', os.path.join('data', 'snapshots'))
+    
+    # Listagens paginadas da API (?page=&per_page=)
+    API_MAX_POR_PAGINA = int(os.getenv('API_MAX_POR_PAGINA', 500))  # per_page acima disso é reduzido
+    
+    # Simulação de tabelas de alíquota (POST /api/simulacao)
+    SIMULACAO_MAX_CENARIOS = int(os.getenv('SIMULACAO_MAX_CENARIOS', 20))  # Cenários por requisição (além do 'atual')
     
     # Flask
     JSON_SORT_KEYS = False
@@ -32,6 +77,7 @@ class ProductionConfig(Config):
     
     DEBUG = False
     TESTING = False
+    CACHE_HTTP_HABILITADO = os.getenv('CACHE_HTTP_HABILITADO', 'True').lower() in ('true', '1')
 
 
 class TestingConfig(Config):
@@ -40,6 +86,7 @@ class TestingConfig(Config):
     DEBUG = True
     TESTING = True
     MONGO_URI = 'mongodb://localhost:27017/comissao_db_test'
+    SNAPSHOT_LINHAS_HABILITADO = False
 
 
 # Dict de configurações
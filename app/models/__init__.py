@@ -3,7 +3,9 @@
 Modelos de dados para MongoDB
 """
 
+from dataclasses import dataclass, field
 from datetime import datetime
+from typing import NamedTuple
 from bson import ObjectId
 
 class VendedorModel:
@@ -146,3 +148,51 @@ class FormaRecebimentoModel:
             'data_cadastro': datetime.now(),
             'data_atualizacao': datetime.now()
         }
+
+
+# ========== REGISTROS EM MEMÓRIA DOS RELATÓRIOS ==========
+# Os relatórios percorrem milhares de linhas: em vez de carregar o documento
+# Mongo inteiro (todas as colunas do CSV + _id) e dicts aninhados por pedido,
+# usam registros compactos com apenas os campos do cálculo.
+
+class LinhaProposta(NamedTuple):
+    """Linha de proposta (uma forma de recebimento de um pedido)"""
+    
+    pessoa: str
+    pedido: object
+    doc_fiscal: str
+    modelo: str  # em maiúsculas
+    valor: float
+    forma_recebimento: str
+    numero_parcelas: int
+
+
+@dataclass(slots=True)
+class AgregadoPedido:
+    """Linhas de um pedido (Vendedor + Pedido + Doc Fiscal) e a soma dos valores"""
+    
+    nome_vendedor: str
+    pedido: object
+    valor_total: float = 0
+    linhas: list = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class TotalVendedor:
+    """Totais de um vendedor no resumo de comissões"""
+    
+    vendor_name: str
+    eh_interno: bool = False
+    total_vendas: float = 0
+    total_comissoes: float = 0
+    quantidade_propostas: int = 0
+    
+    def para_dict(self):
+        """Formato retornado pela API / usado no PDF e no congelamento"""
+        return {
+            'vendor_name': self.vendor_name,
+            'total_vendas': self.total_vendas,
+            'total_comissoes': self.total_comissoes,
+            'quantidade_propostas': self.quantidade_propostas,
+            'eh_interno': self.eh_interno
+        }
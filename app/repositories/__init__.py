@@ -0,0 +1,434 @@
+# -*- coding: utf-8 -*-
+"""
+Repositórios das collections do MongoDB
+
+Todo acesso às collections passa por aqui. Cada repositório concentra as
+formas de consulta da sua collection (filtro + projeção nomeados), o batch
+size dos cursores e a medição de tempo por forma, para que as consultas
+sejam ajustadas (índices, projeções) e medidas num só lugar.
+
+Formas (PROJECOES) são referenciadas pelo nome; forma None lê o documento
+inteiro. Os documentos vão para as respostas JSON como lidos: ObjectId e
+datetime são convertidos na serialização (app/utils/provedor_json.py).
+
+As linhas de saida/propostas também podem ser lidas como DataFrame a partir
+dos snapshots Arrow de cada lote (LinhasRepository.dataframe).
+"""
+
+from datetime import datetime
+from uuid import uuid4
+
+import pandas as pd
+from bson import ObjectId
+from pymongo import ReturnDocument
+from app import mongo
+from app.models import VendedorModel, MotoModel, FormaRecebimentoModel, ComissaoModel
+from app.utils import snapshot_linhas
+from app.utils.metricas import TEMPO_CONSULTA_MONGO
+
+
+class Repository:
+    """Acesso a uma collection com formas de consulta nomeadas"""
+    
+    COLECAO = None
+    
+    # Nome da forma -> projeção. Formas usadas em testes de existência
+    # ('if doc:') mantêm o '_id' para nunca devolver um documento vazio
+    PROJECOES = {}
+    
+    # Documentos por lote do cursor (0 = padrão do driver: 101 no primeiro lote, depois até 16 MB)
+    BATCH_SIZE = 0
+    
+    @classmethod
+    def colecao(cls, db=None):
+        """Collection do repositório (db informado ou mongo.db)"""
+        return (db if db is not None else mongo.db)[cls.COLECAO]
+    
+    @classmethod
+    def _projecao(cls, forma):
+        if forma is None:
+            return None
+        return cls.PROJECOES[forma]
+    
+    @classmethod
+    def _medir(cls, forma):
+        return TEMPO_CONSULTA_MONGO.labels(colecao=cls.COLECAO, forma=forma or 'completo').time()
+    
+    # ========== LEITURA ==========
+    
+    @classmethod
+    def find(cls, filtro=None, forma=None, sort=None, db=None, skip=0, limit=0):
+        """Cursor com a projeção da forma e o batch size do repositório"""
+        cursor = cls.colecao(db).find(
+            filtro or {}, cls._projecao(forma), batch_size=cls.BATCH_SIZE, skip=skip, limit=limit
+        )
+        if sort:
+            cursor = cursor.sort(sort)
+        return cursor
+    
+    @classmethod
+    def listar(cls, filtro=None, forma=None, sort=None, db=None, skip=0, limit=0):
+        """Lista de documentos (cursor consumido dentro da medição)"""
+        with cls._medir(forma):
+            return list(cls.find(filtro, forma, sort, db, skip, limit))
+    
+    @classmethod
+    def find_one(cls, filtro, forma=None, db=None, **kwargs):
+        """Um documento (ou None) na forma informada"""
+        with cls._medir(forma):
+            return cls.colecao(db).find_one(filtro, cls._projecao(forma), **kwargs)
+    
+    @classmethod
+    def por_id(cls, doc_id, forma=None):
+        """Documento pelo _id (str ou ObjectId)"""
+        return cls.find_one({'_id': ObjectId(doc_id)}, forma)
+    
+    @classmethod
+    def count_documents(cls, filtro=None):
+        return cls.colecao().count_documents(filtro or {})
+    
+    @classmethod
+    def distinct(cls, campo, filtro=None):
+        return cls.colecao().distinct(campo, filtro or {})
+    
+    @classmethod
+    def aggregate(cls, pipeline):
+        return cls.colecao().aggregate(pipeline, batchSize=cls.BATCH_SIZE or None)
+    
+    # ========== ESCRITA ==========
+    
+    @classmethod
+    def insert_one(cls, documento):
+        return cls.colecao().insert_one(documento)
+    
+    @classmethod
+    def insert_many(cls, documentos):
+        return cls.colecao().insert_many(documentos)
+    
+    @classmethod
+    def update_one(cls, filtro, atualizacao, upsert=False):
+        return cls.colecao().update_one(filtro, atualizacao, upsert=upsert)
+    
+    @classmethod
+    def atualizar_por_id(cls, doc_id, campos):
+        """$set dos campos no documento com o _id informado"""
+        return cls.update_one({'_id': ObjectId(doc_id)}, {'$set': campos})
+    
+    @classmethod
+    def replace_one(cls, filtro, documento, upsert=False):
+        return cls.colecao().replace_one(filtro, documento, upsert=upsert)
+    
+    @classmethod
+    def delete_one(cls, filtro):
+        return cls.colecao().delete_one(filtro)
+    
+    @classmethod
+    def delete_many(cls, filtro):
+        return cls.colecao().delete_many(filtro)
+    
+    @classmethod
+    def bulk_write(cls, operacoes, ordered=True):
+        return cls.colecao().bulk_write(operacoes, ordered=ordered)
+    
+    @classmethod
+    def create_index(cls, chaves, **kwargs):
+        return cls.colecao().create_index(chaves, **kwargs)
+
+
+# ========== CADASTROS ==========
+
+class CadastroRepository(Repository):
+    """Cadastros identificados por 'nome' (vendedores, motos, formas)"""
+    
+    @classmethod
+    def por_nome(cls, nome, forma=None):
+        """Cadastro com o nome exato"""
+        return cls.find_one({'nome': nome}, forma)
+    
+    @classmethod
+    def por_nome_sem_caixa(cls, nome, forma=None):
+        """Cadastro com o nome igual, sem diferenciar maiúsculas/minúsculas"""
+        return cls.find_one({'nome': {'$regex': f'^{nome}$', '$options': 'i'}}, forma)
+    
+    @classmethod
+    def listar_por_status(cls, status='ativo', forma=None, sort=None):
+        """Listagem para a API (status vazio = todos)"""
+        return cls.listar({'status': status} if status else {}, forma, sort)
+
+
+class VendedorRepository(CadastroRepository):
+    COLECAO = VendedorModel.COLLECTION
+    
+    PROJECOES = {
+        'id': {'_id': 1},
+        'sincronizacao': {'_id': 1, 'cidade': 1},
+        'tipo': {'_id': 0, 'nome': 1, 'interno': 1},
+    }
+    
+    @classmethod
+    def mapa_interno(cls):
+        """{nome: interno} de todos os vendedores cadastrados"""
+        return {v['nome']: v.get('interno', False) for v in cls.listar(forma='tipo')}
+
+
+class MotoRepository(CadastroRepository):
+    COLECAO = MotoModel.COLLECTION
+    
+    PROJECOES = {
+        'id': {'_id': 1},
+        'sincronizacao': {'_id': 1, 'valor_tabela': 1},
+        'valor_tabela': {'_id': 1, 'valor_tabela': 1},
+    }
+    
+    @classmethod
+    def por_modelo(cls, modelo, forma=None):
+        """Moto pelo modelo da proposta: nome exato (sem caixa) e, se não houver, busca parcial"""
+        return cls.por_nome_sem_caixa(modelo, forma) or cls.find_one(
+            {'nome': {'$regex': modelo, '$options': 'i'}}, forma
+        )
+
+
+class FormaRecebimentoRepository(CadastroRepository):
+    COLECAO = FormaRecebimentoModel.COLLECTION
+    
+    PROJECOES = {
+        'id': {'_id': 1},
+        'vp': {'_id': 1, 'aplicar_vp': 1, 'taxa_juros': 1},
+        'vp_nome': {'_id': 0, 'nome': 1, 'aplicar_vp': 1, 'taxa_juros': 1},
+    }
+    
+    @classmethod
+    def ativa(cls, nome, forma=None):
+        """Forma de recebimento ativa com o nome informado"""
+        return cls.find_one({'nome': nome, 'status': 'ativo'}, forma)
+    
+    @classmethod
+    def ativas_vp(cls, nomes):
+        """{nome: documento 'vp_nome'} das formas ativas (o primeiro de cada nome, como em ativa)"""
+        formas = {}
+        for doc in cls.listar({'nome': {'$in': list(nomes)}, 'status': 'ativo'}, 'vp_nome'):
+            formas.setdefault(doc['nome'], doc)
+        return formas
+
+
+class ParametroAliquotaRepository(Repository):
+    COLECAO = 'parametros_aliquota'
+    
+    PROJECOES = {
+        'faixa': {'_id': 1, 'aliquota': 1, 'meta_max': 1},
+        'tabela': {'_id': 0, 'eh_interno': 1, 'tipo_moto': 1, 'meta_min': 1, 'meta_max': 1, 'aliquota': 1},
+    }
+    
+    @classmethod
+    def faixa(cls, eh_interno, percentual_meta, tipo_moto=None, db=None):
+        """Primeiro parâmetro com meta_min <= percentual (tipo de moto só para interno)"""
+        filtro = {'eh_interno': eh_interno, 'meta_min': {'$lte': percentual_meta}}
+        if tipo_moto:
+            filtro['tipo_moto'] = tipo_moto
+        return cls.find_one(filtro, 'faixa', db=db)
+    
+    @classmethod
+    def listar_por_tipo(cls, eh_interno):
+        """Parâmetros internos ou externos ordenados por meta_min"""
+        return cls.listar({'eh_interno': eh_interno}, sort=[('meta_min', 1)])
+    
+    @classmethod
+    def tabela(cls):
+        """Todos os parâmetros na ordem natural (a mesma em que faixa encontra o primeiro)"""
+        return cls.listar({}, 'tabela')
+
+
+# ========== LINHAS IMPORTADAS (POR PERÍODO) ==========
+
+class LinhasRepository(Repository):
+    """Linhas de saida/propostas importadas dos CSVs, separadas por 'periodo'"""
+    
+    # Collections grandes, lidas inteiras pelos relatórios: lotes maiores
+    # reduzem as idas e voltas ao servidor
+    BATCH_SIZE = 2000
+    
+    @classmethod
+    def delta(cls, periodos):
+        """Chave e hash das linhas gravadas nos períodos (upload incremental)"""
+        return cls.find({'periodo': {'$in': periodos}}, 'delta')
+    
+    @classmethod
+    def delta_por_chaves(cls, chaves, periodos):
+        """Chave e hash das linhas com as chaves gravadas fora dos períodos (linha que mudou de mês)"""
+        return cls.find({'chave_linha': {'$in': list(chaves)}, 'periodo': {'$nin': list(periodos)}}, 'delta')
+    
+    @classmethod
+    def contagem_por_periodo(cls):
+        """[{'_id': periodo, 'total': linhas}]"""
+        return cls.aggregate([
+            {'$match': {'periodo': {'$exists': True}}},
+            {'$group': {'_id': '$periodo', 'total': {'$sum': 1}}}
+        ])
+    
+    # ========== SNAPSHOTS POR LOTE ==========
+    
+    @classmethod
+    def renovar_lotes(cls, periodos):
+        """Novo lote para os períodos regravados: os snapshots anteriores deixam de valer
+        
+        Chamado depois de gravar as linhas (substituição, delta ou limpeza).
+        """
+        for periodo in periodos:
+            LoteLinhasRepository.update_one(
+                {'colecao': cls.COLECAO, 'periodo': periodo},
+                {'$set': {'lote': uuid4().hex, 'gravado_em': datetime.now()}},
+                upsert=True
+            )
+        
+        if snapshot_linhas.habilitado():
+            snapshot_linhas.descartar(cls.COLECAO, periodos)
+    
+    @classmethod
+    def periodos_do_filtro(cls, filtro):
+        """Períodos lidos pelo filtro, ou None se ele não for só de período"""
+        if not filtro:
+            # Linhas sem 'periodo' (importadas antes da separação por mês) não têm lote
+            if cls.find_one({'periodo': {'$exists': False}}, 'periodo'):
+                return None
+            return sorted(p for p in cls.distinct('periodo') if p)
+        
+        if set(filtro) != {'periodo'}:
+            return None
+        
+        periodo = filtro['periodo']
+        if isinstance(periodo, str):
+            return [periodo]
+        if isinstance(periodo, dict) and set(periodo) == {'$in'}:
+            return sorted(set(periodo['$in']))
+        return None
+    
+    @classmethod
+    def lotes_vigentes(cls, periodos):
+        """{periodo: lote} vigente, criando o lote dos períodos ainda sem registro"""
+        lotes = {
+            doc['periodo']: doc['lote']
+            for doc in LoteLinhasRepository.find({'colecao': cls.COLECAO, 'periodo': {'$in': periodos}}, 'lote')
+        }
+        
+        for periodo in periodos:
+            if periodo not in lotes:
+                # $setOnInsert: workers concorrentes ficam com o mesmo lote
+                doc = LoteLinhasRepository.colecao().find_one_and_update(
+                    {'colecao': cls.COLECAO, 'periodo': periodo},
+                    {'$setOnInsert': {'lote': uuid4().hex, 'gravado_em': datetime.now()}},
+                    upsert=True, return_document=ReturnDocument.AFTER
+                )
+                lotes[periodo] = doc['lote']
+        
+        return lotes
+    
+    @classmethod
+    def dataframe(cls, filtro=None, forma=None):
+        """Linhas como DataFrame, com as colunas da forma
+        
+        Filtros só de período ({}, {'periodo': p} ou {'periodo': {'$in': [...]}})
+        são lidos dos snapshots dos lotes, refeitos a partir do MongoDB quando
+        o arquivo não existe. Demais filtros (ou snapshots desligados) leem do
+        MongoDB. Use snapshot_linhas.valores para iterar as colunas.
+        """
+        colunas = None
+        if forma is not None:
+            colunas = [c for c, incluir in cls._projecao(forma).items() if incluir and c != '_id']
+        
+        periodos = cls.periodos_do_filtro(filtro) if snapshot_linhas.habilitado() else None
+        if periodos is None:
+            # dtype=object: valores como vieram do banco (int com falhas não vira float)
+            return pd.DataFrame(cls.listar(filtro, forma), columns=colunas, dtype=object)
+        
+        lotes = cls.lotes_vigentes(periodos)
+        partes = []
+        for periodo in periodos:
+            lote = lotes[periodo]
+            df = snapshot_linhas.ler(cls.COLECAO, periodo, lote, colunas)
+            if df is None:
+                df = snapshot_linhas.gravar(cls.COLECAO, periodo, lote, cls.listar({'periodo': periodo}, 'snapshot'))
+                df = df.reindex(columns=colunas) if colunas is not None else df
+            partes.append(df)
+        
+        if not partes:
+            return pd.DataFrame(columns=colunas)
+        return pd.concat(partes, ignore_index=True) if len(partes) > 1 else partes[0]
+
+
+class SaidaRepository(LinhasRepository):
+    COLECAO = 'saida'
+    
+    PROJECOES = {
+        'delta': {'chave_linha': 1, 'hash_linha': 1, 'periodo': 1},
+        'snapshot': {'_id': 0, 'chave_linha': 0, 'hash_linha': 0},
+        'periodo_pedido': {'_id': 0, 'Pedido': 1, 'periodo': 1},
+        'periodo': {'periodo': 1},
+        'resumo': {'_id': 0, 'Pessoa': 1, 'Vendedor': 1, 'Pedido': 1, 'Doc Fiscal': 1, 'Valor Tabela': 1},
+        'cidade': {'_id': 0, 'Vendedor': 1, 'Origem Venda': 1},
+        'atribuicao': {'_id': 0, 'Pessoa': 1, 'Vendedor': 1, 'Pedido': 1, 'Doc Fiscal': 1},
+        'vendas_vendedor': {'_id': 0, 'Pedido': 1, 'Valor Tabela': 1},
+    }
+
+
+class PropostaRepository(LinhasRepository):
+    COLECAO = 'propostas'
+    
+    PROJECOES = {
+        'delta': {'chave_linha': 1, 'hash_linha': 1, 'periodo': 1},
+        'snapshot': {'_id': 0, 'chave_linha': 0, 'hash_linha': 0},
+        # Documento como veio do arquivo, para as respostas (sem os campos internos do delta)
+        'listagem': {'chave_linha': 0, 'hash_linha': 0},
+        'periodo': {'periodo': 1},
+        'resumo': {
+            '_id': 0, 'Pessoa': 1, 'Nº Pedido': 1, 'N° Pedido': 1, 'Pedido': 1, 'Doc Fiscal': 1,
+            'Modelo': 1, 'Valor Total': 1, 'Forma Recebimento': 1, 'Nº Parcela': 1
+        },
+        'cidade': {'_id': 0, 'Pessoa': 1, 'Modelo': 1, 'Valor Total': 1, 'Forma Recebimento': 1},
+    }
+
+
+class LoteLinhasRepository(Repository):
+    """Lote vigente (versão dos snapshots) de cada collection de linhas e período"""
+    
+    COLECAO = 'lotes_linhas'
+    
+    PROJECOES = {
+        'lote': {'_id': 0, 'periodo': 1, 'lote': 1},
+        'atribuicoes': {'_id': 0, 'periodo': 1, 'lote': 1, 'atribuicoes': 1},
+    }
+
+
+class AtribuicaoVendedorRepository(Repository):
+    """Vendedor atribuído a cada Pessoa (cliente) da saída, por período (ver AtribuicaoService)"""
+    
+    COLECAO = 'atribuicoes_vendedor'
+    
+    PROJECOES = {
+        'vendedor': {'_id': 0, 'periodo': 1, 'pessoa': 1, 'vendedor': 1},
+        'conflitos': {'_id': 0, 'periodo': 1, 'pessoa': 1, 'vendedor': 1, 'vendedores': 1, 'conflitos': 1},
+    }
+
+
+# ========== RESULTADOS ==========
+
+class ComissaoRepository(Repository):
+    COLECAO = ComissaoModel.COLLECTION
+
+
+class ResumoPeriodoRepository(Repository):
+    """Resumos por vendedor congelados por período"""
+    
+    COLECAO = 'resumos_periodo'
+    
+    PROJECOES = {
+        'status': {'periodo': 1, 'congelado_em': 1},
+        'resumo': {'resumo_vendedor': 1},
+    }
+
+
+REPOSITORIOS_LINHAS = {repo.COLECAO: repo for repo in (SaidaRepository, PropostaRepository)}
+
+
+def repositorio_linhas(colecao):
+    """Repositório de 'saida' ou 'propostas' pelo nome da collection"""
+    return REPOSITORIOS_LINHAS[colecao]
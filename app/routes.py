@@ -3,15 +3,30 @@
 Rotas da aplicação
 """
 
-from flask import Blueprint, render_template, request, jsonify, send_file, Response
+from flask import Blueprint, render_template, request, jsonify, send_file, send_from_directory, Response, current_app, abort
 from werkzeug.utils import secure_filename
 import os
+import time
 import logging
+import shutil
+import zipfile
+import pymongo
+import numpy as np
 from datetime import datetime
 from app import mongo
-from app.services import ComissaoService, CSVProcessadorService, RelatorioService, VendedorService, MotoService, FormaRecebimentoService, ValorPresenteService
+from app.services import ComissaoService, CSVProcessadorService, RelatorioService, VendedorService, MotoService, FormaRecebimentoService, PeriodoService, UploadIncrementalService, SimulacaoService, AtribuicaoService
 from app.models import PropostaModel, ComissaoModel, VendedorModel, MotoModel, FormaRecebimentoModel
+from app.repositories import (
+    VendedorRepository, MotoRepository, FormaRecebimentoRepository, ParametroAliquotaRepository,
+    SaidaRepository, PropostaRepository, ComissaoRepository, ResumoPeriodoRepository
+)
 from app.utils.pdf_generator import gerar_pdf_comissoes
+from app.utils.executor import executar_cpu
+from app.utils.instrumentacao_mongo import instrumentacao_mongo
+from app.utils.metricas import gerar_metricas
+from app.utils.ndjson import MIMETYPE as MIMETYPE_NDJSON, ler_ndjson, resposta_dados
+from app.utils.centavos import multiplicar, para_centavos, para_reais, ratear
+from app.utils.profiler import listar_perfis, EXTENSOES as EXTENSOES_PERFIL
 
 
 logger = logging.getLogger(__name__)
@@ -22,20 +37,42 @@ api_bp = Blueprint('api', __name__)
 upload_bp = Blueprint('upload', __name__)
 
 
+def _periodo_requisitado():
+    """Lê o parâmetro opcional 'periodo' (AAAA-MM) da query string ou do formulário
+    
+    Raises:
+        ValueError: Se o período informado for inválido
+    """
+    return PeriodoService.normalizar_periodo(request.values.get('periodo'))
+
+
 # ========== ROTAS PRINCIPAIS ==========
 
 @main_bp.route('/limpar', methods=['POST'])
 def limpar_dados():
-    """Limpa os dados do MongoDB"""
+    """Limpa os dados do MongoDB (todos os períodos ou apenas o informado em 'periodo')"""
     
     try:
-        mongo.db.saida.delete_many({})
-        mongo.db.propostas.delete_many({})
+        periodo = _periodo_requisitado()
+        filtro = {'periodo': periodo} if periodo else {}
         
-        logger.info("Dados limpos com sucesso")
+        # Períodos apagados ganham lote novo (snapshots descartados)
+        periodos = [periodo] if periodo else sorted(set(SaidaRepository.distinct('periodo')) | set(PropostaRepository.distinct('periodo')))
+        
+        SaidaRepository.delete_many(filtro)
+        PropostaRepository.delete_many(filtro)
+        ResumoPeriodoRepository.delete_many(filtro)
+        
+        SaidaRepository.renovar_lotes(periodos)
+        PropostaRepository.renovar_lotes(periodos)
+        AtribuicaoService.reconstruir(periodos)
+        
+        logger.info(f"Dados limpos com sucesso (período: {periodo or 'todos'})")
         
         return jsonify({'status': 'sucesso', 'mensagem': 'Dados limpos'})
         
+    except ValueError as e:
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 400
     except Exception as e:
         logger.error(f"Erro ao limpar dados: {str(e)}", exc_info=True)
         return jsonify({'status': 'erro', 'mensagem': str(e)}), 500
@@ -75,39 +112,39 @@ def relatorios():
 
 @api_bp.route('/comissoes', methods=['GET'])
 def get_comissoes():
-    """Lista comissões"""
+    """Lista comissões (NDJSON com '?stream=1' ou 'Accept: application/x-ndjson')"""
     
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), current_app.config.get('API_MAX_POR_PAGINA'))
+        periodo = _periodo_requisitado()
+        filtro = {'periodo': periodo} if periodo else {}
         
         # Busca de propostas que têm os dados mais completos
-        collection = mongo.db.propostas
-        total = collection.count_documents({})
+        total = PropostaRepository.count_documents(filtro)
         
         skip = (page - 1) * per_page
-        comissoes = list(collection.find({}).skip(skip).limit(per_page))
-        
-        # Converte ObjectId para string e calcula comissão
-        for c in comissoes:
-            if '_id' in c:
-                c['_id'] = str(c['_id'])
-            # Calcula comissão básica (assumindo 100% de meta, buscando do banco)
-            valor = float(c.get('proposal_value', 0))
-            modelo = str(c.get('model', 'Outro')).upper()
-            eh_ac = 'AC' in modelo
-            aliquota = ComissaoService._obter_aliquota_banco(mongo.db, 100, eh_ac)
-            c['comissao'] = round(valor * aliquota, 2)
-            c['aliquota'] = aliquota * 100
         
-        return jsonify({
-            'status': 'sucesso',
-            'dados': comissoes,
-            'total': total,
-            'page': page,
-            'per_page': per_page
-        })
+        # Comissão básica (assumindo 100% de meta): as duas alíquotas são buscadas uma vez
+        aliquotas = {
+            eh_ac: ComissaoService._obter_aliquota_banco(mongo.db, 100, eh_ac)[0]
+            for eh_ac in (True, False)
+        }
         
+        def comissoes():
+            # Cursor consumido aos poucos: no streaming a página não fica inteira na memória
+            for c in PropostaRepository.find(filtro, 'listagem', skip=skip, limit=per_page):
+                modelo = str(c.get('model', 'Outro')).upper()
+                aliquota = aliquotas['AC' in modelo]
+                centavos = para_centavos(float(c.get('proposal_value', 0)))
+                c['comissao'] = float(para_reais(multiplicar(centavos, aliquota)))
+                c['aliquota'] = aliquota * 100
+                yield c
+        
+        return resposta_dados(comissoes(), {'total': total, 'page': page, 'per_page': per_page})
+        
+    except ValueError as e:
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 400
     except Exception as e:
         logger.error(f"Erro ao listar comissões: {str(e)}", exc_info=True)
         return jsonify({'status': 'erro', 'mensagem': str(e)}), 500
@@ -158,6 +195,7 @@ def atualizar_vendedor(vendor_id):
         if 'erro' in resultado:
             return jsonify({'status': 'erro', 'mensagem': resultado['erro']}), 400
         
+        PeriodoService.descartar_resumos()
         return jsonify({'status': 'sucesso', 'dados': resultado})
     except Exception as e:
         logger.error(f"Erro ao atualizar vendedor: {str(e)}", exc_info=True)
@@ -173,6 +211,7 @@ def deletar_vendedor(vendor_id):
         if 'erro' in resultado:
             return jsonify({'status': 'erro', 'mensagem': resultado['erro']}), 400
         
+        PeriodoService.descartar_resumos()
         return jsonify({'status': 'sucesso', 'dados': resultado})
     except Exception as e:
         logger.error(f"Erro ao deletar vendedor: {str(e)}", exc_info=True)
@@ -203,6 +242,7 @@ def criar_moto():
         if 'erro' in resultado:
             return jsonify({'status': 'erro', 'mensagem': resultado['erro']}), 400
         
+        PeriodoService.descartar_resumos()
         return jsonify({'status': 'sucesso', 'dados': resultado}), 201
     except Exception as e:
         logger.error(f"Erro ao criar moto: {str(e)}", exc_info=True)
@@ -233,6 +273,7 @@ def atualizar_moto(moto_id):
         if 'erro' in resultado:
             return jsonify({'status': 'erro', 'mensagem': resultado['erro']}), 400
         
+        PeriodoService.descartar_resumos()
         return jsonify({'status': 'sucesso', 'dados': resultado})
     except Exception as e:
         logger.error(f"Erro ao atualizar moto: {str(e)}", exc_info=True)
@@ -248,6 +289,7 @@ def deletar_moto(moto_id):
         if 'erro' in resultado:
             return jsonify({'status': 'erro', 'mensagem': resultado['erro']}), 400
         
+        PeriodoService.descartar_resumos()
         return jsonify({'status': 'sucesso', 'dados': resultado})
     except Exception as e:
         logger.error(f"Erro ao deletar moto: {str(e)}", exc_info=True)
@@ -256,12 +298,24 @@ def deletar_moto(moto_id):
 
 @api_bp.route('/resumo/vendedor', methods=['GET'])
 def resumo_vendedor():
-    """Resumo de comissões por vendedor"""
+    """Resumo de comissões por vendedor
+    
+    Com 'periodo' (AAAA-MM), usa o resumo congelado da competência quando existir.
+    Aceita NDJSON ('?stream=1' ou 'Accept: application/x-ndjson').
+    """
     
     try:
-        resumo = RelatorioService.resumo_comissoes()
-        return jsonify({'status': 'sucesso', 'dados': resumo})
+        periodo = _periodo_requisitado()
+        
+        if periodo:
+            resumo, congelado = PeriodoService.obter_resumo_vendedor(periodo)
+            return resposta_dados(resumo, {'periodo': periodo, 'congelado': congelado})
         
+        resumo = RelatorioService.resumo_comissoes(max_workers=current_app.config.get('RELATORIO_WORKERS'))
+        return resposta_dados(resumo)
+        
+    except ValueError as e:
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 400
     except Exception as e:
         logger.error(f"Erro ao gerar resumo por vendedor: {str(e)}", exc_info=True)
         return jsonify({'status': 'erro', 'mensagem': str(e)}), 500
@@ -274,18 +328,21 @@ def processar_comissoes():
     try:
         logger.info("[COMISSOES] Iniciando processamento de comissões...")
         
+        periodo = _periodo_requisitado()
+        
         # Gera resumo das comissões
-        resumo = RelatorioService.resumo_comissoes()
+        if periodo:
+            resumo, _ = PeriodoService.obter_resumo_vendedor(periodo)
+        else:
+            resumo = RelatorioService.resumo_comissoes(max_workers=current_app.config.get('RELATORIO_WORKERS'))
         logger.info(f"[COMISSOES] Resumo gerado com {len(resumo)} vendedores")
         
         if not resumo:
             return jsonify({'status': 'erro', 'mensagem': 'Nenhuma comissão para processar'}), 400
         
         # Salva as comissões no banco de dados
-        comissoes_collection = mongo.db.comissoes
-        
-        # Remove comissões antigas (para garantir que não há duplicatas)
-        comissoes_collection.delete_many({})
+        # Remove comissões antigas do período (para garantir que não há duplicatas)
+        ComissaoRepository.delete_many({'periodo': periodo} if periodo else {})
         logger.info("[COMISSOES] Comissões antigas removidas")
         
         # Insere as novas comissões
@@ -298,18 +355,20 @@ def processar_comissoes():
                 'quantidade_propostas': int(item.get('quantidade_propostas', 0)),
                 'media_comissao': float(item.get('total_comissoes', 0)) / int(item.get('quantidade_propostas', 1)) if item.get('quantidade_propostas', 0) > 0 else 0,
                 'eh_interno': item.get('eh_interno', False),
+                'periodo': periodo,
                 'data_processamento': datetime.now()
             }
             documentos.append(doc)
         
         if documentos:
-            comissoes_collection.insert_many(documentos)
+            ComissaoRepository.insert_many(documentos)
             logger.info(f"[COMISSOES] {len(documentos)} comissões inseridas no banco")
         
         # Gera PDF
         logger.info("[COMISSOES] Iniciando geração de PDF...")
         try:
-            pdf_buffer = gerar_pdf_comissoes(resumo)
+            # Renderização do PDF é CPU pura: fora do loop nos workers gevent
+            pdf_buffer = executar_cpu(gerar_pdf_comissoes, resumo)
             pdf_data = pdf_buffer.getvalue()
             logger.info(f"[COMISSOES] PDF gerado com sucesso: {len(pdf_data)} bytes")
             
@@ -336,28 +395,112 @@ def processar_comissoes():
                 'dados': resumo
             }), 200
         
+    except ValueError as e:
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 400
     except Exception as e:
         logger.error(f"Erro ao processar comissões: {str(e)}", exc_info=True)
         return jsonify({'status': 'erro', 'mensagem': str(e)}), 500
 
 
+def _vendas_processadas_por_pedido(propostas_por_pedido, valor_tabela_map, eh_interno, avisos_globais):
+    """Calcula as comissões dos pedidos e gera as vendas com os valores calculados
+    
+    Todos os pedidos são calculados de uma vez, em centavos inteiros
+    (ComissaoService.calcular_pedidos). A comissão de cada pedido é rateada
+    entre as suas formas de pagamento, proporcional ao valor presente, pelos
+    maiores restos: as comissões das linhas somam exatamente a do pedido.
+    Gerador (NDJSON: as vendas saem à medida que são serializadas). Os avisos
+    das alíquotas são acumulados em 'avisos_globais'.
+    """
+    pedidos = list(propostas_por_pedido.values())
+    if not pedidos:
+        return
+    
+    numeros_pedido = []
+    valores_tabela = []
+    for chave_pedido, dados in propostas_por_pedido.items():
+        pedido = dados.get('pedido', chave_pedido.split('|')[0])
+        valor_tabela = valor_tabela_map.get(pedido, 0)
+        
+        # Se não encontrou valor_tabela pelo pedido, tenta buscar pela moto
+        if valor_tabela == 0 and dados['propostas']:
+            modelo = dados['propostas'][0].get('Modelo', '').upper().strip()
+            
+            if modelo:
+                # Busca pelo nome exato e, se não houver, por busca parcial
+                moto = MotoRepository.por_modelo(modelo, 'valor_tabela')
+                
+                if moto:
+                    valor_tabela = RelatorioService._converter_valor(moto.get('valor_tabela', 0))
+        
+        numeros_pedido.append(pedido)
+        valores_tabela.append(valor_tabela)
+    
+    # Linhas (formas de pagamento) de todos os pedidos
+    vendas = [(i, venda) for i, dados in enumerate(pedidos) for venda in dados['propostas']]
+    formas_linha = [venda.get('Forma Recebimento', '').strip() for _, venda in vendas]
+    
+    # Taxa de juros de cada forma ativa com VP (uma consulta para todas)
+    formas = FormaRecebimentoRepository.ativas_vp(sorted(set(formas_linha) - {''}))
+    taxas = [[RelatorioService._taxa_forma(formas[forma]) if forma in formas else 0.0] for forma in formas_linha]
+    
+    pedido_linha = np.array([i for i, _ in vendas], dtype=np.intp)
+    eh_ac = np.array(['AC' in dados['propostas'][0].get('Modelo', '').upper() for dados in pedidos], dtype=bool)
+    
+    calculo = ComissaoService.calcular_pedidos(
+        pedido_linha,
+        para_centavos([RelatorioService._converter_valor(venda.get('Valor Total', 0)) for _, venda in vendas]),
+        [int(venda.get('Nº Parcela', 1)) if venda.get('Nº Parcela') else 1 for _, venda in vendas],
+        taxas,
+        para_centavos(valores_tabela),
+        np.full(len(pedidos), bool(eh_interno)),
+        eh_ac,
+        [ComissaoService.tabela_faixas()]
+    )
+    
+    vp = calculo['vp'][:, 0]
+    percentual_meta = calculo['percentual_meta'][:, 0]
+    aliquota = calculo['aliquota'][:, 0]
+    vp_linha = calculo['vp_linha'][:, 0]
+    
+    # Comissão só para pedidos com valor VP válido; sem valor de venda
+    # (transações de ajuste) as linhas ficam com comissão zero
+    comissao_linha = ratear(calculo['comissao'][:, 0], vp_linha, pedido_linha)
+    
+    # Coleta avisos (alíquota padrão por falta de faixa cadastrada)
+    for i in np.flatnonzero(calculo['usou_padrao'][:, 0] & (vp > 0)):
+        aviso = ComissaoService.aviso_aliquota_padrao(float(percentual_meta[i]), bool(eh_ac[i]), eh_interno)
+        if aviso:
+            avisos_globais.add(aviso)
+    
+    for posicao, (i, venda) in enumerate(vendas):
+        venda['comissao'] = float(para_reais(comissao_linha[posicao])) if vp[i] > 0 else 0
+        venda['aliquota'] = float(aliquota[i]) * 100
+        venda['percentual_meta'] = float(percentual_meta[i])
+        venda['valor_venda'] = float(para_reais(vp_linha[posicao]))
+        venda['valor_tabela'] = valores_tabela[i]
+        venda['pedido'] = numeros_pedido[i]
+        yield venda
+
+
 @api_bp.route('/vendedor/vendas', methods=['GET'])
 def vendedor_vendas():
-    """Retorna todas as vendas de um vendedor específico"""
+    """Retorna todas as vendas de um vendedor específico
+    
+    Com '?stream=1' ou 'Accept: application/x-ndjson', envia cada venda assim
+    que o pedido é calculado (ver app/utils/ndjson.py).
+    """
     
     try:
         nome_vendedor = request.args.get('nome', '')
+        periodo = _periodo_requisitado()
+        filtro_periodo = {'periodo': periodo} if periodo else {}
         
         if not nome_vendedor:
             return jsonify({'status': 'erro', 'mensagem': 'Nome do vendedor não informado'}), 400
         
-        # Busca propostas do vendedor
-        saida_col = mongo.db.saida
-        proposta_col = mongo.db.propostas
-        vendedor_col = mongo.db.vendedores
-        
         # VALIDAÇÃO: Busca informações do vendedor NO BANCO DE DADOS
-        vendedor_info = vendedor_col.find_one({'nome': nome_vendedor})
+        vendedor_info = VendedorRepository.por_nome(nome_vendedor, 'tipo')
         
         # Se vendedor não existe no banco, retorna erro
         if not vendedor_info:
@@ -368,23 +511,22 @@ def vendedor_vendas():
         
         eh_interno = vendedor_info.get('interno', False)
         
-        # Encontra todos os clientes (Pessoa) que esse vendedor vendeu
-        clientes_do_vendedor = set()
-        for doc in saida_col.find({'Vendedor': nome_vendedor}):
-            pessoa = doc.get('Pessoa', '').strip()
-            if pessoa:
-                clientes_do_vendedor.add(pessoa)
+        # Clientes (Pessoa) atribuídos ao vendedor, a mesma regra do resumo
+        clientes_do_vendedor = AtribuicaoService.clientes(nome_vendedor, filtro_periodo)
         
         # Se não encontrou clientes, retorna vazio
         if not clientes_do_vendedor:
-            return jsonify({'status': 'sucesso', 'dados': []})
+            return resposta_dados([])
+        
+        # Saída do vendedor (só as colunas usadas) para o mapa de Pedido -> Valor Tabela
+        saida_docs = SaidaRepository.listar({'Vendedor': nome_vendedor, **filtro_periodo}, 'vendas_vendedor')
         
-        # Busca propostas desses clientes
-        vendas = list(proposta_col.find({'Pessoa': {'$in': list(clientes_do_vendedor)}}))
+        # Busca propostas desses clientes (documentos como vieram do arquivo: vão na resposta)
+        vendas = PropostaRepository.listar({'Pessoa': {'$in': list(clientes_do_vendedor)}, **filtro_periodo}, 'listagem')
         
         # Cria mapa de Pedido -> Valor Tabela (da saida)
         valor_tabela_map = {}
-        for doc in saida_col.find({'Vendedor': nome_vendedor}):
+        for doc in saida_docs:
             pedido = doc.get('Pedido', '')
             valor_tabela = RelatorioService._converter_valor(doc.get('Valor Tabela', 0))
             if pedido and valor_tabela > 0:
@@ -429,143 +571,58 @@ def vendedor_vendas():
             propostas_por_pedido_filtrado[chave_pedido] = dados
         
         # Processa as vendas e calcula comissões com Meta % correta
-        vendas_processadas = []
         avisos_globais = set()  # Set para evitar avisos duplicados
+        vendas = _vendas_processadas_por_pedido(propostas_por_pedido_filtrado, valor_tabela_map, eh_interno, avisos_globais)
         
-        for chave_pedido, dados in propostas_por_pedido_filtrado.items():
-            pedido = dados.get('pedido', chave_pedido.split('|')[0])
-            valor_tabela = valor_tabela_map.get(pedido, 0)
-            valor_total_pedido = dados['valor_total']
+        def metadados():
+            resposta = {'eh_interno': eh_interno}
             
-            # Se não encontrou valor_tabela pelo pedido, tenta buscar pela moto
-            if valor_tabela == 0 and dados['propostas']:
-                modelo = dados['propostas'][0].get('Modelo', '').upper().strip()
-                
-                if modelo:
-                    # Tenta buscar de várias formas pelo campo 'nome'
-                    moto = mongo.db.motos.find_one({'nome': {'$regex': f'^{modelo}$', '$options': 'i'}})
-                    
-                    if not moto:
-                        # Tenta busca parcial
-                        moto = mongo.db.motos.find_one({'nome': {'$regex': modelo, '$options': 'i'}})
-                    
-                    if moto:
-                        valor_tabela = RelatorioService._converter_valor(moto.get('valor_tabela', 0))
-            
-            # NOVO: Soma todos os valores presentes das formas de pagamento (PRIMEIRO)
-            valor_venda_total_pedido = 0
-            detalhes_formas = []  # Lista para rastrear cada forma e seu valor VP
+            # Adicionar avisos se houver
+            if avisos_globais:
+                resposta['avisos'] = list(avisos_globais)
             
-            for venda in dados['propostas']:
-                venda['_id'] = str(venda.get('_id', ''))
-                modelo = venda.get('Modelo', '').upper()
-                valor = RelatorioService._converter_valor(venda.get('Valor Total', 0))
-                numero_parcelas = int(venda.get('Nº Parcela', 1)) if venda.get('Nº Parcela') else 1
-                forma_recebimento = venda.get('Forma Recebimento', '').strip()
-                
-                # Calcular valor presente para cada forma de pagamento
-                valor_venda_forma = valor
-                aplicou_taxa = False
-                
-                # Busca a forma de recebimento no banco para aplicar taxa de juros
-                if forma_recebimento and numero_parcelas >= 2:
-                    forma_doc = mongo.db.formas_recebimento.find_one({
-                        'nome': forma_recebimento,
-                        'status': 'ativo'
-                    })
-                    
-                    if forma_doc and forma_doc.get('aplicar_vp') and forma_doc.get('taxa_juros', 0) > 0:
-                        taxa_juros = forma_doc.get('taxa_juros', 0) / 100  # Converte de % para decimal
-                        # Aplica HP12C inversa para trazer ao valor presente
-                        valor_venda_forma = ValorPresenteService.calcular_valor_com_juro_simples(
-                            valor,
-                            numero_parcelas,
-                            taxa_juros
-                        )
-                        aplicou_taxa = True
-                
-                # Acumula o valor presente desta forma
-                valor_venda_total_pedido += valor_venda_forma
-                
-                # Rastreia detalhes de cada forma
-                detalhes_formas.append({
-                    'venda': venda,
-                    'valor_original': valor,
-                    'valor_venda_forma': valor_venda_forma,
-                    'aplicou_taxa': aplicou_taxa
-                })
-            
-            # Calcula Meta % usando o valor VP TOTAL (não o valor original)
-            if valor_tabela > 0:
-                percentual_meta = (valor_venda_total_pedido / valor_tabela * 100)
-            else:
-                # Se ainda não encontrou tabela, usa 100% (sem comparação)
-                percentual_meta = 100.0
-            
-            # Calcula comissão apenas se houver valor VP válido
-            if valor_venda_total_pedido > 0:
-                # Calcula comissão uma única vez sobre o total de todas as formas
-                eh_ac = 'AC' in dados['propostas'][0].get('Modelo', '').upper()
-                aliquota, avisos = ComissaoService._obter_aliquota_banco(mongo.db, percentual_meta, eh_ac, eh_interno)
-                comissao_total = round(valor_venda_total_pedido * aliquota, 2)
-                
-                # Coleta avisos
-                for aviso in avisos:
-                    avisos_globais.add(aviso)
-                
-                # Distribui a comissão entre as formas de pagamento (proporcional ao valor VP)
-                for detalhe in detalhes_formas:
-                    venda = detalhe['venda']
-                    proporcao = detalhe['valor_venda_forma'] / valor_venda_total_pedido
-                    comissao_proporcional = round(comissao_total * proporcao, 2)
-                    
-                    venda['comissao'] = comissao_proporcional
-                    venda['aliquota'] = aliquota * 100
-                    venda['percentual_meta'] = percentual_meta
-                    venda['valor_venda'] = detalhe['valor_venda_forma']
-                    venda['valor_tabela'] = valor_tabela
-                    venda['pedido'] = pedido
-                    vendas_processadas.append(venda)
-            else:
-                # Sem valor de venda, apenas adiciona com comissão zero (transações de ajuste)
-                eh_ac = 'AC' in dados['propostas'][0].get('Modelo', '').upper()
-                aliquota, _ = ComissaoService._obter_aliquota_banco(mongo.db, percentual_meta, eh_ac, eh_interno)
-                
-                for detalhe in detalhes_formas:
-                    venda = detalhe['venda']
-                    venda['comissao'] = 0
-                    venda['aliquota'] = aliquota * 100
-                    venda['percentual_meta'] = percentual_meta
-                    venda['valor_venda'] = detalhe['valor_venda_forma']
-                    venda['valor_tabela'] = valor_tabela
-                    venda['pedido'] = pedido
-                    vendas_processadas.append(venda)
+            return resposta
         
-        resposta = {
-            'status': 'sucesso',
-            'dados': vendas_processadas,
-            'eh_interno': eh_interno
-        }
-        
-        # Adicionar avisos se houver
-        if avisos_globais:
-            resposta['avisos'] = list(avisos_globais)
-        
-        return jsonify(resposta)
+        return resposta_dados(vendas, metadados)
         
+    except ValueError as e:
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 400
     except Exception as e:
         logger.error(f"Erro ao buscar vendas do vendedor: {str(e)}", exc_info=True)
         return jsonify({'status': 'erro', 'mensagem': str(e)}), 500
 
 
+@api_bp.route('/atribuicoes/conflitos', methods=['GET'])
+def atribuicoes_conflitos():
+    """Clientes (Pessoa) com pedidos de mais de um vendedor na saída
+    
+    Cada item traz o vendedor atribuído (o que recebe a comissão nos
+    relatórios) e os pedidos dos demais vendedores. Aceita 'periodo' e NDJSON.
+    """
+    
+    try:
+        periodo = _periodo_requisitado()
+        conflitos = AtribuicaoService.conflitos({'periodo': periodo} if periodo else {})
+        return resposta_dados(conflitos, {'total': len(conflitos)})
+        
+    except ValueError as e:
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro ao listar conflitos de atribuição: {str(e)}", exc_info=True)
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 500
+
+
 @api_bp.route('/resumo/cidade', methods=['GET'])
 def resumo_cidade():
-    """Resumo de comissões por cidade"""
+    """Resumo de comissões por cidade (aceita NDJSON, ver resumo_vendedor)"""
     
     try:
-        resumo = RelatorioService.resumo_por_cidade()
-        return jsonify({'status': 'sucesso', 'dados': resumo})
+        periodo = _periodo_requisitado()
+        resumo = RelatorioService.resumo_por_cidade({'periodo': periodo} if periodo else None)
+        return resposta_dados(resumo)
         
+    except ValueError as e:
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 400
     except Exception as e:
         logger.error(f"Erro ao gerar resumo por cidade: {str(e)}", exc_info=True)
         return jsonify({'status': 'erro', 'mensagem': str(e)}), 500
@@ -590,6 +647,229 @@ def calcular_comissao():
         return jsonify({'status': 'erro', 'mensagem': str(e)}), 400
 
 
+@api_bp.route('/calcular-comissao/lote', methods=['POST'])
+def calcular_comissao_lote():
+    """Calcula a comissão de várias propostas numa única requisição
+    
+    Corpo: lista JSON de itens {'proposta', 'valor_meta', 'alta_cilindrada',
+    'vendedor_interno'}, {'itens': [...]} ou NDJSON (um item por linha, com
+    Content-Type application/x-ndjson). Um item inválido não derruba os demais:
+    o erro vem no próprio item ('status': 'erro'). Aceita resposta NDJSON.
+    """
+    try:
+        if request.mimetype == MIMETYPE_NDJSON:
+            itens = ler_ndjson(request.get_data())
+        else:
+            dados = request.get_json(silent=True)
+            itens = dados.get('itens') if isinstance(dados, dict) else dados
+        
+        if not isinstance(itens, list):
+            raise ValueError("Envie uma lista de itens (JSON ou NDJSON)")
+        
+        resultados = ComissaoService.calcular_comissoes_lote(itens)
+        erros = sum(1 for resultado in resultados if resultado['status'] == 'erro')
+        
+        return resposta_dados(resultados, {'total': len(resultados), 'erros': erros})
+    except ValueError as e:
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro no cálculo de comissões em lote: {str(e)}", exc_info=True)
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 500
+
+
+# ========== ENDPOINTS DE PERÍODOS (COMPETÊNCIAS) ==========
+
+@api_bp.route('/periodos', methods=['GET'])
+def listar_periodos():
+    """Lista os períodos armazenados com contagens e status de congelamento"""
+    try:
+        periodos = PeriodoService.listar_periodos()
+        
+        return jsonify({'status': 'sucesso', 'dados': periodos})
+    except Exception as e:
+        logger.error(f"Erro ao listar períodos: {str(e)}", exc_info=True)
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 500
+
+
+@api_bp.route('/periodos/<periodo>/congelar', methods=['POST'])
+def congelar_periodo(periodo):
+    """Calcula e congela o resumo por vendedor de um período"""
+    try:
+        periodo = PeriodoService.normalizar_periodo(periodo)
+        documento = PeriodoService.congelar_periodo(periodo)
+        
+        return jsonify({
+            'status': 'sucesso',
+            'mensagem': f'Período {periodo} congelado',
+            'dados': documento['resumo_vendedor'],
+            'total_vendas': documento['total_vendas'],
+            'total_comissoes': documento['total_comissoes']
+        })
+    except ValueError as e:
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro ao congelar período: {str(e)}", exc_info=True)
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 500
+
+
+@api_bp.route('/periodos/<periodo>/congelar', methods=['DELETE'])
+def descongelar_periodo(periodo):
+    """Remove o resumo congelado de um período (volta a ser recalculado)"""
+    try:
+        periodo = PeriodoService.normalizar_periodo(periodo)
+        removidos = PeriodoService.descongelar_periodos([periodo])
+        
+        if removidos == 0:
+            return jsonify({'status': 'erro', 'mensagem': 'Período não está congelado'}), 404
+        
+        return jsonify({'status': 'sucesso', 'mensagem': f'Período {periodo} descongelado'})
+    except ValueError as e:
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro ao descongelar período: {str(e)}", exc_info=True)
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 500
+
+
+@api_bp.route('/resumo/acumulado', methods=['GET'])
+def resumo_acumulado():
+    """Resumo por vendedor acumulado em um intervalo de períodos
+    
+    Parâmetros: 'ano' (AAAA, do início do ano até o último período)
+    ou 'de'/'ate' (AAAA-MM). Aceita NDJSON (ver resumo_vendedor).
+    """
+    try:
+        ano = request.args.get('ano', type=int)
+        
+        if ano:
+            periodo_inicial = f"{ano:04d}-01"
+            periodo_final = f"{ano:04d}-12"
+        else:
+            periodo_inicial = PeriodoService.normalizar_periodo(request.args.get('de')) or '0000-00'
+            periodo_final = PeriodoService.normalizar_periodo(request.args.get('ate')) or '9999-99'
+        
+        resultado = PeriodoService.resumo_acumulado(periodo_inicial, periodo_final)
+        
+        return resposta_dados(resultado['dados'], {'periodos': resultado['periodos']})
+    except ValueError as e:
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro ao gerar resumo acumulado: {str(e)}", exc_info=True)
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 500
+
+
+@api_bp.route('/simulacao', methods=['POST'])
+def simular_cenarios():
+    """Simula tabelas de alíquota / VP das formas sem alterar o cadastro
+    
+    Corpo JSON: {'cenarios': [...], 'periodo': 'AAAA-MM' (opcional, também na query)}.
+    'dados' traz os vendedores com os totais de cada cenário; 'cenarios', os
+    totais gerais. O cenário 'atual' é a base das diferenças (ver SimulacaoService).
+    """
+    try:
+        dados = request.get_json(silent=True) or {}
+        periodo = PeriodoService.normalizar_periodo(dados.get('periodo')) or _periodo_requisitado()
+        
+        resultado = SimulacaoService.simular(
+            dados.get('cenarios'),
+            {'periodo': periodo} if periodo else None,
+            current_app.config.get('SIMULACAO_MAX_CENARIOS'),
+            current_app.config.get('RELATORIO_WORKERS')
+        )
+        
+        return resposta_dados(resultado['vendedores'], {
+            'cenarios': resultado['cenarios'],
+            'pedidos': resultado['pedidos'],
+            'periodo': periodo
+        })
+    except ValueError as e:
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro na simulação de cenários: {str(e)}", exc_info=True)
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 500
+
+
+# ========== MÉTRICAS ==========
+
+@api_bp.route('/saude', methods=['GET'])
+def saude():
+    """Verificação de saúde: aplicação no ar e ping no MongoDB com timeout
+    
+    Retorna 503 quando o MongoDB não responde dentro de SAUDE_MONGO_TIMEOUT.
+    """
+    resultado = {'status': 'sucesso', 'aplicacao': 'ok'}
+    inicio = time.perf_counter()
+    
+    try:
+        with pymongo.timeout(current_app.config['SAUDE_MONGO_TIMEOUT']):
+            mongo.cx.admin.command('ping')
+        
+        resultado['mongo'] = 'ok'
+        resultado['mongo_latencia_ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+        return jsonify(resultado)
+    except Exception as e:
+        logger.warning(f"[SAUDE] MongoDB indisponível: {str(e)}")
+        resultado.update({'status': 'erro', 'mongo': 'indisponivel', 'mensagem': str(e)})
+        return jsonify(resultado), 503
+
+
+@main_bp.route('/metrics')
+def metrics():
+    """Métricas no formato de exposição do Prometheus"""
+    conteudo, content_type = gerar_metricas()
+    return Response(conteudo, content_type=content_type)
+
+
+@api_bp.route('/metricas/mongo', methods=['GET'])
+def metricas_mongo():
+    """Totais de comandos MongoDB desde o início do processo
+    
+    Inclui contagens por rota, por método de serviço e os formatos de
+    comando sinalizados como N+1. 'reiniciar=1' zera os contadores.
+    """
+    try:
+        dados = instrumentacao_mongo.totais()
+        
+        if request.args.get('reiniciar') in ('1', 'true'):
+            instrumentacao_mongo.reiniciar()
+        
+        return jsonify({'status': 'sucesso', 'dados': dados})
+    except Exception as e:
+        logger.error(f"Erro ao obter métricas do MongoDB: {str(e)}", exc_info=True)
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 500
+
+
+# ========== ADMINISTRAÇÃO: PERFIS DE REQUISIÇÕES ==========
+
+def _pasta_perfis():
+    """Pasta dos perfis; 404 se o profiler não estiver habilitado"""
+    if not current_app.config.get('PROFILER_HABILITADO'):
+        abort(404)
+    return os.path.abspath(current_app.config['PROFILER_PASTA'])
+
+
+@api_bp.route('/admin/perfis', methods=['GET'])
+def listar_perfis_requisicoes():
+    """Lista os perfis gravados pelo profiler (mais recentes primeiro)"""
+    pasta = _pasta_perfis()
+    
+    try:
+        return jsonify({'status': 'sucesso', 'dados': listar_perfis(pasta)})
+    except Exception as e:
+        logger.error(f"Erro ao listar perfis: {str(e)}", exc_info=True)
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 500
+
+
+@api_bp.route('/admin/perfis/<nome>', methods=['GET'])
+def baixar_perfil_requisicao(nome):
+    """Download de um arquivo de perfil (.pstats ou .collapsed)"""
+    pasta = _pasta_perfis()
+    
+    if os.path.splitext(nome)[1] not in EXTENSOES_PERFIL:
+        return jsonify({'status': 'erro', 'mensagem': 'Arquivo de perfil inválido'}), 400
+    
+    return send_from_directory(pasta, nome, as_attachment=True)
+
+
 # ========== ROTAS DE UPLOAD ==========
 
 ALLOWED_EXTENSIONS = {'csv', 'xlsx'}
@@ -598,6 +878,104 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def _gravar_lote(colecao, dados, periodo):
+    """Grava o lote do upload
+    
+    Padrão: substitui o período principal do arquivo (informado ou o da maioria
+    das linhas); linhas de outros meses só são inseridas/atualizadas.
+    Com modo=incremental: aplica apenas inserções/alterações/remoções em relação
+    ao que já está gravado e retorna o delta (pedidos alterados). Remoções
+    também ficam restritas ao período principal.
+    """
+    UploadIncrementalService.preparar_linhas(dados)
+    
+    if request.values.get('modo') == 'incremental':
+        delta = UploadIncrementalService.aplicar_delta(colecao, dados, [periodo] if periodo else [])
+        PeriodoService.invalidar_periodos(delta['periodos_alterados'])
+        logger.info(
+            f"Upload incremental em {colecao}: {delta['inseridos']} inseridas, {delta['atualizados']} atualizadas, "
+            f"{delta['removidos']} removidas, {delta['inalterados']} inalteradas",
+            extra={k: delta[k] for k in ('inseridos', 'atualizados', 'removidos', 'inalterados')}
+        )
+        return delta
+    
+    PeriodoService.substituir_periodo(colecao, dados, periodo)
+    return None
+
+
+def _extrair_zip(caminho_zip, pasta_lote, proximo):
+    """Extrai os arquivos de um .zip do upload em lote
+    
+    Cada membro vai para uma subpasta própria (pasta_lote/<n>/): membros de
+    mesmo nome em pastas diferentes do zip (ex: loja1/saida.csv e
+    loja2/saida.csv) não se sobrescrevem. Membros repetidos (mesmo caminho
+    no zip) são ignorados.
+    
+    Args:
+        proximo (int): Número da primeira subpasta a usar
+    
+    Returns:
+        tuple: ([(caminho extraído, caminho no zip)], status dos membros recusados)
+    
+    Raises:
+        ValueError: Se o zip passar de UPLOAD_ZIP_MAX_ARQUIVOS membros ou de
+            UPLOAD_ZIP_MAX_BYTES descompactados
+    """
+    max_arquivos = current_app.config.get('UPLOAD_ZIP_MAX_ARQUIVOS')
+    max_bytes = current_app.config.get('UPLOAD_ZIP_MAX_BYTES')
+    
+    caminhos = []
+    recusados = []
+    vistos = set()
+    
+    with zipfile.ZipFile(caminho_zip) as zf:
+        membros = [m for m in zf.infolist() if not m.is_dir()]
+        
+        if len(membros) > max_arquivos:
+            raise ValueError(f"O .zip tem {len(membros)} arquivo(s); o limite é {max_arquivos}")
+        if sum(m.file_size for m in membros) > max_bytes:
+            raise ValueError(f"O .zip descompactado passa do limite de {max_bytes / (1024 * 1024):g} MB")
+        
+        extraidos = 0
+        for membro in membros:
+            nome_membro = secure_filename(os.path.basename(membro.filename))
+            if not nome_membro or membro.filename in vistos:
+                continue
+            vistos.add(membro.filename)
+            
+            if not allowed_file(nome_membro):
+                recusados.append({'arquivo': membro.filename, 'tipo': None, 'status': 'erro', 'linhas': 0, 'tempo_ms': 0, 'mensagem': 'Tipo de arquivo não permitido'})
+                continue
+            
+            pasta = os.path.join(pasta_lote, str(proximo + len(caminhos)))
+            os.makedirs(pasta, exist_ok=True)
+            caminho = os.path.join(pasta, nome_membro)
+            
+            # Cópia em blocos, conferindo o tamanho real (file_size vem do próprio zip)
+            with zf.open(membro) as origem, open(caminho, 'wb') as destino:
+                while True:
+                    bloco = origem.read(1024 * 1024)
+                    if not bloco:
+                        break
+                    extraidos += len(bloco)
+                    if extraidos > max_bytes:
+                        raise ValueError(f"O .zip descompactado passa do limite de {max_bytes / (1024 * 1024):g} MB")
+                    destino.write(bloco)
+            
+            caminhos.append((caminho, membro.filename))
+    
+    return caminhos, recusados
+
+
+def _mensagem_delta(delta):
+    """Resumo textual do delta aplicado no upload incremental"""
+    return (
+        f"Modo incremental: {delta['inseridos']} inserida(s), {delta['atualizados']} atualizada(s), "
+        f"{delta['removidos']} removida(s), {delta['inalterados']} inalterada(s); "
+        f"{len(delta['pedidos_alterados'])} pedido(s) alterado(s)"
+    )
+
+
 @upload_bp.route('/saida', methods=['POST'])
 def upload_saida():
     """Upload de arquivo saida.csv"""
@@ -608,7 +986,7 @@ def upload_saida():
             return jsonify({'status': 'erro', 'mensagem': 'Nenhum arquivo enviado'}), 400
         
         file = request.files['arquivo']
-        logger.info(f"Arquivo recebido: {file.filename}")
+        logger.debug(f"Arquivo recebido: {file.filename}")
         
         if file.filename == '':
             logger.warning("Arquivo vazio")
@@ -622,7 +1000,9 @@ def upload_saida():
         os.makedirs('uploads', exist_ok=True)
         filepath = os.path.join('uploads', filename)
         file.save(filepath)
-        logger.info(f"Arquivo salvo em: {filepath}")
+        logger.debug(f"Arquivo salvo em: {filepath}")
+        
+        periodo_informado = _periodo_requisitado()
         
         # Processa arquivo
         resultado = CSVProcessadorService.processar_saida(filepath)
@@ -630,13 +1010,15 @@ def upload_saida():
         vendedores_info = resultado['vendedores']
         motos_info = resultado['motos']
         
-        # Limpa dados antigos antes de inserir novos uploads
-        mongo.db.saida.delete_many({})
-        mongo.db.comissoes.delete_many({})
-        
-        # Salva no MongoDB
-        if dados:
-            mongo.db.saida.insert_many(dados)
+        # Substitui apenas o período (competência) principal do arquivo
+        PeriodoService.garantir_indices()
+        periodos = PeriodoService.atribuir_periodos_saida(dados, periodo_informado)
+        periodo = PeriodoService.periodo_principal(dados, periodo_informado)
+        delta = _gravar_lote('saida', dados, periodo)
+        logger.info(
+            f"Saída gravada: {len(dados)} linha(s), período {periodo} substituído, período(s) {periodos}",
+            extra={'arquivo': filename, 'bytes': os.path.getsize(filepath), 'linhas': len(dados), 'periodo': periodo, 'periodos': periodos}
+        )
         
         # Monta mensagem de feedback
         mensagens = []
@@ -649,16 +1031,28 @@ def upload_saida():
         if motos_info['duplicado_count'] > 0:
             mensagens.append(f"{motos_info['duplicado_count']} moto(s) já existente(s)")
         
+        if delta:
+            mensagens.insert(0, _mensagem_delta(delta))
+        
         mensagem_completa = f"{len(dados)} linhas processadas. " + " | ".join(mensagens) if mensagens else f"{len(dados)} linhas processadas"
         
-        return jsonify({
+        resposta = {
             'status': 'sucesso',
             'mensagem': mensagem_completa,
             'quantidade': len(dados),
+            'periodos': periodos,
             'vendedores': vendedores_info,
             'motos': motos_info
-        })
+        }
         
+        if delta:
+            resposta['modo'] = 'incremental'
+            resposta['delta'] = delta
+        
+        return jsonify(resposta)
+        
+    except ValueError as e:
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 400
     except Exception as e:
         logger.error(f"Erro ao fazer upload saida.csv: {str(e)}", exc_info=True)
         return jsonify({'status': 'erro', 'mensagem': str(e)}), 500
@@ -674,7 +1068,7 @@ def upload_proposta():
             return jsonify({'status': 'erro', 'mensagem': 'Nenhum arquivo enviado'}), 400
         
         file = request.files['arquivo']
-        logger.info(f"Arquivo recebido: {file.filename}")
+        logger.debug(f"Arquivo recebido: {file.filename}")
         
         if file.filename == '':
             logger.warning("Arquivo vazio")
@@ -688,7 +1082,9 @@ def upload_proposta():
         os.makedirs('uploads', exist_ok=True)
         filepath = os.path.join('uploads', filename)
         file.save(filepath)
-        logger.info(f"Arquivo salvo em: {filepath}")
+        logger.debug(f"Arquivo salvo em: {filepath}")
+        
+        periodo_informado = _periodo_requisitado()
         
         # Processa arquivo
         resultado = CSVProcessadorService.processar_proposta(filepath)
@@ -696,13 +1092,15 @@ def upload_proposta():
         motos_info = resultado['motos']
         formas_info = resultado.get('formas', {'novo_count': 0, 'duplicado_count': 0, 'novos': [], 'duplicados': []})
         
-        # Limpa dados antigos antes de inserir novos uploads
-        mongo.db.propostas.delete_many({})
-        mongo.db.comissoes.delete_many({})
-        
-        # Salva no MongoDB
-        if dados:
-            mongo.db.propostas.insert_many(dados)
+        # Substitui apenas o período (competência) principal do arquivo
+        PeriodoService.garantir_indices()
+        periodos = PeriodoService.atribuir_periodos_proposta(dados, periodo_informado)
+        periodo = PeriodoService.periodo_principal(dados, periodo_informado)
+        delta = _gravar_lote('propostas', dados, periodo)
+        logger.info(
+            f"Propostas gravadas: {len(dados)} linha(s), período {periodo} substituído, período(s) {periodos}",
+            extra={'arquivo': filename, 'bytes': os.path.getsize(filepath), 'linhas': len(dados), 'periodo': periodo, 'periodos': periodos}
+        )
         
         # Monta mensagem de feedback
         mensagens = []
@@ -715,21 +1113,158 @@ def upload_proposta():
         if formas_info['duplicado_count'] > 0:
             mensagens.append(f"{formas_info['duplicado_count']} forma(s) de recebimento existente(s)")
         
+        if delta:
+            mensagens.insert(0, _mensagem_delta(delta))
+        
         mensagem_completa = f"{len(dados)} linhas processadas. " + " | ".join(mensagens) if mensagens else f"{len(dados)} linhas processadas"
         
-        return jsonify({
+        resposta = {
             'status': 'sucesso',
             'mensagem': mensagem_completa,
             'quantidade': len(dados),
+            'periodos': periodos,
             'motos': motos_info,
             'formas': formas_info
-        })
+        }
         
+        if delta:
+            resposta['modo'] = 'incremental'
+            resposta['delta'] = delta
+        
+        return jsonify(resposta)
+        
+    except ValueError as e:
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 400
     except Exception as e:
         logger.error(f"Erro ao fazer upload proposta.csv: {str(e)}", exc_info=True)
         return jsonify({'status': 'erro', 'mensagem': str(e)}), 500
 
 
+@upload_bp.route('/lote', methods=['POST'])
+def upload_lote():
+    """Upload em lote de vários arquivos de saida/propostas (ou um .zip com eles)
+    
+    Campos aceitos: 'saida' e 'proposta' (tipo explícito) ou 'arquivos'
+    (tipo detectado pelo cabeçalho). O parsing roda em paralelo em processos
+    separados; o resultado é mesclado e gravado como nos uploads individuais.
+    """
+    
+    pasta_lote = os.path.join('uploads', f"lote_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}")
+    
+    try:
+        inicio = time.perf_counter()
+        periodo_informado = _periodo_requisitado()
+        
+        os.makedirs(pasta_lote, exist_ok=True)
+        
+        arquivos = []
+        status_arquivos = []
+        nomes = {}  # caminho salvo -> nome informado no status (caminho dentro do zip)
+        
+        for campo in ('saida', 'proposta', 'arquivos'):
+            for file in request.files.getlist(campo):
+                if not file or file.filename == '':
+                    continue
+                
+                filename = secure_filename(file.filename)
+                
+                if filename.lower().endswith('.zip'):
+                    caminho_zip = os.path.join(pasta_lote, f"{len(arquivos)}_{filename}")
+                    file.save(caminho_zip)
+                    caminhos, recusados = _extrair_zip(caminho_zip, pasta_lote, len(arquivos))
+                    for caminho, nome in caminhos:
+                        arquivos.append((campo, caminho))
+                        nomes[caminho] = nome
+                    status_arquivos.extend(recusados)
+                    continue
+                
+                if not allowed_file(filename):
+                    status_arquivos.append({'arquivo': filename, 'tipo': None, 'status': 'erro', 'linhas': 0, 'tempo_ms': 0, 'mensagem': 'Tipo de arquivo não permitido'})
+                    continue
+                
+                # Subpasta por arquivo: dois envios com o mesmo nome não se sobrescrevem
+                pasta = os.path.join(pasta_lote, str(len(arquivos)))
+                os.makedirs(pasta, exist_ok=True)
+                caminho = os.path.join(pasta, filename)
+                file.save(caminho)
+                arquivos.append((campo, caminho))
+        
+        # Resolve o tipo de cada arquivo (campo explícito ou cabeçalho)
+        arquivos_tipados = []
+        for campo, caminho in arquivos:
+            tipo = campo if campo in ('saida', 'proposta') else CSVProcessadorService.detectar_tipo(caminho)
+            if not tipo:
+                status_arquivos.append({'arquivo': nomes.get(caminho, os.path.basename(caminho)), 'tipo': None, 'status': 'erro', 'linhas': 0, 'tempo_ms': 0, 'mensagem': 'Tipo de arquivo não reconhecido pelo cabeçalho'})
+                continue
+            arquivos_tipados.append((tipo, caminho))
+        
+        if not arquivos_tipados:
+            return jsonify({'status': 'erro', 'mensagem': 'Nenhum arquivo válido enviado', 'arquivos': status_arquivos}), 400
+        
+        logger.info(f"Upload em lote: {len(arquivos_tipados)} arquivo(s) em {pasta_lote}")
+        
+        resultado = CSVProcessadorService.processar_lote(arquivos_tipados, current_app.config.get('UPLOAD_WORKERS'))
+        for item, (_, caminho) in zip(resultado['arquivos'], arquivos_tipados):
+            item['arquivo'] = nomes.get(caminho, item['arquivo'])
+        status_arquivos = resultado['arquivos'] + status_arquivos
+        
+        # Nada é gravado se algum arquivo falhou: os períodos seriam substituídos
+        # (ou o delta aplicado) sem as linhas dele, apagando os dados já gravados
+        erros = [a for a in status_arquivos if a['status'] != 'sucesso']
+        if erros:
+            return jsonify({
+                'status': 'erro',
+                'mensagem': f"{len(erros)} arquivo(s) com erro; nenhum dado foi gravado. Corrija e reenvie o lote",
+                'arquivos': status_arquivos
+            }), 400
+        
+        # Grava saída antes das propostas: o período das propostas vem do pedido na saída
+        PeriodoService.garantir_indices()
+        periodos = set()
+        deltas = {}
+        
+        if resultado['saida']:
+            periodos_saida = PeriodoService.atribuir_periodos_saida(resultado['saida'], periodo_informado)
+            periodo = PeriodoService.periodo_principal(resultado['saida'], periodo_informado)
+            deltas['saida'] = _gravar_lote('saida', resultado['saida'], periodo)
+            periodos.update(periodos_saida)
+        
+        if resultado['propostas']:
+            periodos_proposta = PeriodoService.atribuir_periodos_proposta(resultado['propostas'], periodo_informado)
+            periodo = PeriodoService.periodo_principal(resultado['propostas'], periodo_informado)
+            deltas['propostas'] = _gravar_lote('propostas', resultado['propostas'], periodo)
+            periodos.update(periodos_proposta)
+        
+        resposta = {
+            'status': 'sucesso',
+            'mensagem': f"{len(resultado['saida'])} linha(s) de saída e {len(resultado['propostas'])} linha(s) de propostas processadas",
+            'arquivos': status_arquivos,
+            'periodos': sorted(periodos),
+            'vendedores': resultado['vendedores'],
+            'motos': resultado['motos'],
+            'formas': resultado['formas'],
+            'workers': resultado['workers'],
+            'tempo_parse_ms': resultado['tempo_parse_ms'],
+            'tempo_total_ms': round((time.perf_counter() - inicio) * 1000, 1)
+        }
+        
+        if any(deltas.values()):
+            resposta['modo'] = 'incremental'
+            resposta['delta'] = deltas
+        
+        return jsonify(resposta)
+        
+    except ValueError as e:
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 400
+    except zipfile.BadZipFile:
+        return jsonify({'status': 'erro', 'mensagem': 'Arquivo .zip inválido'}), 400
+    except Exception as e:
+        logger.error(f"Erro ao fazer upload em lote: {str(e)}", exc_info=True)
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 500
+    finally:
+        shutil.rmtree(pasta_lote, ignore_errors=True)
+
+
 # ========== ROTAS DE PÁGINA ==========
 
 @main_bp.route('/parametros')
@@ -763,6 +1298,7 @@ def deletar_forma_recebimento(forma_id):
     try:
         resultado = FormaRecebimentoService.deletar_forma(forma_id)
         if resultado.get('sucesso'):
+            PeriodoService.descartar_resumos()
             return jsonify({'status': 'sucesso', 'mensagem': 'Forma de recebimento deletada'})
         else:
             return jsonify({'status': 'erro', 'mensagem': 'Forma não encontrada'}), 404
@@ -777,6 +1313,7 @@ def desativar_forma_recebimento(forma_id):
     try:
         resultado = FormaRecebimentoService.desativar_forma(forma_id)
         if resultado.get('sucesso'):
+            PeriodoService.descartar_resumos()
             return jsonify({'status': 'sucesso', 'mensagem': 'Forma de recebimento desativada'})
         else:
             return jsonify({'status': 'erro', 'mensagem': 'Forma não encontrada'}), 404
@@ -796,6 +1333,7 @@ def atualizar_aplicar_vp(forma_id):
         
         resultado = FormaRecebimentoService.atualizar_aplicar_vp(forma_id, aplicar_vp, taxa_juros, tabela_progressiva_id)
         if resultado.get('sucesso'):
+            PeriodoService.descartar_resumos()
             return jsonify({'status': 'sucesso', 'mensagem': 'Configuração atualizada', 'dados': resultado.get('forma')})
         else:
             return jsonify({'status': 'erro', 'mensagem': 'Forma não encontrada'}), 404
@@ -810,11 +1348,7 @@ def atualizar_aplicar_vp(forma_id):
 def listar_parametros_interno():
     """Lista parâmetros de alíquota para vendedores internos"""
     try:
-        parametros = list(mongo.db.parametros_aliquota.find({'eh_interno': True}).sort('meta_min', 1))
-        
-        # Converter ObjectId para string
-        for param in parametros:
-            param['_id'] = str(param.get('_id', ''))
+        parametros = ParametroAliquotaRepository.listar_por_tipo(True)
         
         return jsonify({'status': 'sucesso', 'dados': parametros})
     except Exception as e:
@@ -826,11 +1360,7 @@ def listar_parametros_interno():
 def listar_parametros_externo():
     """Lista parâmetros de alíquota para vendedores externos"""
     try:
-        parametros = list(mongo.db.parametros_aliquota.find({'eh_interno': False}).sort('meta_min', 1))
-        
-        # Converter ObjectId para string
-        for param in parametros:
-            param['_id'] = str(param.get('_id', ''))
+        parametros = ParametroAliquotaRepository.listar_por_tipo(False)
         
         return jsonify({'status': 'sucesso', 'dados': parametros})
     except Exception as e:
@@ -857,7 +1387,8 @@ def criar_parametro_interno():
             'criado_em': datetime.now()
         }
         
-        resultado = mongo.db.parametros_aliquota.insert_one(novo_parametro)
+        resultado = ParametroAliquotaRepository.insert_one(novo_parametro)
+        PeriodoService.descartar_resumos()
         
         return jsonify({
             'status': 'sucesso',
@@ -888,7 +1419,8 @@ def criar_parametro_externo():
             'criado_em': datetime.now()
         }
         
-        resultado = mongo.db.parametros_aliquota.insert_one(novo_parametro)
+        resultado = ParametroAliquotaRepository.insert_one(novo_parametro)
+        PeriodoService.descartar_resumos()
         
         return jsonify({
             'status': 'sucesso',
@@ -906,7 +1438,7 @@ def deletar_parametro_interno(param_id):
     """Deleta um parâmetro de alíquota interno"""
     try:
         from bson import ObjectId
-        resultado = mongo.db.parametros_aliquota.delete_one({
+        resultado = ParametroAliquotaRepository.delete_one({
             '_id': ObjectId(param_id),
             'eh_interno': True
         })
@@ -914,6 +1446,7 @@ def deletar_parametro_interno(param_id):
         if resultado.deleted_count == 0:
             return jsonify({'status': 'erro', 'mensagem': 'Parâmetro não encontrado'}), 404
         
+        PeriodoService.descartar_resumos()
         return jsonify({'status': 'sucesso', 'mensagem': 'Parâmetro deletado com sucesso'})
         
     except Exception as e:
@@ -926,7 +1459,7 @@ def deletar_parametro_externo(param_id):
     """Deleta um parâmetro de alíquota externo"""
     try:
         from bson import ObjectId
-        resultado = mongo.db.parametros_aliquota.delete_one({
+        resultado = ParametroAliquotaRepository.delete_one({
             '_id': ObjectId(param_id),
             'eh_interno': False
         })
@@ -934,6 +1467,7 @@ def deletar_parametro_externo(param_id):
         if resultado.deleted_count == 0:
             return jsonify({'status': 'erro', 'mensagem': 'Parâmetro não encontrado'}), 404
         
+        PeriodoService.descartar_resumos()
         return jsonify({'status': 'sucesso', 'mensagem': 'Parâmetro deletado com sucesso'})
         
     except Exception as e:
@@ -954,7 +1488,7 @@ def atualizar_parametro_interno(param_id):
             'aliquota': float(dados.get('aliquota'))
         }
         
-        resultado = mongo.db.parametros_aliquota.update_one(
+        resultado = ParametroAliquotaRepository.update_one(
             {'_id': ObjectId(param_id), 'eh_interno': True},
             {'$set': atualizacao}
         )
@@ -962,6 +1496,7 @@ def atualizar_parametro_interno(param_id):
         if resultado.matched_count == 0:
             return jsonify({'status': 'erro', 'mensagem': 'Parâmetro não encontrado'}), 404
         
+        PeriodoService.descartar_resumos()
         return jsonify({'status': 'sucesso', 'mensagem': 'Parâmetro atualizado com sucesso'})
         
     except Exception as e:
@@ -982,7 +1517,7 @@ def atualizar_parametro_externo(param_id):
             'aliquota': float(dados.get('aliquota'))
         }
         
-        resultado = mongo.db.parametros_aliquota.update_one(
+        resultado = ParametroAliquotaRepository.update_one(
             {'_id': ObjectId(param_id), 'eh_interno': False},
             {'$set': atualizacao}
         )
@@ -990,6 +1525,7 @@ def atualizar_parametro_externo(param_id):
         if resultado.matched_count == 0:
             return jsonify({'status': 'erro', 'mensagem': 'Parâmetro não encontrado'}), 404
         
+        PeriodoService.descartar_resumos()
         return jsonify({'status': 'sucesso', 'mensagem': 'Parâmetro atualizado com sucesso'})
         
     except Exception as e:
@@ -3,11 +3,34 @@
 Serviços de negócio
 """
 
-import pandas as pd
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from decimal import Decimal
 from datetime import datetime
+from bson import ObjectId
+from pymongo import InsertOne, ReplaceOne, DeleteOne
 from app import mongo
-from app.models import ComissaoModel, PropostaModel, VendedorModel, MotoModel, FormaRecebimentoModel
+from app.models import ComissaoModel, PropostaModel, VendedorModel, MotoModel, FormaRecebimentoModel, LinhaProposta, AgregadoPedido, TotalVendedor
+from app.repositories import (
+    VendedorRepository, MotoRepository, FormaRecebimentoRepository, ParametroAliquotaRepository,
+    SaidaRepository, PropostaRepository, ComissaoRepository, ResumoPeriodoRepository, LoteLinhasRepository,
+    AtribuicaoVendedorRepository, repositorio_linhas
+)
+from app.utils.leitor_csv import ler_csv, ler_cabecalho
+from app.utils.leitor_planilha import eh_planilha, ler_planilha, ler_cabecalho_planilha
+from app.utils.executor import executar_cpu
+from app.utils.instrumentacao_mongo import medir_servico
+from app.utils.metricas import TEMPO_UPLOAD_PARSE, TEMPO_SINCRONIZACAO, TEMPO_RELATORIO, registrar_cache
+from app.utils.snapshot_linhas import valores
+from app.utils.centavos import arredondar_centavos, para_centavos, para_reais, multiplicar, somar_por
+
+logger = logging.getLogger(__name__)
 
 class ValorPresenteService:
     """Serviço para cálculo de Valor Presente (VP) de parcelas
@@ -19,6 +42,10 @@ class ValorPresenteService:
     - P = valor da parcela
     - i = taxa de juros (ex: 0.02 para 2%)
     - x = número da parcela (1 a n)
+    
+    Os cálculos são funções puras sobre números (chamadas por linha nos
+    relatórios): entradas inválidas para o cálculo retornam o valor neutro
+    pelas validações iniciais, sem try/except.
     """
     
     @staticmethod
@@ -37,24 +64,18 @@ class ValorPresenteService:
             >>> ValorPresenteService.calcular_valor_presente(100, 12, 0.02)
             1054.88  # VP de 12 parcelas de R$100 a 2% ao mês
         """
-        try:
-            if not valor_parcela or numero_parcelas <= 0 or taxa_juros < 0:
-                return 0.0
-            
-            vp_total = 0.0
-            
-            # Calcula VP para cada parcela
-            for x in range(1, numero_parcelas + 1):
-                # VP_parcela = valor_parcela / (1 + taxa)^x
-                vp_parcela = valor_parcela / ((1 + taxa_juros) ** x)
-                vp_total += vp_parcela
-            
-            return round(vp_total, 2)
-            
-        except Exception as e:
-            import logging
-            logging.error(f"Erro ao calcular valor presente: {str(e)}", exc_info=True)
+        if not valor_parcela or numero_parcelas <= 0 or taxa_juros < 0:
             return 0.0
+        
+        vp_total = 0.0
+        
+        # Calcula VP para cada parcela
+        for x in range(1, numero_parcelas + 1):
+            # VP_parcela = valor_parcela / (1 + taxa)^x
+            vp_parcela = valor_parcela / ((1 + taxa_juros) ** x)
+            vp_total += vp_parcela
+        
+        return round(vp_total, 2)
     
     @staticmethod
     def calcular_valor_presente_com_coeficientes(valor_parcela, numero_parcelas, coeficientes):
@@ -77,30 +98,24 @@ class ValorPresenteService:
             >>> ValorPresenteService.calcular_valor_presente_com_coeficientes(2000, 10, coefs)
             19847.35  # VP com descontos progressivos
         """
-        try:
-            if not valor_parcela or numero_parcelas <= 0 or not coeficientes:
-                return 0.0
-            
-            # Valida que temos coeficientes para todas as parcelas
-            if len(coeficientes) != numero_parcelas:
-                return 0.0
-            
-            vp_total = 0.0
-            
-            # Calcula VP para cada parcela com seu coeficiente
-            for i, coef in enumerate(coeficientes, 1):
-                # Converte coeficiente de percentual para decimal (0.5151% = 0.005151)
-                desconto_decimal = coef / 100
-                # Aplica desconto: valor_parcela * (1 - desconto)
-                vp_parcela = valor_parcela * (1 - desconto_decimal)
-                vp_total += vp_parcela
-            
-            return round(vp_total, 2)
-            
-        except Exception as e:
-            import logging
-            logging.error(f"Erro ao calcular VP com coeficientes: {str(e)}", exc_info=True)
+        if not valor_parcela or numero_parcelas <= 0 or not coeficientes:
+            return 0.0
+        
+        # Valida que temos coeficientes para todas as parcelas
+        if len(coeficientes) != numero_parcelas:
             return 0.0
+        
+        vp_total = 0.0
+        
+        # Calcula VP para cada parcela com seu coeficiente
+        for i, coef in enumerate(coeficientes, 1):
+            # Converte coeficiente de percentual para decimal (0.5151% = 0.005151)
+            desconto_decimal = coef / 100
+            # Aplica desconto: valor_parcela * (1 - desconto)
+            vp_parcela = valor_parcela * (1 - desconto_decimal)
+            vp_total += vp_parcela
+        
+        return round(vp_total, 2)
     
     @staticmethod
     def calcular_desconto_percentual(valor_tabela, valor_parcela, numero_parcelas, taxa_juros):
@@ -125,43 +140,32 @@ class ValorPresenteService:
             >>> resultado['desconto_percentual']
             8.5  # 8.5% de desconto
         """
-        try:
-            if not valor_tabela or valor_tabela <= 0:
-                return {
-                    'valor_presente': 0.0,
-                    'desconto_absoluto': 0.0,
-                    'desconto_percentual': 0.0,
-                    'desconto_percentual_formatado': '0.00%'
-                }
-            
-            # Calcula valor presente
-            vp_total = ValorPresenteService.calcular_valor_presente(valor_parcela, numero_parcelas, taxa_juros)
-            
-            # Calcula diferença (desconto)
-            desconto_absoluto = valor_tabela - vp_total
-            
-            # Calcula percentual de desconto
-            if valor_tabela > 0:
-                desconto_percentual = (desconto_absoluto / valor_tabela) * 100
-            else:
-                desconto_percentual = 0.0
-            
-            return {
-                'valor_presente': round(vp_total, 2),
-                'desconto_absoluto': round(desconto_absoluto, 2),
-                'desconto_percentual': round(desconto_percentual, 2),
-                'desconto_percentual_formatado': f'{desconto_percentual:.2f}%'
-            }
-            
-        except Exception as e:
-            import logging
-            logging.error(f"Erro ao calcular desconto percentual: {str(e)}", exc_info=True)
+        if not valor_tabela or valor_tabela <= 0:
             return {
                 'valor_presente': 0.0,
                 'desconto_absoluto': 0.0,
                 'desconto_percentual': 0.0,
                 'desconto_percentual_formatado': '0.00%'
             }
+        
+        # Calcula valor presente
+        vp_total = ValorPresenteService.calcular_valor_presente(valor_parcela, numero_parcelas, taxa_juros)
+        
+        # Calcula diferença (desconto)
+        desconto_absoluto = valor_tabela - vp_total
+        
+        # Calcula percentual de desconto
+        if valor_tabela > 0:
+            desconto_percentual = (desconto_absoluto / valor_tabela) * 100
+        else:
+            desconto_percentual = 0.0
+        
+        return {
+            'valor_presente': round(vp_total, 2),
+            'desconto_absoluto': round(desconto_absoluto, 2),
+            'desconto_percentual': round(desconto_percentual, 2),
+            'desconto_percentual_formatado': f'{desconto_percentual:.2f}%'
+        }
     
     @staticmethod
     def detectar_taxa_padrao(forma_recebimento):
@@ -178,11 +182,7 @@ class ValorPresenteService:
         """
         try:
             # Tenta buscar do banco de dados
-            col = mongo.db.formas_recebimento
-            forma_doc = col.find_one({
-                'nome': forma_recebimento.strip(),
-                'status': 'ativo'
-            })
+            forma_doc = FormaRecebimentoRepository.ativa(forma_recebimento.strip(), 'vp')
             
             if forma_doc:
                 return {
@@ -190,8 +190,7 @@ class ValorPresenteService:
                     'taxa_juros': forma_doc.get('taxa_juros', 0.0)
                 }
         except Exception as e:
-            import logging
-            logging.debug(f"Erro ao buscar taxa do banco de dados: {str(e)}")
+            logger.debug(f"Erro ao buscar taxa do banco de dados: {str(e)}")
         
         # FALLBACK: Valores padrão hardcoded (para compatibilidade)
         forma_upper = str(forma_recebimento).upper().strip()
@@ -237,37 +236,59 @@ class ValorPresenteService:
         Fórmula:
             PV = PMT * [((1+i)^n - 1) / (i * (1+i)^n)]
         """
-        try:
-            if not valor_total or numero_parcelas <= 0 or taxa_juros < 0:
-                return valor_total
-            
-            # Se só 1 parcela, não aplica juro
-            if numero_parcelas == 1:
-                return valor_total
-            
-            # PASSO 1: Calcula PMT (parcela)
-            pmt = valor_total / numero_parcelas
-            
-            # PASSO 2: Aplica fórmula HP12C inversa: PV = PMT * [((1+i)^n - 1) / (i * (1+i)^n)]
-            taxa_mais_1 = 1 + taxa_juros
-            potencia_n = taxa_mais_1 ** numero_parcelas
-            
-            numerador = potencia_n - 1
-            denominador = taxa_juros * potencia_n
-            
-            if denominador == 0:
-                return valor_total
-            
-            # Calcula PV (valor presente)
-            pv = pmt * (numerador / denominador)
-            
-            return round(pv, 2)
-            
-        except Exception as e:
-            import logging
-            logging.error(f"Erro ao calcular valor com juro simples: {str(e)}", exc_info=True)
+        if not valor_total or numero_parcelas <= 0 or taxa_juros < 0:
+            return valor_total
+        
+        # Se só 1 parcela, não aplica juro
+        if numero_parcelas == 1:
             return valor_total
+        
+        # PASSO 1: Calcula PMT (parcela)
+        pmt = valor_total / numero_parcelas
+        
+        # PASSO 2: Aplica fórmula HP12C inversa: PV = PMT * [((1+i)^n - 1) / (i * (1+i)^n)]
+        taxa_mais_1 = 1 + taxa_juros
+        potencia_n = taxa_mais_1 ** numero_parcelas
+        
+        numerador = potencia_n - 1
+        denominador = taxa_juros * potencia_n
+        
+        if denominador == 0:
+            return valor_total
+        
+        # Calcula PV (valor presente)
+        pv = pmt * (numerador / denominador)
+        
+        return round(pv, 2)
+    
+    @staticmethod
+    def valores_presentes_centavos(valores_centavos, parcelas, taxas):
+        """calcular_valor_com_juro_simples em lote, em centavos (app/utils/centavos.py)
+        
+        Args:
+            valores_centavos: valor de cada linha em centavos, int64 [linhas]
+            parcelas: número de parcelas de cada linha [linhas]
+            taxas: taxa de juros (decimal) de cada linha em cada configuração [linhas, K];
+                0 = sem VP para a linha
+        
+        Returns:
+            ndarray: int64 [linhas, K] com o valor presente arredondado ao centavo
+                (o próprio valor quando o VP não se aplica: taxa 0, 1 parcela ou valor 0)
+        """
+        valor = np.asarray(valores_centavos, dtype=np.int64)
+        parcelas = np.asarray(parcelas, dtype=float)[:, None]
+        taxas = np.asarray(taxas, dtype=float)
+        aplica = (taxas > 0) & (parcelas >= 2) & (valor != 0)[:, None]
+        
+        # PV = PMT * [((1+i)^n - 1) / (i * (1+i)^n)], com PMT em centavos
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            juros = np.where(aplica, taxas, 1.0)
+            potencia = (1 + juros) ** parcelas
+            valor_presente = (valor[:, None] / parcelas) * ((potencia - 1) / (juros * potencia))
+        
+        return np.where(aplica, arredondar_centavos(np.where(aplica, valor_presente, 0.0)), valor[:, None])
 
+@medir_servico
 class VendedorService:
     """Serviço para gerenciar vendedores"""
     
@@ -276,92 +297,60 @@ class VendedorService:
         """Cria um novo vendedor"""
         try:
             # Verifica se já existe
-            col = mongo.db.vendedores
-            existente = col.find_one({'nome': dados.get('nome')})
-            
-            if existente:
+            if VendedorRepository.por_nome(dados.get('nome'), 'id'):
                 return {'erro': 'Vendedor já existe'}
             
             vendedor = VendedorModel.create(dados)
-            col.insert_one(vendedor)
+            VendedorRepository.insert_one(vendedor)
             
             return {'sucesso': True, 'id': str(vendedor['_id'])}
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao criar vendedor: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao criar vendedor: {str(e)}", exc_info=True)
             return {'erro': str(e)}
     
     @staticmethod
     def listar_vendedores(status='ativo'):
         """Lista vendedores ativos"""
         try:
-            col = mongo.db.vendedores
-            query = {'status': status} if status else {}
-            vendedores = list(col.find(query).sort('nome', 1))
-            
-            # Converte ObjectId para string
-            for v in vendedores:
-                v['_id'] = str(v['_id'])
-            
-            return vendedores
+            return VendedorRepository.listar_por_status(status, sort=[('nome', 1)])
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao listar vendedores: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao listar vendedores: {str(e)}", exc_info=True)
             return []
     
     @staticmethod
     def obter_vendedor(vendor_id):
         """Obtém um vendedor por ID"""
         try:
-            from bson import ObjectId
-            col = mongo.db.vendedores
-            vendedor = col.find_one({'_id': ObjectId(vendor_id)})
-            
-            if vendedor:
-                vendedor['_id'] = str(vendedor['_id'])
-            
-            return vendedor
+            return VendedorRepository.por_id(vendor_id)
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao obter vendedor: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao obter vendedor: {str(e)}", exc_info=True)
             return None
     
     @staticmethod
     def atualizar_vendedor(vendor_id, dados):
         """Atualiza um vendedor"""
         try:
-            from bson import ObjectId
-            col = mongo.db.vendedores
-            
             dados['data_atualizacao'] = datetime.now()
             
-            result = col.update_one(
-                {'_id': ObjectId(vendor_id)},
-                {'$set': dados}
-            )
+            result = VendedorRepository.atualizar_por_id(vendor_id, dados)
             
             return {'sucesso': result.modified_count > 0}
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao atualizar vendedor: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao atualizar vendedor: {str(e)}", exc_info=True)
             return {'erro': str(e)}
     
     @staticmethod
     def deletar_vendedor(vendor_id):
         """Deleta um vendedor (soft delete - marca como inativo)"""
         try:
-            from bson import ObjectId
-            col = mongo.db.vendedores
-            
-            result = col.update_one(
-                {'_id': ObjectId(vendor_id)},
-                {'$set': {'status': 'inativo', 'data_atualizacao': datetime.now()}}
+            result = VendedorRepository.atualizar_por_id(
+                vendor_id,
+                {'status': 'inativo', 'data_atualizacao': datetime.now()}
             )
             
             return {'sucesso': result.modified_count > 0}
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao deletar vendedor: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao deletar vendedor: {str(e)}", exc_info=True)
             return {'erro': str(e)}
     
     @staticmethod
@@ -379,11 +368,10 @@ class VendedorService:
             if not nome_vendedor or nome_vendedor.lower() == 'desconhecido':
                 return {'existe': False, 'criado': False, 'vendedor': None}
             
-            col = mongo.db.vendedores
             nome_vendedor = nome_vendedor.strip()
             
             # Verifica se já existe
-            existente = col.find_one({'nome': nome_vendedor})
+            existente = VendedorRepository.por_nome(nome_vendedor)
             
             if existente:
                 return {'existe': True, 'criado': False, 'vendedor': existente}
@@ -394,12 +382,11 @@ class VendedorService:
                 'cidade': cidade.strip() if cidade else '',
                 'status': 'ativo'
             })
-            col.insert_one(vendedor)
+            VendedorRepository.insert_one(vendedor)
             
             return {'existe': False, 'criado': True, 'vendedor': vendedor}
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao garantir vendedor {nome_vendedor}: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao garantir vendedor {nome_vendedor}: {str(e)}", exc_info=True)
             return {'existe': False, 'criado': False, 'vendedor': None}
     
     @staticmethod
@@ -411,7 +398,6 @@ class VendedorService:
         Retorna: dict com status, novo_count, duplicado_count, atualizados, duplicados
         """
         try:
-            col = mongo.db.vendedores
             novo_count = 0
             duplicado_count = 0
             novos = []
@@ -429,7 +415,7 @@ class VendedorService:
                 cidade = cidade.strip() if cidade else ''
                 
                 # Verifica se já existe (CASE-INSENSITIVE para evitar duplicatas)
-                existente = col.find_one({'nome': {'$regex': f'^{nome}$', '$options': 'i'}})
+                existente = VendedorRepository.por_nome_sem_caixa(nome, 'sincronizacao')
                 
                 if not existente:
                     # Cria novo vendedor
@@ -438,7 +424,7 @@ class VendedorService:
                         'cidade': cidade,
                         'status': 'ativo'
                     })
-                    col.insert_one(vendedor)
+                    VendedorRepository.insert_one(vendedor)
                     novo_count += 1
                     novos.append(nome)
                 else:
@@ -447,9 +433,9 @@ class VendedorService:
                     duplicados.append(nome)
                     # Se temos cidade e é diferente, atualiza
                     if cidade and existente.get('cidade', '') != cidade:
-                        col.update_one(
-                            {'_id': existente['_id']},
-                            {'$set': {'cidade': cidade, 'data_atualizacao': __import__('datetime').datetime.now()}}
+                        VendedorRepository.atualizar_por_id(
+                            existente['_id'],
+                            {'cidade': cidade, 'data_atualizacao': datetime.now()}
                         )
             
             return {
@@ -460,10 +446,10 @@ class VendedorService:
                 'duplicados': duplicados
             }
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao sincronizar vendedores: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao sincronizar vendedores: {str(e)}", exc_info=True)
             return {'erro': str(e)}
 
+@medir_servico
 class MotoService:
     """Serviço para gerenciar motocicletas"""
     
@@ -471,87 +457,57 @@ class MotoService:
     def criar_moto(dados):
         """Cria uma nova moto"""
         try:
-            col = mongo.db.motos
-            existente = col.find_one({'nome': dados.get('nome')})
-            
-            if existente:
+            if MotoRepository.por_nome(dados.get('nome'), 'id'):
                 return {'erro': 'Moto já existe'}
             
             moto = MotoModel.create(dados)
-            col.insert_one(moto)
+            MotoRepository.insert_one(moto)
             
             return {'sucesso': True, 'id': str(moto['_id'])}
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao criar moto: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao criar moto: {str(e)}", exc_info=True)
             return {'erro': str(e)}
     
     @staticmethod
     def listar_motos(status='ativo'):
         """Lista todas as motos"""
         try:
-            col = mongo.db.motos
-            motos = list(col.find({'status': status}))
-            
-            # Converte ObjectId para string
-            for moto in motos:
-                moto['_id'] = str(moto['_id'])
-            
-            return motos
+            return MotoRepository.listar({'status': status})
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao listar motos: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao listar motos: {str(e)}", exc_info=True)
             return []
     
     @staticmethod
     def obter_moto(moto_id):
         """Obtém uma moto por ID"""
         try:
-            from bson import ObjectId
-            col = mongo.db.motos
-            moto = col.find_one({'_id': ObjectId(moto_id)})
-            
-            if moto:
-                moto['_id'] = str(moto['_id'])
-            
-            return moto
+            return MotoRepository.por_id(moto_id)
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao obter moto: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao obter moto: {str(e)}", exc_info=True)
             return None
     
     @staticmethod
     def atualizar_moto(moto_id, dados):
         """Atualiza uma moto"""
         try:
-            from bson import ObjectId
-            col = mongo.db.motos
-            
             dados['data_atualizacao'] = datetime.now()
-            resultado = col.update_one(
-                {'_id': ObjectId(moto_id)},
-                {'$set': dados}
-            )
+            resultado = MotoRepository.atualizar_por_id(moto_id, dados)
             
             if resultado.matched_count == 0:
                 return {'erro': 'Moto não encontrada'}
             
             return {'sucesso': True}
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao atualizar moto: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao atualizar moto: {str(e)}", exc_info=True)
             return {'erro': str(e)}
     
     @staticmethod
     def deletar_moto(moto_id):
         """Deleta (inativa) uma moto"""
         try:
-            from bson import ObjectId
-            col = mongo.db.motos
-            
-            resultado = col.update_one(
-                {'_id': ObjectId(moto_id)},
-                {'$set': {'status': 'inativo', 'data_atualizacao': datetime.now()}}
+            resultado = MotoRepository.atualizar_por_id(
+                moto_id,
+                {'status': 'inativo', 'data_atualizacao': datetime.now()}
             )
             
             if resultado.matched_count == 0:
@@ -559,8 +515,7 @@ class MotoService:
             
             return {'sucesso': True}
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao deletar moto: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao deletar moto: {str(e)}", exc_info=True)
             return {'erro': str(e)}
     
     @staticmethod
@@ -578,11 +533,10 @@ class MotoService:
             if not nome_moto or nome_moto.lower() == 'desconhecida':
                 return {'existe': False, 'criado': False, 'moto': None}
             
-            col = mongo.db.motos
             nome_moto = nome_moto.strip()
             
             # Verifica se já existe
-            existente = col.find_one({'nome': nome_moto})
+            existente = MotoRepository.por_nome(nome_moto)
             
             if existente:
                 return {'existe': True, 'criado': False, 'moto': existente}
@@ -593,12 +547,11 @@ class MotoService:
                 'alta_cc': bool(alta_cc),
                 'status': 'ativo'
             })
-            col.insert_one(moto)
+            MotoRepository.insert_one(moto)
             
             return {'existe': False, 'criado': True, 'moto': moto}
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao garantir moto {nome_moto}: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao garantir moto {nome_moto}: {str(e)}", exc_info=True)
             return {'existe': False, 'criado': False, 'moto': None}
     
     @staticmethod
@@ -611,10 +564,6 @@ class MotoService:
         Retorna: dict com status, novo_count, duplicado_count, novos, duplicados
         """
         try:
-            import logging
-            logger = logging.getLogger(__name__)
-            
-            col = mongo.db.motos
             novo_count = 0
             duplicado_count = 0
             novos = []
@@ -640,11 +589,11 @@ class MotoService:
                     valor_tabela = 0.0
                 
                 # Verifica se já existe
-                existente = col.find_one({'nome': nome})
+                existente = MotoRepository.por_nome(nome, 'sincronizacao')
                 
                 if not existente:
                     # Procura com busca case-insensitive como fallback
-                    existente = col.find_one({'nome': {'$regex': f'^{nome}$', '$options': 'i'}})
+                    existente = MotoRepository.por_nome_sem_caixa(nome, 'sincronizacao')
                     if not existente:
                         # Cria nova moto
                         moto = MotoModel.create({
@@ -653,7 +602,7 @@ class MotoService:
                             'valor_tabela': valor_tabela,
                             'status': 'ativo'
                         })
-                        col.insert_one(moto)
+                        MotoRepository.insert_one(moto)
                         novo_count += 1
                         novos.append(nome)
                     else:
@@ -661,9 +610,9 @@ class MotoService:
                         update_data = {
                             'status': 'ativo',
                             'valor_tabela': valor_tabela, 
-                            'data_atualizacao': __import__('datetime').datetime.now()
+                            'data_atualizacao': datetime.now()
                         }
-                        col.update_one({'_id': existente['_id']}, {'$set': update_data})
+                        MotoRepository.atualizar_por_id(existente['_id'], update_data)
                         duplicado_count += 1
                         duplicados.append(nome)
                 else:
@@ -671,14 +620,14 @@ class MotoService:
                     # Não atualiza alta_cc pois deve ser persistente no frontend
                     update_data = {
                         'status': 'ativo',
-                        'data_atualizacao': __import__('datetime').datetime.now()
+                        'data_atualizacao': datetime.now()
                     }
                     
                     # Atualiza valor_tabela se mudou
                     if existente.get('valor_tabela', 0.0) != valor_tabela:
                         update_data['valor_tabela'] = valor_tabela
                     
-                    col.update_one({'_id': existente['_id']}, {'$set': update_data})
+                    MotoRepository.atualizar_por_id(existente['_id'], update_data)
                     
                     duplicado_count += 1
                     duplicados.append(nome)
@@ -691,10 +640,10 @@ class MotoService:
                 'duplicados': duplicados
             }
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao sincronizar motos: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao sincronizar motos: {str(e)}", exc_info=True)
             return {'erro': str(e)}
 
+@medir_servico
 class ComissaoService:
     """Serviço de cálculo de comissão"""
     
@@ -730,10 +679,6 @@ class ComissaoService:
             dict: {'sucesso': bool, 'id': str, 'comissao': {}}
         """
         try:
-            from bson import ObjectId
-            
-            col = mongo.db.comissoes
-            
             comissao = {
                 '_id': ObjectId(),
                 'vendedor': dados_comissao.get('vendedor', ''),
@@ -747,7 +692,7 @@ class ComissaoService:
                 'data_processamento': datetime.now()
             }
             
-            col.insert_one(comissao)
+            ComissaoRepository.insert_one(comissao)
             
             return {
                 'sucesso': True,
@@ -755,8 +700,7 @@ class ComissaoService:
                 'comissao': comissao
             }
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao registrar comissão: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao registrar comissão: {str(e)}", exc_info=True)
             return {'sucesso': False, 'erro': str(e)}
     
     @staticmethod
@@ -774,7 +718,7 @@ class ComissaoService:
             dict: Resultado com valor e alíquota
         """
         
-        if not proposta or not valor_meta or valor_meta <= 0:
+        if not proposta or not valor_meta or valor_meta <= 0 or not math.isfinite(valor_meta):
             raise ValueError("Proposta ou meta inválida")
         
         # Calcula percentual de meta
@@ -784,8 +728,8 @@ class ComissaoService:
         # Obtém alíquota do banco de dados (ou padrão se não encontrar)
         aliquota, avisos = ComissaoService._obter_aliquota_banco(mongo.db, percentual_meta, eh_alta_cilindrada, eh_vendedor_interno)
         
-        # Calcula valor de comissão
-        valor_comissao = round(valor_venda * aliquota, 2)
+        # Calcula valor de comissão (em centavos, ver app/utils/centavos.py)
+        valor_comissao = float(para_reais(multiplicar(para_centavos(valor_venda), aliquota)))
         
         return {
             'id_proposta': proposta.get('id'),
@@ -829,7 +773,19 @@ class ComissaoService:
                 return ComissaoService.ALIQ_ACIMA_97_EXT  # 1.2%
             else:
                 return ComissaoService.ALIQ_ABAIXO_97_EXT  # 0.8%
-
+    
+    @staticmethod
+    def aviso_aliquota_padrao(percentual_meta, eh_alta_cilindrada, eh_vendedor_interno=True):
+        """Aviso de alíquota padrão usada por falta de faixa cadastrada (None se Meta % > 100)"""
+        
+        # NÃO mostra aviso se Meta % > 100% (venda acima do valor de tabela)
+        if percentual_meta > 100:
+            return None
+        
+        tipo_vendedor = "Interno" if eh_vendedor_interno else "Externo"
+        tipo_moto = "Alta CC" if eh_alta_cilindrada else "Baixa CC"
+        return f"⚠️ AVISO: Nenhuma alíquota cadastrada para {tipo_vendedor} - {tipo_moto} (Meta {percentual_meta:.2f}%). Usando valor padrão."
+    
     @staticmethod
     def _obter_aliquota_banco(mongo_db, percentual_meta, eh_alta_cilindrada, eh_vendedor_interno=True, tipo_moto_nome=None):
         """
@@ -845,11 +801,7 @@ class ComissaoService:
                 # Para interno, precisa saber o tipo de moto
                 tipo_moto = "Alta CC" if eh_alta_cilindrada else "Baixa CC"
                 
-                param = mongo_db.parametros_aliquota.find_one({
-                    'eh_interno': True,
-                    'tipo_moto': tipo_moto,
-                    'meta_min': {'$lte': percentual_meta}
-                })
+                param = ParametroAliquotaRepository.faixa(True, percentual_meta, tipo_moto, db=mongo_db)
                 
                 if param:
                     # Se meta_max está definido, verificar se está no intervalo
@@ -861,10 +813,7 @@ class ComissaoService:
                         return param.get('aliquota'), avisos
             else:
                 # Para externo, não diferencia tipo de moto
-                param = mongo_db.parametros_aliquota.find_one({
-                    'eh_interno': False,
-                    'meta_min': {'$lte': percentual_meta}
-                })
+                param = ParametroAliquotaRepository.faixa(False, percentual_meta, db=mongo_db)
                 
                 if param:
                     if param.get('meta_max') is not None:
@@ -874,12 +823,9 @@ class ComissaoService:
                         return param.get('aliquota'), avisos
             
             # Se não encontrou no banco, usa valor padrão (hardcoded) e adiciona aviso
-            tipo_vendedor = "Interno" if eh_vendedor_interno else "Externo"
-            tipo_moto = "Alta CC" if eh_alta_cilindrada else "Baixa CC"
-            
-            # NÃO mostra aviso se Meta % > 100% (venda acima do valor de tabela)
-            if percentual_meta <= 100:
-                avisos.append(f"⚠️ AVISO: Nenhuma alíquota cadastrada para {tipo_vendedor} - {tipo_moto} (Meta {percentual_meta:.2f}%). Usando valor padrão.")
+            aviso = ComissaoService.aviso_aliquota_padrao(percentual_meta, eh_alta_cilindrada, eh_vendedor_interno)
+            if aviso:
+                avisos.append(aviso)
             
             aliquota_padrao = ComissaoService._obter_aliquota(percentual_meta, eh_alta_cilindrada, eh_vendedor_interno)
             return aliquota_padrao, avisos
@@ -889,99 +835,463 @@ class ComissaoService:
             avisos.append(f"⚠️ ERRO ao buscar alíquota: {str(e)}. Usando valor padrão.")
             aliquota_padrao = ComissaoService._obter_aliquota(percentual_meta, eh_alta_cilindrada, eh_vendedor_interno)
             return aliquota_padrao, avisos
+    
+    # ===== Alíquotas em lote (numpy) =====
+    
+    # (eh_interno, eh_ac, tipo_moto da faixa): externo não diferencia o tipo de moto
+    GRUPOS_FAIXA = ((True, True, 'Alta CC'), (True, False, 'Baixa CC'), (False, None, None))
+    
+    @staticmethod
+    def _faixa_cadastrada(param):
+        """Parâmetro cadastrado normalizado (None se nunca pode ser escolhido pelo faixa)"""
+        eh_interno = param.get('eh_interno')
+        meta_min = param.get('meta_min')
+        
+        # O $lte do faixa só compara números; eh_interno é comparado como bool
+        if not isinstance(eh_interno, bool) or isinstance(meta_min, bool) or not isinstance(meta_min, (int, float)):
+            return None
+        
+        return {
+            'eh_interno': eh_interno,
+            'tipo_moto': param.get('tipo_moto'),
+            'meta_min': float(meta_min),
+            'meta_max': float(param['meta_max']) if param.get('meta_max') is not None else None,
+            'aliquota': float(param.get('aliquota') or 0)
+        }
+    
+    @staticmethod
+    def tabela_faixas():
+        """Tabela de alíquotas cadastrada, normalizada, numa única consulta
+        
+        Na ordem natural da collection: a mesma em que o faixa encontra a primeira.
+        """
+        return [
+            faixa for faixa in map(ComissaoService._faixa_cadastrada, ParametroAliquotaRepository.tabela())
+            if faixa is not None
+        ]
+    
+    @staticmethod
+    def _faixas_grupo(tabelas, eh_interno, tipo_moto):
+        """Matrizes [tabelas, faixas] com meta_min, meta_max e aliquota das faixas de um grupo
+        
+        Faixas na ordem da tabela; posições que sobram numa tabela ficam com
+        meta_min infinito (nunca servem) e meta_max ausente é NaN.
+        """
+        por_tabela = [
+            [p for p in tabela if p['eh_interno'] == eh_interno and (tipo_moto is None or p['tipo_moto'] == tipo_moto)]
+            for tabela in tabelas
+        ]
+        largura = max(1, max(len(faixas) for faixas in por_tabela))
+        
+        meta_min = np.full((len(tabelas), largura), np.inf)
+        meta_max = np.full((len(tabelas), largura), np.nan)
+        aliquota = np.zeros((len(tabelas), largura))
+        for k, faixas in enumerate(por_tabela):
+            for r, faixa in enumerate(faixas):
+                meta_min[k, r] = faixa['meta_min']
+                if faixa['meta_max'] is not None:
+                    meta_max[k, r] = faixa['meta_max']
+                aliquota[k, r] = faixa['aliquota']
+        return meta_min, meta_max, aliquota
+    
+    @staticmethod
+    def _aliquota_padrao(percentual_meta, eh_interno, eh_ac):
+        """_obter_aliquota sobre uma matriz de Meta %"""
+        regras = ComissaoService
+        if not eh_interno:
+            return np.where(percentual_meta >= 97, regras.ALIQ_ACIMA_97_EXT, regras.ALIQ_ABAIXO_97_EXT)
+        if eh_ac:
+            return np.where(percentual_meta >= 97, regras.ALIQ_AC_ACIMA_97_INT, regras.ALIQ_AC_ABAIXO_97_INT)
+        return np.select(
+            [percentual_meta >= 100, percentual_meta >= 97, percentual_meta >= 95],
+            [regras.ALIQ_OM_ACIMA_100_INT, regras.ALIQ_OM_97_A_99999_INT, regras.ALIQ_OM_95_A_96999_INT],
+            regras.ALIQ_OM_ATE_94999_INT
+        )
+    
+    @staticmethod
+    def _aliquotas_faixas(percentual_meta, faixas, padrao):
+        """Alíquota [itens, tabelas] pela primeira faixa com meta_min <= Meta % (como o faixa)
+        
+        Se a faixa encontrada tem meta_max e a Meta % passa dele, ou se nenhuma
+        serve, usa a alíquota padrão (como _obter_aliquota_banco).
+        
+        Returns:
+            tuple: (alíquotas, máscara dos itens que usaram a padrão)
+        """
+        meta_min, meta_max, aliquota = faixas
+        
+        servem = meta_min[None, :, :] <= percentual_meta[:, :, None]  # [itens, tabelas, faixas]
+        primeira = servem.argmax(axis=2)
+        tabela = np.arange(percentual_meta.shape[1])[None, :]
+        
+        maximo = meta_max[tabela, primeira]
+        valida = servem.any(axis=2) & (np.isnan(maximo) | (percentual_meta <= maximo))
+        return np.where(valida, aliquota[tabela, primeira], padrao), ~valida
+    
+    @staticmethod
+    def aliquotas(percentual_meta, eh_interno, eh_ac, tabelas):
+        """_obter_aliquota_banco vetorizado: alíquota de cada item em cada tabela
+        
+        Args:
+            percentual_meta: matriz [itens, tabelas] de Meta %
+            eh_interno, eh_ac: vetores bool [itens]
+            tabelas (list): tabelas de faixas (tabela_faixas() ou candidatas da simulação)
+        
+        Returns:
+            tuple: (alíquotas decimais [itens, tabelas], máscara [itens, tabelas] dos
+                itens sem faixa cadastrada, que usaram a alíquota padrão)
+        """
+        aliquota = np.zeros(percentual_meta.shape)
+        usou_padrao = np.zeros(percentual_meta.shape, dtype=bool)
+        for interno, alta_cilindrada, tipo_moto in ComissaoService.GRUPOS_FAIXA:
+            grupo = eh_interno & (eh_ac == alta_cilindrada) if interno else ~eh_interno
+            if not grupo.any():
+                continue
+            
+            percentual_grupo = percentual_meta[grupo]
+            aliquota[grupo], usou_padrao[grupo] = ComissaoService._aliquotas_faixas(
+                percentual_grupo,
+                ComissaoService._faixas_grupo(tabelas, interno, tipo_moto),
+                ComissaoService._aliquota_padrao(percentual_grupo, interno, alta_cilindrada)
+            )
+        return aliquota, usou_padrao
+    
+    @staticmethod
+    def calcular_pedidos(pedido_linha, valor_linha, parcelas, taxas, valor_tabela, eh_interno, eh_ac, tabelas):
+        """Comissão de vários pedidos de uma vez, em K configurações (numpy, centavos inteiros)
+        
+        Regras do resumo de comissões: valor presente de cada linha (forma com
+        VP e 2+ parcelas), soma por pedido, Meta % sobre o Valor Tabela (100
+        sem ele), alíquota pela tabela de faixas e comissão só para pedidos com
+        valor presente > 0. Arredondamentos: ver app/utils/centavos.py.
+        
+        Args:
+            pedido_linha: índice do pedido de cada linha [linhas]
+            valor_linha: valor de cada linha em centavos [linhas]
+            parcelas: número de parcelas de cada linha [linhas]
+            taxas: taxa de VP (decimal, 0 = sem VP) de cada linha em cada configuração [linhas, K]
+            valor_tabela: Valor Tabela de cada pedido em centavos (0 = sem) [pedidos]
+            eh_interno, eh_ac: bool [pedidos]
+            tabelas (list): K tabelas de faixas (tabela_faixas() ou candidatas)
+        
+        Returns:
+            dict: matrizes [linhas ou pedidos, K] 'vp_linha' e 'vp' (centavos), 'percentual_meta',
+                'aliquota', 'usou_padrao' e 'comissao' (centavos, 0 sem valor presente)
+        """
+        vp_linha = ValorPresenteService.valores_presentes_centavos(valor_linha, parcelas, taxas)
+        vp = somar_por(vp_linha, pedido_linha, len(valor_tabela))
+        
+        tabela = np.asarray(valor_tabela, dtype=np.int64)[:, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percentual_meta = np.where(tabela > 0, vp / tabela * 100, 100.0)
+        
+        aliquota, usou_padrao = ComissaoService.aliquotas(percentual_meta, eh_interno, eh_ac, tabelas)
+        comissao = np.where(vp > 0, multiplicar(vp, aliquota), 0)
+        
+        return {
+            'vp_linha': vp_linha,
+            'vp': vp,
+            'percentual_meta': percentual_meta,
+            'aliquota': aliquota,
+            'usou_padrao': usou_padrao,
+            'comissao': comissao
+        }
+    
+    @staticmethod
+    def calcular_comissoes_lote(itens):
+        """calcular_comissao para vários itens, com a tabela de alíquotas lida uma vez
+        
+        Cada item: {'proposta', 'valor_meta', 'alta_cilindrada', 'vendedor_interno'}
+        (os dois últimos opcionais: False e True, como na rota unitária). A
+        validação é feita item a item; Meta %, alíquota e comissão de todos os
+        itens válidos são calculadas juntas (numpy).
+        
+        Returns:
+            list: na ordem dos itens, o resultado de calcular_comissao com 'indice'
+                e 'status' = 'sucesso', ou {'indice', 'status': 'erro', 'mensagem'}
+        """
+        resultados = [None] * len(itens)
+        validos = []
+        
+        for indice, item in enumerate(itens):
+            try:
+                if not isinstance(item, dict):
+                    raise ValueError("Item inválido: esperado um objeto")
+                
+                proposta = item.get('proposta')
+                valor_meta = item.get('valor_meta')
+                if not proposta or not valor_meta or valor_meta <= 0 or not math.isfinite(valor_meta):
+                    raise ValueError("Proposta ou meta inválida")
+                
+                # NaN, infinito ou acima do limite: erro só deste item (ver para_centavos)
+                valor_venda = float(proposta.get('valor_venda', 0))
+                centavos = int(para_centavos(valor_venda))
+                validos.append((
+                    indice, proposta, valor_meta, valor_venda, centavos,
+                    item.get('alta_cilindrada', False), item.get('vendedor_interno', True)
+                ))
+            except (ValueError, TypeError, AttributeError) as e:
+                resultados[indice] = {'indice': indice, 'status': 'erro', 'mensagem': str(e)}
+        
+        if validos:
+            valor_venda = np.array([v[3] for v in validos], dtype=float)
+            valor_meta = np.array([v[2] for v in validos], dtype=float)
+            centavos = np.array([v[4] for v in validos], dtype=np.int64)
+            eh_ac = np.array([bool(v[5]) for v in validos], dtype=bool)
+            eh_interno = np.array([bool(v[6]) for v in validos], dtype=bool)
+            
+            percentual_meta = (valor_venda / valor_meta) * 100
+            aliquota, _ = ComissaoService.aliquotas(
+                percentual_meta[:, None], eh_interno, eh_ac, [ComissaoService.tabela_faixas()]
+            )
+            aliquota = aliquota[:, 0]
+            valor_comissao = para_reais(multiplicar(centavos, aliquota))
+            
+            for posicao, (indice, proposta, meta, venda, _, alta_cilindrada, interno) in enumerate(validos):
+                resultados[indice] = {
+                    'indice': indice,
+                    'status': 'sucesso',
+                    'id_proposta': proposta.get('id'),
+                    'vendedor': proposta.get('vendedor'),
+                    'modelo': proposta.get('modelo'),
+                    'cidade': proposta.get('cidade'),
+                    'valor_venda': venda,
+                    'valor_meta': meta,
+                    'percentual_meta': round(float(percentual_meta[posicao]), 2),
+                    'valor_comissao': float(valor_comissao[posicao]),
+                    'aliquota': float(aliquota[posicao]) * 100,
+                    'alta_cilindrada': alta_cilindrada,
+                    'vendedor_interno': interno
+                }
+        
+        return resultados
+
+
+def _ler_arquivo_lote(tipo, filepath):
+    """Lê um arquivo de upload em lote (executado nos processos do ProcessPoolExecutor)
+    
+    Só faz parsing e normalização: não acessa o MongoDB, que não é seguro
+    entre processos. A sincronização de cadastros acontece no processo pai.
+    
+    Returns:
+        dict: {'arquivo', 'tipo', 'status', 'dados', 'linhas', 'tempo_ms', 'mensagem'}
+    """
+    inicio = time.perf_counter()
+    resultado = {'arquivo': os.path.basename(filepath), 'tipo': tipo, 'dados': [], 'linhas': 0}
+    
+    try:
+        if tipo == 'saida':
+            dados = CSVProcessadorService.ler_saida(filepath)
+        else:
+            dados = CSVProcessadorService.ler_proposta(filepath)
+        
+        resultado.update({'status': 'sucesso', 'dados': dados, 'linhas': len(dados), 'mensagem': ''})
+    except Exception as e:
+        resultado.update({'status': 'erro', 'mensagem': str(e)})
+    
+    resultado['tempo_ms'] = round((time.perf_counter() - inicio) * 1000, 1)
+    return resultado
 
 
+@medir_servico
 class CSVProcessadorService:
-    """Serviço para processar arquivos CSV"""
+    """Serviço para processar arquivos de saída e propostas (CSV ou XLSX)"""
+    
+    # Colunas que identificam o tipo de arquivo no upload em lote
+    COLUNAS_SAIDA = {'Vendedor', 'Data Venda', 'Valor Tabela'}
+    COLUNAS_PROPOSTA = {'Forma Recebimento', 'Valor Total'}
     
     @staticmethod
-    def processar_saida(filepath):
-        """Processa arquivo saida.csv"""
+    def _ler_registros(filepath, normalizar):
+        """Lê o arquivo e aplica a normalização, retornando as linhas como dicts
         
-        try:
-            import logging
-            logger = logging.getLogger(__name__)
-            
-            # Tenta detectar o delimitador
-            with open(filepath, 'r', encoding='utf-8') as f:
-                primeira_linha = f.readline()
+        CSV: lido de uma vez (dialeto detectado). XLSX: lido em blocos de
+        linhas, normalizados um a um, sem carregar a planilha inteira.
+        """
+        if eh_planilha(filepath):
+            registros = []
+            for bloco in ler_planilha(filepath):
+                registros.extend(normalizar(bloco))
+            return registros
+        
+        # Lê o arquivo uma única vez, com encoding/delimitador/aspas detectados
+        df, _ = ler_csv(filepath)
+        return normalizar(df)
+    
+    @staticmethod
+    def _normalizar_saida(df):
+        # Remove espaços dos nomes das colunas
+        df.columns = df.columns.str.strip()
+        
+        # Limpa dados
+        df = df.fillna('')
+        df = df.map(lambda x: str(x).strip() if isinstance(x, str) else x)
+        
+        return df.to_dict('records')
+    
+    @staticmethod
+    def _normalizar_proposta(df):
+        # Limpa dados
+        df = df.fillna('')
+        df = df.map(lambda x: str(x).strip() if isinstance(x, str) else x)
+        
+        # Converte valores monetários
+        for col in ['valor_venda', 'valor_proposta', 'proposal_value', 'sales_achieved']:
+            if col in df.columns:
+                try:
+                    df[col] = df[col].astype(str).str.replace(',', '.').astype(float)
+                except:
+                    pass
+        
+        return df.to_dict('records')
+    
+    @staticmethod
+    @TEMPO_UPLOAD_PARSE.labels(tipo='saida').time()
+    def ler_saida(filepath):
+        """Lê e normaliza o arquivo de saída, CSV ou XLSX (sem acessar o banco)
+        
+        Returns:
+            list: Linhas do arquivo como dicts
+        """
+        registros = CSVProcessadorService._ler_registros(filepath, CSVProcessadorService._normalizar_saida)
+        
+        # Validações básicas
+        if not registros:
+            raise ValueError("Arquivo vazio")
+        
+        return registros
+    
+    @staticmethod
+    @TEMPO_UPLOAD_PARSE.labels(tipo='proposta').time()
+    def ler_proposta(filepath):
+        """Lê e normaliza o arquivo de propostas, CSV ou XLSX (sem acessar o banco)
+        
+        Returns:
+            list: Linhas do arquivo como dicts
+        """
+        return CSVProcessadorService._ler_registros(filepath, CSVProcessadorService._normalizar_proposta)
+    
+    @staticmethod
+    def detectar_tipo(filepath):
+        """Identifica se o arquivo é de saída ou de propostas pelo cabeçalho
+        
+        Returns:
+            str: 'saida', 'proposta' ou None se não reconhecido
+        """
+        colunas = set(ler_cabecalho_planilha(filepath) if eh_planilha(filepath) else ler_cabecalho(filepath))
+        
+        if CSVProcessadorService.COLUNAS_SAIDA <= colunas:
+            return 'saida'
+        if CSVProcessadorService.COLUNAS_PROPOSTA <= colunas:
+            return 'proposta'
+        return None
+    
+    @staticmethod
+    @TEMPO_SINCRONIZACAO.labels(origem='saida').time()
+    def sincronizar_cadastros_saida(resultado):
+        """Sincroniza vendedores e motos a partir das linhas de saida
+        
+        Returns:
+            tuple: (vendedores_sync, motos_sync)
+        """
+        # Sincroniza vendedores do arquivo com suas cidades (Origem Venda)
+        vendedores_sync = {'novo_count': 0, 'duplicado_count': 0, 'novos': [], 'duplicados': []}
+        vendedores_map = {}
+        for doc in resultado:
+            nome = doc.get('Vendedor', '').strip()
+            cidade = doc.get('Origem Venda', '').strip()
+            if nome and nome != 'Desconhecido':
+                vendedores_map[nome] = cidade
+        if vendedores_map:
+            result = VendedorService.sincronizar_vendedores(vendedores_map)
+            if 'sucesso' in result:
+                vendedores_sync = {
+                    'novo_count': result.get('novo_count', 0),
+                    'duplicado_count': result.get('duplicado_count', 0),
+                    'novos': result.get('novos', []),
+                    'duplicados': result.get('duplicados', [])
+                }
+        
+        # Sincroniza motos do arquivo
+        motos_sync = {'novo_count': 0, 'duplicado_count': 0, 'novos': [], 'duplicados': []}
+        motos_map = {}
+        for doc in resultado:
+            modelo = doc.get('Modelo', '').strip()
+            if modelo and modelo != 'Desconhecida':
+                # Detecta se é AC (Alta Cilindrada) procurando por "AC" no modelo
+                eh_alta_cc = 'AC' in modelo.upper()
                 
-                # Detecta delimitador
-                delim = ',' if ',' in primeira_linha else ';'
-            
-            df = pd.read_csv(filepath, encoding='utf-8-sig', sep=delim)
-            
-            # Remove espaços dos nomes das colunas
-            df.columns = df.columns.str.strip()
-            
-            # Validações básicas
-            if df.empty:
-                raise ValueError("Arquivo vazio")
-            
-            # Limpa dados
-            df = df.fillna('')
-            df = df.map(lambda x: str(x).strip() if isinstance(x, str) else x)
-            
-            resultado = df.to_dict('records')
-            
-            # Sincroniza vendedores do arquivo com suas cidades (Origem Venda)
-            vendedores_sync = {'novo_count': 0, 'duplicado_count': 0, 'novos': [], 'duplicados': []}
-            vendedores_map = {}
-            for doc in resultado:
-                nome = doc.get('Vendedor', '').strip()
-                cidade = doc.get('Origem Venda', '').strip()
-                if nome and nome != 'Desconhecido':
-                    vendedores_map[nome] = cidade
-            if vendedores_map:
-                result = VendedorService.sincronizar_vendedores(vendedores_map)
-                if 'sucesso' in result:
-                    vendedores_sync = {
-                        'novo_count': result.get('novo_count', 0),
-                        'duplicado_count': result.get('duplicado_count', 0),
-                        'novos': result.get('novos', []),
-                        'duplicados': result.get('duplicados', [])
-                    }
-            
-            # Sincroniza motos do arquivo
-            motos_sync = {'novo_count': 0, 'duplicado_count': 0, 'novos': [], 'duplicados': []}
-            motos_map = {}
-            for doc in resultado:
-                modelo = doc.get('Modelo', '').strip()
-                if modelo and modelo != 'Desconhecida':
-                    # Detecta se é AC (Alta Cilindrada) procurando por "AC" no modelo
-                    eh_alta_cc = 'AC' in modelo.upper()
-                    
-                    # Extrai valor tabela e converte para float
-                    valor_tabela_str = doc.get('Valor Tabela', '0')
-                    if isinstance(valor_tabela_str, str):
-                        valor_tabela_str = valor_tabela_str.strip()
+                # Extrai valor tabela e converte para float
+                valor_tabela_str = doc.get('Valor Tabela', '0')
+                if isinstance(valor_tabela_str, str):
+                    valor_tabela_str = valor_tabela_str.strip()
+                else:
+                    valor_tabela_str = str(valor_tabela_str).strip()
+                
+                # Remove espaços e converte vírgula para ponto
+                valor_tabela_str = valor_tabela_str.replace('.', '').replace(',', '.')
+                
+                try:
+                    # Célula numérica (XLSX) já vem em reais, sem separador de milhar
+                    if isinstance(doc.get('Valor Tabela'), (int, float)):
+                        valor_tabela = float(doc['Valor Tabela'])
                     else:
-                        valor_tabela_str = str(valor_tabela_str).strip()
-                    
-                    # Remove espaços e converte vírgula para ponto
-                    valor_tabela_str = valor_tabela_str.replace('.', '').replace(',', '.')
-                    
-                    try:
                         valor_tabela = float(valor_tabela_str)
-                    except (ValueError, TypeError) as e:
-                        logger.warning(f"CSV - Erro ao converter '{doc.get('Valor Tabela')}' do modelo {modelo}: {e}")
-                        valor_tabela = 0.0
-                    
-                    motos_map[modelo] = {
-                        'alta_cc': eh_alta_cc,
-                        'valor_tabela': valor_tabela
-                    }
-            
-            if motos_map:
-                result = MotoService.sincronizar_motos(motos_map)
-                result = MotoService.sincronizar_motos(motos_map)
-                if 'sucesso' in result:
-                    motos_sync = {
-                        'novo_count': result.get('novo_count', 0),
-                        'duplicado_count': result.get('duplicado_count', 0),
-                        'novos': result.get('novos', []),
-                        'duplicados': result.get('duplicados', [])
-                    }
+                except (ValueError, TypeError) as e:
+                    logger.warning(f"CSV - Erro ao converter '{doc.get('Valor Tabela')}' do modelo {modelo}: {e}")
+                    valor_tabela = 0.0
+                
+                motos_map[modelo] = {
+                    'alta_cc': eh_alta_cc,
+                    'valor_tabela': valor_tabela
+                }
+        
+        if motos_map:
+            result = MotoService.sincronizar_motos(motos_map)
+            result = MotoService.sincronizar_motos(motos_map)
+            if 'sucesso' in result:
+                motos_sync = {
+                    'novo_count': result.get('novo_count', 0),
+                    'duplicado_count': result.get('duplicado_count', 0),
+                    'novos': result.get('novos', []),
+                    'duplicados': result.get('duplicados', [])
+                }
+        
+        return vendedores_sync, motos_sync
+    
+    @staticmethod
+    @TEMPO_SINCRONIZACAO.labels(origem='proposta').time()
+    def sincronizar_formas_proposta(resultado):
+        """Sincroniza formas de recebimento a partir das linhas de propostas
+        
+        Returns:
+            dict: formas_sync
+        """
+        formas_sync = {'novo_count': 0, 'duplicado_count': 0, 'novos': [], 'duplicados': []}
+        formas_set = set()
+        for doc in resultado:
+            forma = doc.get('Forma Recebimento', '').strip()
+            if forma and forma != 'Desconhecido':
+                formas_set.add(forma)
+        if formas_set:
+            result = FormaRecebimentoService.sincronizar_formas(formas_set)
+            if 'sucesso' in result:
+                formas_sync = {
+                    'novo_count': result.get('novo_count', 0),
+                    'duplicado_count': result.get('duplicado_count', 0),
+                    'novos': result.get('novos', []),
+                    'duplicados': result.get('duplicados', [])
+                }
+        
+        return formas_sync
+    
+    @staticmethod
+    def processar_saida(filepath):
+        """Processa arquivo saida.csv"""
+        
+        try:
+            resultado = executar_cpu(CSVProcessadorService.ler_saida, filepath)
+            vendedores_sync, motos_sync = CSVProcessadorService.sincronizar_cadastros_saida(resultado)
             
             # Retorna os dados junto com info de sincronização
             return {
@@ -991,8 +1301,7 @@ class CSVProcessadorService:
             }
             
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao processar saida.csv: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao processar saida.csv: {str(e)}", exc_info=True)
             raise Exception(f"Erro ao processar arquivo: {str(e)}")
     
     @staticmethod
@@ -1000,48 +1309,8 @@ class CSVProcessadorService:
         """Processa arquivo proposta.csv"""
         
         try:
-            import logging
-            logger = logging.getLogger(__name__)
-            
-            # Tenta detectar o delimitador
-            with open(filepath, 'r', encoding='utf-8') as f:
-                primeira_linha = f.readline()
-                
-                # Detecta delimitador
-                delim = ',' if ',' in primeira_linha else ';'
-            
-            df = pd.read_csv(filepath, encoding='utf-8', sep=delim)
-            
-            # Limpa dados
-            df = df.fillna('')
-            df = df.map(lambda x: str(x).strip() if isinstance(x, str) else x)
-            
-            # Converte valores monetários
-            for col in ['valor_venda', 'valor_proposta', 'proposal_value', 'sales_achieved']:
-                if col in df.columns:
-                    try:
-                        df[col] = df[col].astype(str).str.replace(',', '.').astype(float)
-                    except:
-                        pass
-            
-            resultado = df.to_dict('records')
-            
-            # Sincroniza formas de recebimento do arquivo
-            formas_sync = {'novo_count': 0, 'duplicado_count': 0, 'novos': [], 'duplicados': []}
-            formas_set = set()
-            for doc in resultado:
-                forma = doc.get('Forma Recebimento', '').strip()
-                if forma and forma != 'Desconhecido':
-                    formas_set.add(forma)
-            if formas_set:
-                result = FormaRecebimentoService.sincronizar_formas(formas_set)
-                if 'sucesso' in result:
-                    formas_sync = {
-                        'novo_count': result.get('novo_count', 0),
-                        'duplicado_count': result.get('duplicado_count', 0),
-                        'novos': result.get('novos', []),
-                        'duplicados': result.get('duplicados', [])
-                    }
+            resultado = executar_cpu(CSVProcessadorService.ler_proposta, filepath)
+            formas_sync = CSVProcessadorService.sincronizar_formas_proposta(resultado)
             
             return {
                 'dados': resultado,
@@ -1050,32 +1319,284 @@ class CSVProcessadorService:
             }
             
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao processar proposta.csv: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao processar proposta.csv: {str(e)}", exc_info=True)
             raise Exception(f"Erro ao processar arquivo: {str(e)}")
+    
+    @staticmethod
+    def processar_lote(arquivos, max_workers=None):
+        """Lê vários arquivos de saida/propostas em paralelo (ProcessPoolExecutor)
+        
+        O parsing roda em processos separados; os resultados são mesclados no
+        processo pai, que faz a sincronização de cadastros uma única vez.
+        
+        Args:
+            arquivos (list): [(tipo, filepath)] com tipo 'saida' ou 'proposta'
+            max_workers (int): Número máximo de processos (padrão: nº de CPUs)
+            
+        Returns:
+            dict: {
+                'arquivos': [{'arquivo', 'tipo', 'status', 'linhas', 'tempo_ms', 'mensagem'}],
+                'saida': [...], 'propostas': [...],
+                'vendedores': {...}, 'motos': {...}, 'formas': {...},
+                'tempo_parse_ms': float
+            }
+        """
+        inicio = time.perf_counter()
+        workers = min(len(arquivos), max_workers or os.cpu_count() or 1)
+        
+        if workers <= 1:
+            lidos = [executar_cpu(_ler_arquivo_lote, tipo, caminho) for tipo, caminho in arquivos]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                lidos = list(executor.map(_ler_arquivo_lote, *zip(*arquivos)))
+        
+        tempo_parse_ms = round((time.perf_counter() - inicio) * 1000, 1)
+        
+        saida = []
+        propostas = []
+        for item in lidos:
+            if item['status'] != 'sucesso':
+                continue
+            if item['tipo'] == 'saida':
+                saida.extend(item['dados'])
+            else:
+                propostas.extend(item['dados'])
+        
+        vazio = {'novo_count': 0, 'duplicado_count': 0, 'novos': [], 'duplicados': []}
+        vendedores_sync, motos_sync = CSVProcessadorService.sincronizar_cadastros_saida(saida) if saida else (vazio, vazio)
+        formas_sync = CSVProcessadorService.sincronizar_formas_proposta(propostas) if propostas else vazio
+        
+        return {
+            'arquivos': [{k: v for k, v in item.items() if k != 'dados'} for item in lidos],
+            'saida': saida,
+            'propostas': propostas,
+            'vendedores': vendedores_sync,
+            'motos': motos_sync,
+            'formas': formas_sync,
+            'tempo_parse_ms': tempo_parse_ms,
+            'workers': workers
+        }
+
+
+@medir_servico
+class AtribuicaoService:
+    """Atribuição de cada Pessoa (cliente) da saída a um vendedor
+    
+    Regra única para todos os relatórios: a Pessoa fica com o primeiro
+    vendedor dela na saída do período (ordem das linhas); com vários
+    períodos, vale o do período mais antigo. Pedidos da Pessoa vendidos por
+    outro vendedor ficam registrados como conflitos.
+    
+    As atribuições são gravadas por período na collection
+    'atribuicoes_vendedor' a cada gravação da saída (upload, delta, limpeza),
+    marcadas com o lote da saída que as gerou ('atribuicoes' em
+    'lotes_linhas'). Período com lote novo e atribuição antiga (ex: saída
+    gravada antes desta collection) é refeito na primeira leitura.
+    """
+    
+    @staticmethod
+    def atribuir(saida):
+        """Atribuições a partir das linhas da saída
+        
+        Hash join das linhas pela chave (Pessoa, Pedido, Doc Fiscal): as
+        várias linhas de um pedido viram uma entrada com os vendedores dele.
+        
+        Args:
+            saida: DataFrame com Pessoa, Vendedor, Pedido e Doc Fiscal
+        
+        Returns:
+            dict: {pessoa: {'vendedor', 'vendedores', 'conflitos'}}, com
+                conflitos = [{'pedido', 'doc_fiscal', 'vendedores'}] dos pedidos
+                que tiveram outro vendedor
+        """
+        pedidos = {}
+        for pessoa, vendedor, pedido, doc_fiscal in zip(*valores(saida, 'Pessoa', 'Vendedor', 'Pedido', 'Doc Fiscal')):
+            pessoa = pessoa.strip()
+            vendedor = vendedor.strip()
+            
+            if pessoa and vendedor:
+                vendedores = pedidos.setdefault((pessoa, str(pedido).strip(), doc_fiscal.strip()), [])
+                if vendedor not in vendedores:
+                    vendedores.append(vendedor)
+        
+        # O primeiro pedido de cada Pessoa (ordem das chaves) é o da sua primeira linha
+        atribuicoes = {}
+        for (pessoa, pedido, doc_fiscal), vendedores in pedidos.items():
+            atribuicao = atribuicoes.get(pessoa)
+            if atribuicao is None:
+                atribuicao = atribuicoes[pessoa] = {'vendedor': vendedores[0], 'vendedores': [], 'conflitos': []}
+            
+            for vendedor in vendedores:
+                if vendedor not in atribuicao['vendedores']:
+                    atribuicao['vendedores'].append(vendedor)
+            
+            if vendedores != [atribuicao['vendedor']]:
+                atribuicao['conflitos'].append({'pedido': pedido, 'doc_fiscal': doc_fiscal, 'vendedores': vendedores})
+        
+        return atribuicoes
+    
+    @staticmethod
+    def reconstruir(periodos):
+        """Refaz as atribuições gravadas dos períodos a partir da saída"""
+        if not periodos:
+            return
+        
+        lotes = SaidaRepository.lotes_vigentes(periodos)
+        
+        for periodo in periodos:
+            lote = lotes[periodo]
+            atribuicoes = AtribuicaoService.atribuir(SaidaRepository.dataframe({'periodo': periodo}, 'atribuicao'))
+            
+            # Upsert por (periodo, pessoa): dois workers refazendo o mesmo período não duplicam
+            operacoes = [
+                ReplaceOne(
+                    {'periodo': periodo, 'pessoa': pessoa},
+                    {'periodo': periodo, 'pessoa': pessoa, **atribuicao, 'conflito': bool(atribuicao['conflitos']), 'lote': lote},
+                    upsert=True
+                )
+                for pessoa, atribuicao in atribuicoes.items()
+            ]
+            if operacoes:
+                AtribuicaoVendedorRepository.bulk_write(operacoes, ordered=False)
+            
+            # Pessoas que não estão mais na saída do período
+            AtribuicaoVendedorRepository.delete_many({'periodo': periodo, 'lote': {'$ne': lote}})
+            
+            LoteLinhasRepository.update_one(
+                {'colecao': SaidaRepository.COLECAO, 'periodo': periodo, 'lote': lote},
+                {'$set': {'atribuicoes': lote}}
+            )
+            
+            logger.debug(f"Atribuições {periodo}: {len(atribuicoes)} pessoa(s), lote {lote}")
+    
+    @staticmethod
+    def _garantir(filtro):
+        """Períodos do filtro com as atribuições em dia (None: calcular da saída)"""
+        periodos = SaidaRepository.periodos_do_filtro(filtro)
+        if periodos is None:
+            return None
+        
+        registros = {
+            doc['periodo']: doc
+            for doc in LoteLinhasRepository.find({'colecao': SaidaRepository.COLECAO, 'periodo': {'$in': periodos}}, 'atribuicoes')
+        }
+        AtribuicaoService.reconstruir([
+            periodo for periodo in periodos
+            if periodo not in registros or registros[periodo].get('atribuicoes') != registros[periodo]['lote']
+        ])
+        return periodos
+    
+    @staticmethod
+    def vendedores(filtro, pessoas=None):
+        """Vendedor atribuído a cada Pessoa nos períodos do filtro
+        
+        Filtros que não são só de período (ou saída com linhas sem 'periodo')
+        calculam as atribuições na hora, pela mesma regra.
+        
+        Args:
+            filtro (dict): Filtro de período (RelatorioService._filtro_periodo)
+            pessoas: Opcional, restringe às Pessoas informadas
+        
+        Returns:
+            dict: {pessoa: vendedor}
+        """
+        periodos = AtribuicaoService._garantir(filtro)
+        if periodos is None:
+            atribuicoes = AtribuicaoService.atribuir(SaidaRepository.dataframe(filtro, 'atribuicao'))
+            return {
+                pessoa: atribuicao['vendedor'] for pessoa, atribuicao in atribuicoes.items()
+                if pessoas is None or pessoa in pessoas
+            }
+        
+        consulta = {'periodo': {'$in': periodos}}
+        if pessoas is not None:
+            consulta['pessoa'] = {'$in': list(pessoas)}
+        
+        mapa = {}
+        for doc in AtribuicaoVendedorRepository.find(consulta, 'vendedor', sort=[('periodo', 1)]):
+            mapa.setdefault(doc['pessoa'], doc['vendedor'])
+        return mapa
+    
+    @staticmethod
+    def clientes(vendedor, filtro):
+        """Pessoas atribuídas ao vendedor nos períodos do filtro"""
+        periodos = AtribuicaoService._garantir(filtro)
+        if periodos is None:
+            return {pessoa for pessoa, nome in AtribuicaoService.vendedores(filtro).items() if nome == vendedor}
+        
+        # Candidatas pelo índice; com vários períodos vale a atribuição do mais antigo
+        candidatas = AtribuicaoVendedorRepository.distinct('pessoa', {'vendedor': vendedor, 'periodo': {'$in': periodos}})
+        if not candidatas:
+            return set()
+        
+        mapa = AtribuicaoService.vendedores(filtro, candidatas)
+        return {pessoa for pessoa in candidatas if mapa.get(pessoa) == vendedor}
+    
+    @staticmethod
+    def conflitos(filtro):
+        """Pessoas com pedidos de mais de um vendedor nos períodos do filtro
+        
+        Returns:
+            list: [{'periodo', 'pessoa', 'vendedor', 'vendedores', 'conflitos'}]
+        """
+        periodos = AtribuicaoService._garantir(filtro)
+        if periodos is None:
+            atribuicoes = AtribuicaoService.atribuir(SaidaRepository.dataframe(filtro, 'atribuicao'))
+            return [
+                {'periodo': None, 'pessoa': pessoa, **atribuicao}
+                for pessoa, atribuicao in sorted(atribuicoes.items()) if atribuicao['conflitos']
+            ]
+        
+        return AtribuicaoVendedorRepository.listar(
+            {'periodo': {'$in': periodos}, 'conflito': True}, 'conflitos',
+            sort=[('periodo', 1), ('pessoa', 1)]
+        )
+
 
-
+def _calcular_particao(argumentos):
+    """ComissaoService.calcular_pedidos de uma partição (executado nos processos do ProcessPoolExecutor)
+    
+    Recebe e devolve só matrizes numpy (e a tabela de faixas): não acessa o MongoDB.
+    """
+    return ComissaoService.calcular_pedidos(*argumentos)
+
+
+@medir_servico
 class RelatorioService:
     """Serviço para gerar relatórios"""
     
+    # Pedidos mínimos por processo no cálculo paralelo: abaixo disso iniciar
+    # os processos e copiar as matrizes custa mais do que o cálculo
+    PEDIDOS_POR_PROCESSO_MIN = 20000
+    
     @staticmethod
     def _converter_valor(valor):
-        """Converte valor em formato brasileiro (1.000,00) para float"""
+        """Converte valor em formato brasileiro (1.000,00) para float
+        
+        Valores inválidos, NaN e infinitos viram 0.
+        """
         if not valor:
             return 0
         
-        try:
-            # Converte para string
-            valor_str = str(valor).strip()
-            
+        if isinstance(valor, str):
             # Se tem vírgula, é formato brasileiro
-            if ',' in valor_str:
+            if ',' in valor:
                 # Remove pontos (separadores de milhares) e substitui vírgula por ponto
-                valor_str = valor_str.replace('.', '').replace(',', '.')
+                valor = valor.replace('.', '').replace(',', '.')
             
-            return float(valor_str)
-        except:
-            return 0
+            # float() já ignora espaços nas pontas
+            try:
+                numero = float(valor)
+            except ValueError:
+                return 0
+        else:
+            # Números (colunas já convertidas pelo pandas) não passam por str()
+            try:
+                numero = float(valor)
+            except (TypeError, ValueError):
+                return 0
+        
+        return numero if math.isfinite(numero) else 0
     
     @staticmethod
     def _forma_recebimento_valida(forma_nome):
@@ -1088,197 +1609,341 @@ class RelatorioService:
             return False
         
         try:
-            forma = mongo.db.formas_recebimento.find_one({
-                'nome': forma_nome.strip(),
-                'status': 'ativo'
-            })
-            return forma is not None
+            return FormaRecebimentoRepository.ativa(forma_nome.strip(), 'id') is not None
         except:
             return False
     
     @staticmethod
-    def resumo_comissoes(filtros=None):
-        """Gera resumo de comissões por vendedor com Meta % correta e forma de recebimento"""
+    def _filtro_periodo(filtros):
+        """Monta o filtro MongoDB de competência a partir dos filtros do relatório
+        
+        Args:
+            filtros (dict): Pode conter 'periodo' ('YYYY-MM' ou lista de períodos)
+        
+        Returns:
+            dict: Filtro para find() (vazio = todos os períodos)
+        """
+        if not filtros or not filtros.get('periodo'):
+            return {}
+        
+        periodo = filtros['periodo']
+        if isinstance(periodo, (list, tuple, set)):
+            return {'periodo': {'$in': list(periodo)}}
+        return {'periodo': periodo}
+    
+    @staticmethod
+    def _pedidos_agrupados(filtro):
+        """Agrupa as propostas do filtro por Vendedor + Pedido + Doc Fiscal
+        
+        Base do resumo de comissões (e da simulação): cada Pessoa vai para o
+        vendedor atribuído a ela (AtribuicaoService); vendedores não
+        cadastrados ficam de fora.
+        
+        Returns:
+            tuple: (pedidos {chave: AgregadoPedido}, valor_tabela_map {chave: Valor Tabela},
+                vendedores_cadastrados {nome: interno}, linhas da saída, linhas das propostas)
+        """
+        
+        # Busca só as colunas usadas no cálculo (snapshot do lote quando disponível)
+        saida = SaidaRepository.dataframe(filtro, 'resumo')
+        propostas = PropostaRepository.dataframe(filtro, 'resumo')
+        
+        # Busca vendedores cadastrados (nome -> interno)
+        vendedores_cadastrados = VendedorRepository.mapa_interno()
+        
+        # Mapa de Pessoa -> Vendedor (atribuições gravadas no upload da saída)
+        pessoa_vendedor = AtribuicaoService.vendedores(filtro)
+        
+        # Cria mapa de Pedido -> Valor Tabela (da saida) por vendedor
+        valor_tabela_map = {}
+        for vendedor, pedido, doc_fiscal, valor_tabela in zip(*valores(saida, 'Vendedor', 'Pedido', 'Doc Fiscal', 'Valor Tabela')):
+            vendedor = vendedor.strip()
+            doc_fiscal = doc_fiscal.strip()
+            valor_tabela = RelatorioService._converter_valor(valor_tabela)
+            if pedido and valor_tabela > 0:
+                chave = f"{vendedor}|{pedido}|{doc_fiscal}" if doc_fiscal else f"{vendedor}|{pedido}"
+                valor_tabela_map[chave] = valor_tabela
+        
+        # Agrupa propostas por Vendedor, Pedido e Doc Fiscal para calcular Meta % corretamente
+        pedidos = {}
+        colunas_propostas = valores(
+            propostas, 'Pessoa', 'Nº Pedido', 'N° Pedido', 'Pedido', 'Doc Fiscal',
+            'Valor Total', 'Modelo', 'Forma Recebimento', 'Nº Parcela'
+        )
+        for pessoa, n_pedido, n_pedido_alt, pedido, doc_fiscal, valor, modelo, forma_recebimento, parcela in zip(*colunas_propostas):
+            pessoa = pessoa.strip()
+            pedido = n_pedido or n_pedido_alt or pedido
+            doc_fiscal = doc_fiscal.strip()
+            valor = RelatorioService._converter_valor(valor)
+            
+            # NÃO filtra valores negativos aqui - será feito após agrupar por pedido
+            if not pessoa or not pedido:
+                continue
+            
+            # Procura qual vendedor fez a venda para essa pessoa
+            nome_vendedor = pessoa_vendedor.get(pessoa)
+            if not nome_vendedor:
+                continue
+            
+            # Se vendedor não está cadastrado, ignora
+            if nome_vendedor not in vendedores_cadastrados:
+                continue
+            
+            chave_vendedor_pedido = f"{nome_vendedor}|{pedido}|{doc_fiscal}" if doc_fiscal else f"{nome_vendedor}|{pedido}"
+            
+            agregado = pedidos.get(chave_vendedor_pedido)
+            if agregado is None:
+                agregado = pedidos[chave_vendedor_pedido] = AgregadoPedido(nome_vendedor, pedido)
+            
+            agregado.valor_total += valor
+            agregado.linhas.append(LinhaProposta(
+                pessoa,
+                pedido,
+                doc_fiscal,
+                modelo.upper(),
+                valor,
+                forma_recebimento.strip(),
+                int(parcela) if parcela else 1
+            ))
+        
+        return pedidos, valor_tabela_map, vendedores_cadastrados, len(saida), len(propostas)
+    
+    @staticmethod
+    def _taxa_forma(forma):
+        """Taxa de VP (decimal) de uma forma; 0 quando o VP não se aplica"""
+        taxa_juros = forma.get('taxa_juros') or 0
+        if forma.get('aplicar_vp') and taxa_juros > 0:
+            return taxa_juros / 100
+        return 0.0
+    
+    @staticmethod
+    def _formas_pedidos(pedidos):
+        """Nomes das formas de recebimento das linhas dos pedidos [(chave, AgregadoPedido)]"""
+        return sorted({linha.forma_recebimento for _, agregado in pedidos for linha in agregado.linhas if linha.forma_recebimento})
+    
+    @staticmethod
+    def _calcular_agregados(pedidos, valor_tabela_map, vendedores_cadastrados, tabelas, formas, max_workers=None):
+        """Calcula os pedidos agrupados [(chave, AgregadoPedido)] com ComissaoService.calcular_pedidos
+        
+        Args:
+            tabelas (list): K tabelas de faixas
+            formas (list): K dicts {nome: {'aplicar_vp', 'taxa_juros'}} com as formas de cada configuração
+            max_workers (int): Processos para o cálculo (ver _calcular_particionado; padrão: 1)
+        
+        Returns:
+            dict: matrizes de calcular_pedidos (pedidos na ordem da lista)
+        """
+        linhas = [(i, linha) for i, (_, agregado) in enumerate(pedidos) for linha in agregado.linhas]
+        nomes_formas = RelatorioService._formas_pedidos(pedidos)
+        indice_forma = {forma: f for f, forma in enumerate(nomes_formas)}
+        
+        # Taxa de cada forma em cada configuração; a última linha (zerada) é a de 'sem forma'
+        taxas = np.zeros((len(nomes_formas) + 1, len(formas)))
+        for k, formas_configuracao in enumerate(formas):
+            for f, forma in enumerate(nomes_formas):
+                if forma in formas_configuracao:
+                    taxas[f, k] = RelatorioService._taxa_forma(formas_configuracao[forma])
+        
+        forma_linha = np.array([indice_forma.get(linha.forma_recebimento, -1) for _, linha in linhas], dtype=np.intp)
+        
+        posicao = {}
+        vendedor_pedido = np.array(
+            [posicao.setdefault(agregado.nome_vendedor, len(posicao)) for _, agregado in pedidos], dtype=np.intp
+        )
+        
+        return RelatorioService._calcular_particionado(
+            (
+                np.array([i for i, _ in linhas], dtype=np.intp),
+                para_centavos([linha.valor for _, linha in linhas]),
+                np.array([linha.numero_parcelas for _, linha in linhas], dtype=np.int64),
+                taxas[forma_linha],
+                para_centavos([valor_tabela_map.get(chave, 0) for chave, _ in pedidos]),
+                np.array([bool(vendedores_cadastrados[agregado.nome_vendedor]) for _, agregado in pedidos], dtype=bool),
+                np.array(['AC' in agregado.linhas[0].modelo for _, agregado in pedidos], dtype=bool)
+            ),
+            vendedor_pedido, tabelas, max_workers
+        )
+    
+    @staticmethod
+    def _particionar_vendedores(vendedor_pedido, pedido_linha, particoes):
+        """Partição de cada pedido: vendedores inteiros, partições com quantidades parecidas de linhas
+        
+        Cada vendedor (do maior para o menor em linhas) vai para a partição
+        menos carregada até ali.
+        
+        Returns:
+            ndarray: índice da partição de cada pedido [pedidos]
+        """
+        linhas_vendedor = np.bincount(vendedor_pedido[pedido_linha], minlength=vendedor_pedido.max() + 1)
+        carga = np.zeros(particoes, dtype=np.int64)
+        particao_vendedor = np.zeros(len(linhas_vendedor), dtype=np.intp)
+        
+        for vendedor in np.argsort(-linhas_vendedor, kind='stable'):
+            particao = int(np.argmin(carga))
+            particao_vendedor[vendedor] = particao
+            carga[particao] += linhas_vendedor[vendedor]
+        
+        return particao_vendedor[vendedor_pedido]
+    
+    @staticmethod
+    def _calcular_particionado(argumentos, vendedor_pedido, tabelas, max_workers=None):
+        """ComissaoService.calcular_pedidos, em paralelo por vendedor quando compensa
+        
+        Os pedidos de um vendedor não dependem dos demais: com max_workers > 1
+        e ao menos PEDIDOS_POR_PROCESSO_MIN pedidos por processo, os vendedores
+        são divididos em partições, cada uma calculada num processo do
+        ProcessPoolExecutor. Cada processo recebe só as fatias das matrizes
+        (centavos, parcelas, taxas) da sua partição, e o processo pai devolve
+        cada resultado à posição original dos pedidos e linhas. O resultado é
+        idêntico ao do cálculo num só processo.
+        
+        Args:
+            argumentos (tuple): (pedido_linha, valor_linha, parcelas, taxas, valor_tabela,
+                eh_interno, eh_ac) de calcular_pedidos
+            vendedor_pedido: índice do vendedor de cada pedido [pedidos]
+            tabelas (list): K tabelas de faixas
+            max_workers (int): Número máximo de processos (RELATORIO_WORKERS)
+        
+        Returns:
+            dict: matrizes de calcular_pedidos
+        """
+        pedido_linha, valor_linha, parcelas, taxas, valor_tabela, eh_interno, eh_ac = argumentos
+        total_pedidos = len(valor_tabela)
+        
+        workers = min(
+            max_workers or 1,
+            total_pedidos // RelatorioService.PEDIDOS_POR_PROCESSO_MIN,
+            len(np.unique(vendedor_pedido))
+        )
+        if workers <= 1:
+            return ComissaoService.calcular_pedidos(*argumentos, tabelas)
+        
+        particao_pedido = RelatorioService._particionar_vendedores(vendedor_pedido, pedido_linha, workers)
+        particao_linha = particao_pedido[pedido_linha]
+        
+        tarefas = []
+        posicoes = []
+        for particao in range(workers):
+            pedidos_particao = np.flatnonzero(particao_pedido == particao)
+            linhas_particao = np.flatnonzero(particao_linha == particao)
+            
+            # Índice do pedido de cada linha dentro da partição
+            novo_indice = np.zeros(total_pedidos, dtype=np.intp)
+            novo_indice[pedidos_particao] = np.arange(len(pedidos_particao))
+            
+            tarefas.append((
+                novo_indice[pedido_linha[linhas_particao]],
+                valor_linha[linhas_particao],
+                parcelas[linhas_particao],
+                taxas[linhas_particao],
+                valor_tabela[pedidos_particao],
+                eh_interno[pedidos_particao],
+                eh_ac[pedidos_particao],
+                tabelas
+            ))
+            posicoes.append((linhas_particao, pedidos_particao))
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            partes = list(executor.map(_calcular_particao, tarefas))
+        
+        calculo = {}
+        for (linhas_particao, pedidos_particao), parte in zip(posicoes, partes):
+            for chave, matriz in parte.items():
+                destino, total = (linhas_particao, len(pedido_linha)) if chave == 'vp_linha' else (pedidos_particao, total_pedidos)
+                if chave not in calculo:
+                    calculo[chave] = np.empty((total,) + matriz.shape[1:], dtype=matriz.dtype)
+                calculo[chave][destino] = matriz
+        
+        logger.debug(f"Cálculo paralelo: {total_pedidos} pedido(s) em {workers} processo(s)")
+        return calculo
+    
+    @staticmethod
+    def _totais_vendedores(pedidos, calculo):
+        """Totais por vendedor (centavos) dos pedidos calculados
+        
+        Vendas somam o valor presente dos pedidos com valor presente > 0 (os
+        demais só contam as propostas).
+        
+        Returns:
+            tuple: (nomes na ordem em que aparecem, vendas [vendedores, K], comissões [vendedores, K],
+                quantidade de propostas [vendedores])
+        """
+        nomes = list(dict.fromkeys(agregado.nome_vendedor for _, agregado in pedidos))
+        posicao = {nome: j for j, nome in enumerate(nomes)}
+        vendedor_pedido = np.array([posicao[agregado.nome_vendedor] for _, agregado in pedidos], dtype=np.intp)
+        
+        vp = calculo['vp']
+        vendas = somar_por(np.where(vp > 0, vp, 0), vendedor_pedido, len(nomes))
+        comissoes = somar_por(calculo['comissao'], vendedor_pedido, len(nomes))
+        propostas = somar_por([len(agregado.linhas) for _, agregado in pedidos], vendedor_pedido, len(nomes))
+        return nomes, vendas, comissoes, propostas
+    
+    @staticmethod
+    def resumo_comissoes(filtros=None, max_workers=None):
+        """Gera resumo de comissões por vendedor com Meta % correta e forma de recebimento
+        
+        Erros são registrados no log e resultam em lista vazia; quem grava o
+        resultado (congelamento) deve usar _calcular_resumo_comissoes, que levanta.
+        
+        Args:
+            filtros (dict): Opcional. {'periodo': 'YYYY-MM'} restringe o cálculo a uma competência
+            max_workers (int): Processos no cálculo dos pedidos (RELATORIO_WORKERS; padrão: 1)
+        """
         
-        import logging
         try:
-            # Busca as coleções
-            saida_col = mongo.db.saida
-            proposta_col = mongo.db.propostas
-            vendedor_col = mongo.db.vendedores
-            
-            # Busca dados com os nomes corretos de colunas
-            saida_docs = list(saida_col.find({}))
-            proposta_docs = list(proposta_col.find({}))
-            
-            # Busca vendedores cadastrados
-            vendedores_cadastrados = {v['nome']: v for v in vendedor_col.find({})}
-            
-            # Mapa de Pessoa -> Vendedor (extraído de saida)
-            pessoa_vendedores = {}
-            for doc in saida_docs:
-                pessoa = doc.get('Pessoa', '').strip()
-                vendedor = doc.get('Vendedor', '').strip()
-                
-                if pessoa and vendedor:
-                    if pessoa not in pessoa_vendedores:
-                        pessoa_vendedores[pessoa] = []
-                    if vendedor not in pessoa_vendedores[pessoa]:
-                        pessoa_vendedores[pessoa].append(vendedor)
-            
-            # Cria mapa de Pedido -> Valor Tabela (da saida) por vendedor
-            valor_tabela_map = {}
-            for doc in saida_docs:
-                vendedor = doc.get('Vendedor', '').strip()
-                pedido = doc.get('Pedido', '')
-                doc_fiscal = doc.get('Doc Fiscal', '').strip()
-                valor_tabela = RelatorioService._converter_valor(doc.get('Valor Tabela', 0))
-                if pedido and valor_tabela > 0:
-                    chave = f"{vendedor}|{pedido}|{doc_fiscal}" if doc_fiscal else f"{vendedor}|{pedido}"
-                    valor_tabela_map[chave] = valor_tabela
-            
-                # Processa em dicionários para join
-            vendedores = {}
-            
-            # Agrupa propostas por Vendedor, Pedido e Doc Fiscal para calcular Meta % corretamente
-            propostas_por_vendedor_pedido = {}
-            for doc in proposta_docs:
-                pessoa = doc.get('Pessoa', '').strip()
-                pedido = doc.get('Nº Pedido', '') or doc.get('N° Pedido', '') or doc.get('Pedido', '')
-                doc_fiscal = doc.get('Doc Fiscal', '').strip()
-                valor = RelatorioService._converter_valor(doc.get('Valor Total', 0))
-                
-                # NÃO filtra valores negativos aqui - será feito após agrupar por pedido
-                if not pessoa or not pedido:
-                    continue
-                
-                # Procura qual vendedor fez a venda para essa pessoa
-                vendedores_dessa_pessoa = pessoa_vendedores.get(pessoa, [])
-                if not vendedores_dessa_pessoa:
-                    continue
-                
-                nome_vendedor = vendedores_dessa_pessoa[0]
-                
-                # Se vendedor não está cadastrado, ignora
-                if nome_vendedor not in vendedores_cadastrados:
-                    continue
-                
-                chave_vendedor_pedido = f"{nome_vendedor}|{pedido}|{doc_fiscal}" if doc_fiscal else f"{nome_vendedor}|{pedido}"
-                
-                if chave_vendedor_pedido not in propostas_por_vendedor_pedido:
-                    propostas_por_vendedor_pedido[chave_vendedor_pedido] = {
-                        'nome_vendedor': nome_vendedor,
-                        'pedido': pedido,
-                        'valor_total': 0,
-                        'propostas': []
-                    }
-                
-                propostas_por_vendedor_pedido[chave_vendedor_pedido]['valor_total'] += valor
-                propostas_por_vendedor_pedido[chave_vendedor_pedido]['propostas'].append(doc)
-            
-            # FILTRO: Ignora pedidos cuja soma total é negativa
-            propostas_por_vendedor_pedido_filtrado = {}
-            for chave, dados_pedido in propostas_por_vendedor_pedido.items():
-                valor_total = dados_pedido['valor_total']
-                nome_vendedor = dados_pedido['nome_vendedor']
-                pedido = dados_pedido.get('pedido', chave.split('|')[1])  # Usa pedido guardado ou extrai da chave
-                
-                if valor_total < 0:
-                    continue
-                
-                propostas_por_vendedor_pedido_filtrado[chave] = dados_pedido
-            
-            # Calcula comissões respeitando Meta % e Forma de Recebimento
-            for chave, dados_pedido in propostas_por_vendedor_pedido_filtrado.items():
-                nome_vendedor = dados_pedido['nome_vendedor']
-                valor_total_pedido = dados_pedido['valor_total']
-                
-                # Busca Valor Tabela para calcular Meta %
-                valor_tabela = valor_tabela_map.get(chave, 0)
-                
-                # Inicializa vendedor se não existe
-                if nome_vendedor not in vendedores:
-                    vendedor_info = vendedores_cadastrados.get(nome_vendedor, {})
-                    vendedores[nome_vendedor] = {
-                        'vendor_name': nome_vendedor,
-                        'total_vendas': 0,
-                        'total_comissoes': 0,
-                        'quantidade_propostas': 0,
-                        'eh_interno': vendedor_info.get('interno', False)
-                    }
-                
-                eh_interno = vendedores_cadastrados[nome_vendedor].get('interno', False)
-                
-                # NOVO: Soma todos os valores presentes das formas de pagamento (PRIMEIRO)
-                valor_venda_total_pedido = 0
-                detalhes_formas = []
-                
-                for proposta in dados_pedido['propostas']:
-                    modelo = proposta.get('Modelo', 'Outro').upper()
-                    valor = RelatorioService._converter_valor(proposta.get('Valor Total', 0))
-                    forma_recebimento = proposta.get('Forma Recebimento', '').strip()
-                    numero_parcelas = int(proposta.get('Nº Parcela', 1)) if proposta.get('Nº Parcela') else 1
-                    
-                    # Calcular valor presente para cada forma de pagamento
-                    valor_venda_forma = valor
-                    
-                    # Busca a forma de recebimento no banco para aplicar taxa de juros
-                    if forma_recebimento and numero_parcelas >= 2:
-                        forma_doc = mongo.db.formas_recebimento.find_one({
-                            'nome': forma_recebimento,
-                            'status': 'ativo'
-                        })
-                        
-                        if forma_doc and forma_doc.get('aplicar_vp') and forma_doc.get('taxa_juros', 0) > 0:
-                            taxa_juros = forma_doc.get('taxa_juros', 0) / 100  # Converte de % para decimal
-                            # Aplica HP12C inversa para trazer ao valor presente
-                            valor_venda_forma = ValorPresenteService.calcular_valor_com_juro_simples(
-                                valor,
-                                numero_parcelas,
-                                taxa_juros
-                            )
-                    
-                    # Acumula o valor presente
-                    valor_venda_total_pedido += valor_venda_forma
-                    detalhes_formas.append({
-                        'valor_original': valor,
-                        'valor_venda_forma': valor_venda_forma
-                    })
-                
-                # Calcula Meta % usando o valor VP TOTAL (não o valor original)
-                percentual_meta = (valor_venda_total_pedido / valor_tabela * 100) if valor_tabela > 0 else 100
-                
-                # Calcula comissão apenas se houver valor VP válido
-                if valor_venda_total_pedido > 0:
-                    # Calcula comissão uma única vez sobre o total de todas as formas
-                    eh_ac = 'AC' in dados_pedido['propostas'][0].get('Modelo', '').upper()
-                    aliquota, _ = ComissaoService._obter_aliquota_banco(mongo.db, percentual_meta, eh_ac, eh_interno)
-                    comissao_total = round(valor_venda_total_pedido * aliquota, 2)
-                    
-                    vendedores[nome_vendedor]['total_vendas'] += valor_venda_total_pedido
-                    vendedores[nome_vendedor]['total_comissoes'] += comissao_total
-                    vendedores[nome_vendedor]['quantidade_propostas'] += len(dados_pedido['propostas'])
-                else:
-                    # Sem valor de venda, apenas registra sem comissão (transações de ajuste)
-                    vendedores[nome_vendedor]['total_vendas'] += 0
-                    vendedores[nome_vendedor]['total_comissoes'] += 0
-                    vendedores[nome_vendedor]['quantidade_propostas'] += len(dados_pedido['propostas'])
-            
-            # Converte para lista e ordena
-            resultado = list(vendedores.values())
-            resultado = sorted(resultado, key=lambda x: x['total_comissoes'], reverse=True)
-            
-            import logging
-            logging.info(f"Resumo de vendedores: {resultado}")
-            
-            return resultado
-            
+            return RelatorioService._calcular_resumo_comissoes(filtros, max_workers)
         except Exception as e:
-            import logging
-            logging.error(f"Erro em resumo_comissoes: {str(e)}", exc_info=True)
+            logger.error(f"Erro em resumo_comissoes: {str(e)}", exc_info=True)
             return []
     
     @staticmethod
+    @TEMPO_RELATORIO.labels(relatorio='comissoes').time()
+    def _calcular_resumo_comissoes(filtros=None, max_workers=None):
+        """resumo_comissoes sem tratar erros (exceções chegam a quem chamou)"""
+        filtro = RelatorioService._filtro_periodo(filtros)
+        
+        pedidos, valor_tabela_map, vendedores_cadastrados, linhas_saida, linhas_propostas = (
+            RelatorioService._pedidos_agrupados(filtro)
+        )
+        
+        # FILTRO: Ignora pedidos cuja soma total é negativa
+        pedidos = [(chave, agregado) for chave, agregado in pedidos.items() if agregado.valor_total >= 0]
+        
+        # Todos os pedidos de uma vez (centavos inteiros): VP por linha, Meta %, alíquota e comissão
+        formas = FormaRecebimentoRepository.ativas_vp(RelatorioService._formas_pedidos(pedidos))
+        calculo = RelatorioService._calcular_agregados(
+            pedidos, valor_tabela_map, vendedores_cadastrados, [ComissaoService.tabela_faixas()], [formas], max_workers
+        )
+        nomes, vendas, comissoes, propostas = RelatorioService._totais_vendedores(pedidos, calculo)
+        
+        totais = [
+            TotalVendedor(
+                nome,
+                vendedores_cadastrados[nome],
+                float(para_reais(vendas[j, 0])),
+                float(para_reais(comissoes[j, 0])),
+                int(propostas[j])
+            )
+            for j, nome in enumerate(nomes)
+        ]
+        
+        # Converte para lista e ordena
+        resultado = [
+            total.para_dict()
+            for total in sorted(totais, key=lambda x: x.total_comissoes, reverse=True)
+        ]
+        
+        logger.info(
+            f"Resumo de vendedores: {len(resultado)} vendedor(es) | Saída: {linhas_saida} linha(s), Propostas: {linhas_propostas} linha(s)",
+            extra={'vendedores': len(resultado), 'linhas_saida': linhas_saida, 'linhas_propostas': linhas_propostas}
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Resumo de vendedores (completo): {resultado}")
+        
+        return resultado
+    
+    @staticmethod
+    @TEMPO_RELATORIO.labels(relatorio='cidade').time()
     def resumo_por_cidade(filtros=None):
         """Gera resumo de comissões por cidade
         
@@ -1288,19 +1953,18 @@ class RelatorioService:
         3. GARANTE que moto existe (cria se não existir)
         4. GARANTE que forma existe e está ativa (cria se não existir)
         5. Se passou em TODOS os 4 passos → REGISTRA comissão no banco
+        
+        Args:
+            filtros (dict): Opcional. {'periodo': 'YYYY-MM'} restringe o cálculo a uma competência
         """
         
         try:
-            from bson import ObjectId
             
-            # Busca as coleções
-            saida_col = mongo.db.saida
-            proposta_col = mongo.db.propostas
-            vendedor_col = mongo.db.vendedores
-            moto_col = mongo.db.motos
+            filtro = RelatorioService._filtro_periodo(filtros)
             
-            saida_docs = list(saida_col.find({}))
-            proposta_docs = list(proposta_col.find({}))
+            # Busca só as colunas usadas no cálculo
+            saida_docs = SaidaRepository.listar(filtro, 'cidade')
+            proposta_docs = PropostaRepository.listar(filtro, 'cidade')
             
             cidades = {}
             comissoes_registradas = 0
@@ -1318,14 +1982,8 @@ class RelatorioService:
                     vendedor_cidade[vendedor_nome] = cidade
             
             # Agora processa propostas buscando pela pessoa (cliente)
-            # Mapeia cliente -> vendedor (via saida)
-            cliente_vendedor = {}
-            for doc in saida_docs:
-                pessoa = doc.get('Pessoa', '').strip()
-                vendedor_nome = doc.get('Vendedor', '').strip()
-                
-                if pessoa and vendedor_nome:
-                    cliente_vendedor[pessoa] = vendedor_nome
+            # Mapeia cliente -> vendedor (atribuições gravadas no upload da saída)
+            cliente_vendedor = AtribuicaoService.vendedores(filtro)
             
             # Processa propostas para calcular comissões
             for doc in proposta_docs:
@@ -1419,17 +2077,673 @@ class RelatorioService:
             resultado = list(cidades.values())
             resultado = sorted(resultado, key=lambda x: x['total_comissoes'], reverse=True)
             
-            import logging
-            logging.info(f"Resumo por cidade: {resultado} | Registradas: {comissoes_registradas}, Rejeitadas: {comissoes_rejeitadas}")
+            logger.info(
+                f"Resumo por cidade: {len(resultado)} cidade(s) | Registradas: {comissoes_registradas}, Rejeitadas: {comissoes_rejeitadas}",
+                extra={'cidades': len(resultado), 'registradas': comissoes_registradas, 'rejeitadas': comissoes_rejeitadas}
+            )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Resumo por cidade (completo): {resultado}")
             
             return resultado
             
         except Exception as e:
-            import logging
-            logging.error(f"Erro em resumo_por_cidade: {str(e)}", exc_info=True)
+            logger.error(f"Erro em resumo_por_cidade: {str(e)}", exc_info=True)
             return []
 
 
+@medir_servico
+class SimulacaoService:
+    """Simulação ("e se?") de tabelas de alíquota e do VP das formas de recebimento
+    
+    Cada cenário pode trocar a tabela de alíquotas interna e/ou externa e o VP
+    de formas de recebimento; o que não for informado vem do cadastro. Os
+    cenários são avaliados juntos, numa única passada sobre os pedidos do
+    resumo de comissões, em matrizes pedidos x cenários (numpy), com as mesmas
+    regras do resumo: primeira faixa da tabela (na ordem de cadastro) com
+    meta_min <= Meta %, respeitando meta_max, e alíquota padrão quando nenhuma
+    serve. Nada é gravado: os parâmetros e as formas cadastrados só são lidos.
+    
+    O cenário 'atual' (cadastro como está) é sempre o primeiro e é a base das
+    diferenças (delta_vendas, delta_comissoes).
+    """
+    
+    CENARIO_ATUAL = 'atual'
+    
+    @staticmethod
+    def _numero(valor, campo, cenario):
+        """float do campo (ValueError com o nome do cenário se inválido)"""
+        try:
+            numero = float(valor)
+        except (TypeError, ValueError):
+            numero = float('nan')
+        if not np.isfinite(numero):
+            raise ValueError(f"Cenário '{cenario}': {campo} inválido ({valor!r})")
+        return numero
+    
+    @staticmethod
+    def _faixas_cenario(lista, eh_interno, campo, cenario):
+        """Faixas candidatas de um cenário, na ordem da lista (como se cadastradas nessa ordem)"""
+        if not isinstance(lista, list):
+            raise ValueError(f"Cenário '{cenario}': '{campo}' deve ser uma lista")
+        
+        numero = SimulacaoService._numero
+        faixas = []
+        for item in lista:
+            obrigatorios = ('tipo_moto', 'meta_min', 'aliquota') if eh_interno else ('meta_min', 'aliquota')
+            if not isinstance(item, dict) or any(c not in item for c in obrigatorios):
+                raise ValueError(f"Cenário '{cenario}': campos obrigatórios faltando em '{campo}'")
+            
+            # Mesma conversão das rotas de cadastro de parâmetros
+            faixas.append({
+                'eh_interno': eh_interno,
+                'tipo_moto': item.get('tipo_moto') if eh_interno else None,
+                'meta_min': numero(item['meta_min'], 'meta_min', cenario),
+                'meta_max': numero(item['meta_max'], 'meta_max', cenario) if item.get('meta_max') else None,
+                'aliquota': numero(item['aliquota'], 'aliquota', cenario)
+            })
+        return faixas
+    
+    @staticmethod
+    def _cenarios(cenarios, tabela_atual, formas_atuais, max_cenarios=None):
+        """Valida os cenários pedidos e monta a tabela de faixas e as formas de cada um
+        
+        Returns:
+            tuple: (nomes, tabelas [faixas por cenário], formas [{nome: {'aplicar_vp', 'taxa_juros'}} por cenário])
+        """
+        if not isinstance(cenarios, list) or not cenarios:
+            raise ValueError("Informe ao menos um cenário em 'cenarios'")
+        if max_cenarios and len(cenarios) > max_cenarios:
+            raise ValueError(f"No máximo {max_cenarios} cenário(s) por simulação")
+        
+        interno_atual = [p for p in tabela_atual if p['eh_interno']]
+        externo_atual = [p for p in tabela_atual if not p['eh_interno']]
+        
+        nomes = [SimulacaoService.CENARIO_ATUAL]
+        tabelas = [tabela_atual]
+        formas = [formas_atuais]
+        
+        for posicao, cenario in enumerate(cenarios, start=1):
+            if not isinstance(cenario, dict):
+                raise ValueError(f"Cenário {posicao} inválido: esperado um objeto")
+            
+            nome = str(cenario.get('nome') or f"cenario_{posicao}")
+            if nome in nomes:
+                raise ValueError(f"Nome de cenário repetido ou reservado: '{nome}'")
+            
+            interno = interno_atual
+            if cenario.get('parametros_interno') is not None:
+                interno = SimulacaoService._faixas_cenario(cenario['parametros_interno'], True, 'parametros_interno', nome)
+            externo = externo_atual
+            if cenario.get('parametros_externo') is not None:
+                externo = SimulacaoService._faixas_cenario(cenario['parametros_externo'], False, 'parametros_externo', nome)
+            
+            alteracoes = cenario.get('formas') or {}
+            if not isinstance(alteracoes, dict) or not all(isinstance(f, dict) for f in alteracoes.values()):
+                raise ValueError(f"Cenário '{nome}': 'formas' deve ser {{nome: {{aplicar_vp, taxa_juros}}}}")
+            
+            formas_cenario = dict(formas_atuais)
+            for forma, alteracao in alteracoes.items():
+                forma_cenario = dict(formas_atuais.get(forma, {}))
+                if 'aplicar_vp' in alteracao:
+                    forma_cenario['aplicar_vp'] = bool(alteracao['aplicar_vp'])
+                if 'taxa_juros' in alteracao:
+                    forma_cenario['taxa_juros'] = SimulacaoService._numero(alteracao['taxa_juros'], f"taxa_juros de '{forma}'", nome)
+                formas_cenario[forma] = forma_cenario
+            
+            nomes.append(nome)
+            tabelas.append(interno + externo)
+            formas.append(formas_cenario)
+        
+        return nomes, tabelas, formas
+    
+    @staticmethod
+    def simular(cenarios, filtros=None, max_cenarios=None, max_workers=None):
+        """Avalia os cenários sobre os pedidos do período
+        
+        Args:
+            cenarios (list): [{'nome', 'parametros_interno': [{tipo_moto, meta_min, meta_max, aliquota}],
+                'parametros_externo': [{meta_min, meta_max, aliquota}],
+                'formas': {nome: {'aplicar_vp', 'taxa_juros'}}}]; tudo opcional
+            filtros (dict): Opcional. {'periodo': 'YYYY-MM'}
+            max_cenarios (int): Limite de cenários pedidos (SIMULACAO_MAX_CENARIOS)
+            max_workers (int): Processos no cálculo dos pedidos (RELATORIO_WORKERS; padrão: 1)
+        
+        Returns:
+            dict: {'cenarios': [totais e deltas por cenário], 'vendedores': [por vendedor, com
+                'cenarios' na mesma ordem], 'pedidos': quantidade}
+        """
+        filtro = RelatorioService._filtro_periodo(filtros)
+        pedidos, valor_tabela_map, vendedores_cadastrados, _, _ = RelatorioService._pedidos_agrupados(filtro)
+        
+        # Mesmo filtro do resumo: pedidos com soma negativa não entram
+        pedidos = [(chave, agregado) for chave, agregado in pedidos.items() if agregado.valor_total >= 0]
+        
+        formas_atuais = FormaRecebimentoRepository.ativas_vp(RelatorioService._formas_pedidos(pedidos))
+        nomes, tabelas, formas = SimulacaoService._cenarios(
+            cenarios, ComissaoService.tabela_faixas(), formas_atuais, max_cenarios
+        )
+        quantidade = len(nomes)
+        
+        # Pedidos x cenários numa única passada (mesmo cálculo do resumo)
+        calculo = RelatorioService._calcular_agregados(
+            pedidos, valor_tabela_map, vendedores_cadastrados, tabelas, formas, max_workers
+        )
+        nomes_vendedores, total_vendas, total_comissoes, propostas = RelatorioService._totais_vendedores(pedidos, calculo)
+        
+        def totais(vendas_cenarios, comissoes_cenarios):
+            # Centavos inteiros: diferenças exatas
+            return [
+                {
+                    'nome': nome,
+                    'total_vendas': float(para_reais(vendas_cenarios[k])),
+                    'total_comissoes': float(para_reais(comissoes_cenarios[k])),
+                    'delta_vendas': float(para_reais(vendas_cenarios[k] - vendas_cenarios[0])),
+                    'delta_comissoes': float(para_reais(comissoes_cenarios[k] - comissoes_cenarios[0]))
+                }
+                for k, nome in enumerate(nomes)
+            ]
+        
+        # Mesma ordem do resumo: maior comissão no cenário atual primeiro
+        ordem = sorted(range(len(nomes_vendedores)), key=lambda j: total_comissoes[j, 0], reverse=True)
+        vendedores = [
+            {
+                'vendor_name': nomes_vendedores[j],
+                'eh_interno': vendedores_cadastrados[nomes_vendedores[j]],
+                'quantidade_propostas': int(propostas[j]),
+                'cenarios': totais(total_vendas[j], total_comissoes[j])
+            }
+            for j in ordem
+        ]
+        
+        logger.info(
+            f"Simulação: {quantidade} cenário(s) x {len(pedidos)} pedido(s), {len(nomes_vendedores)} vendedor(es)",
+            extra={'cenarios': quantidade, 'pedidos': len(pedidos)}
+        )
+        
+        return {
+            'cenarios': totais(total_vendas.sum(axis=0), total_comissoes.sum(axis=0)),
+            'vendedores': vendedores,
+            'pedidos': len(pedidos)
+        }
+
+
+@medir_servico
+class PeriodoService:
+    """Serviço de histórico por competência (período)
+    
+    Cada linha de saida/propostas é gravada com o campo 'periodo' ('YYYY-MM'),
+    derivado de 'Data Venda'. Um upload substitui apenas o seu período principal
+    (o informado ou o da maioria das linhas); linhas de outros meses que vierem
+    no arquivo são gravadas por chave, mantendo o histórico desses meses.
+    
+    Períodos passados podem ser congelados na collection 'resumos_periodo' com o
+    resumo por vendedor já calculado, para que consultas acumuladas (ex: ano)
+    leiam N resumos pequenos em vez de recalcular N meses de linhas brutas.
+    """
+    
+    COLECAO_RESUMOS = ResumoPeriodoRepository.COLECAO
+    
+    @staticmethod
+    def garantir_indices():
+        """Cria os índices de período (idempotente)"""
+        SaidaRepository.create_index('periodo')
+        SaidaRepository.create_index([('periodo', 1), ('Vendedor', 1)])
+        SaidaRepository.create_index('chave_linha')
+        PropostaRepository.create_index('periodo')
+        PropostaRepository.create_index([('periodo', 1), ('Pessoa', 1)])
+        PropostaRepository.create_index('chave_linha')
+        ComissaoRepository.create_index('periodo')
+        ResumoPeriodoRepository.create_index('periodo', unique=True)
+        LoteLinhasRepository.create_index([('colecao', 1), ('periodo', 1)], unique=True)
+        AtribuicaoVendedorRepository.create_index([('periodo', 1), ('pessoa', 1)], unique=True)
+        AtribuicaoVendedorRepository.create_index([('vendedor', 1), ('periodo', 1)])
+    
+    @staticmethod
+    def normalizar_periodo(valor):
+        """Valida e normaliza um período informado pelo usuário
+        
+        Aceita 'YYYY-MM', 'YYYY/MM' ou 'MM/YYYY'.
+        
+        Returns:
+            str: Período no formato 'YYYY-MM' (ou None se valor vazio)
+        
+        Raises:
+            ValueError: Se o formato for inválido
+        """
+        if not valor:
+            return None
+        
+        valor = str(valor).strip()
+        for formato in ('%Y-%m', '%Y/%m', '%m/%Y'):
+            try:
+                return datetime.strptime(valor, formato).strftime('%Y-%m')
+            except ValueError:
+                continue
+        
+        raise ValueError(f"Período inválido: '{valor}'. Use o formato AAAA-MM")
+    
+    @staticmethod
+    def extrair_periodo(data_venda):
+        """Extrai a competência ('YYYY-MM') de um valor de 'Data Venda'
+        
+        Args:
+            data_venda: Texto no formato do ERP ('26/12/2025 12:48:24') ou datetime
+        
+        Returns:
+            str: 'YYYY-MM' ou None se não for possível interpretar a data
+        """
+        if isinstance(data_venda, datetime):
+            # NaT (célula vazia lida como data) também é datetime e não é igual a si mesmo
+            return data_venda.strftime('%Y-%m') if data_venda == data_venda else None
+        
+        texto = str(data_venda or '').strip()
+        if not texto:
+            return None
+        
+        for formato in ('%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+            try:
+                return datetime.strptime(texto, formato).strftime('%Y-%m')
+            except ValueError:
+                continue
+        
+        return None
+    
+    @staticmethod
+    def _periodo_predominante(periodos):
+        """Retorna o período mais frequente de uma lista (ignora vazios)"""
+        contagem = {}
+        for periodo in periodos:
+            if periodo:
+                contagem[periodo] = contagem.get(periodo, 0) + 1
+        
+        if not contagem:
+            return None
+        
+        return max(contagem.items(), key=lambda item: (item[1], item[0]))[0]
+    
+    @staticmethod
+    def atribuir_periodos_saida(dados, periodo_padrao=None):
+        """Grava o campo 'periodo' em cada linha de saida a partir de 'Data Venda'
+        
+        Linhas sem data válida recebem o período informado no upload ou,
+        na falta dele, o período predominante do arquivo.
+        
+        Returns:
+            list: Períodos presentes no lote (ordenados)
+        """
+        periodos = [PeriodoService.extrair_periodo(doc.get('Data Venda')) for doc in dados]
+        fallback = periodo_padrao or PeriodoService._periodo_predominante(periodos) or datetime.now().strftime('%Y-%m')
+        
+        for doc, periodo in zip(dados, periodos):
+            doc['periodo'] = periodo or fallback
+        
+        return sorted({doc['periodo'] for doc in dados})
+    
+    @staticmethod
+    def atribuir_periodos_proposta(dados, periodo_padrao=None):
+        """Grava o campo 'periodo' em cada linha de propostas
+        
+        Propostas não têm 'Data Venda': o período vem da saida com o mesmo pedido.
+        Se o upload informar um período, ele prevalece para todas as linhas.
+        
+        Returns:
+            list: Períodos presentes no lote (ordenados)
+        """
+        if periodo_padrao:
+            for doc in dados:
+                doc['periodo'] = periodo_padrao
+            return [periodo_padrao] if dados else []
+        
+        # Mapa Pedido -> período a partir das saídas já gravadas
+        periodo_por_pedido = {}
+        for doc in SaidaRepository.find({'periodo': {'$exists': True}}, 'periodo_pedido'):
+            pedido = str(doc.get('Pedido', '')).strip()
+            if pedido:
+                periodo_por_pedido[pedido] = doc['periodo']
+        
+        periodos = []
+        for doc in dados:
+            pedido = doc.get('Nº Pedido', '') or doc.get('N° Pedido', '') or doc.get('Pedido', '')
+            periodos.append(periodo_por_pedido.get(str(pedido).strip()))
+        
+        fallback = PeriodoService._periodo_predominante(periodos) or datetime.now().strftime('%Y-%m')
+        
+        for doc, periodo in zip(dados, periodos):
+            doc['periodo'] = periodo or fallback
+        
+        return sorted({doc['periodo'] for doc in dados})
+    
+    @staticmethod
+    def periodo_principal(dados, periodo_padrao=None):
+        """Período que o upload substitui: o informado ou o da maioria das linhas"""
+        return periodo_padrao or PeriodoService._periodo_predominante([doc.get('periodo') for doc in dados])
+    
+    @staticmethod
+    def substituir_periodo(colecao, dados, periodo):
+        """Substitui o período principal do lote (mantém os demais meses)
+        
+        Só as linhas do período principal são apagadas e regravadas. Linhas do
+        lote de outros meses (ex: pedidos de novembro na exportação de dezembro)
+        são gravadas pela chave no próprio período, sem apagar as demais linhas
+        dele. As linhas devem estar preparadas (preparar_linhas).
+        
+        Também invalida os resumos congelados, as comissões e os snapshots dos
+        períodos alterados; na saída, refaz as atribuições de vendedor.
+        
+        Returns:
+            list: Períodos alterados
+        """
+        periodos = [periodo] if periodo else []
+        
+        if periodos:
+            repositorio_linhas(colecao).delete_many({'periodo': periodo})
+        
+        delta = UploadIncrementalService.aplicar_delta(colecao, dados, periodos, alterados=periodos)
+        PeriodoService.invalidar_periodos(delta['periodos_alterados'])
+        return delta['periodos_alterados']
+    
+    @staticmethod
+    def invalidar_periodos(periodos):
+        """Descarta comissões processadas e resumos congelados dos períodos alterados"""
+        if not periodos:
+            return
+        
+        ComissaoRepository.delete_many({'periodo': {'$in': list(periodos)}})
+        PeriodoService.descongelar_periodos(periodos)
+    
+    @staticmethod
+    def periodo_mais_recente():
+        """Retorna o período mais recente presente na base (ou None)"""
+        doc = SaidaRepository.find_one({'periodo': {'$exists': True}}, 'periodo', sort=[('periodo', -1)])
+        return doc.get('periodo') if doc else None
+    
+    @staticmethod
+    def listar_periodos():
+        """Lista os períodos disponíveis com contagens e status de congelamento
+        
+        Returns:
+            list: [{'periodo', 'linhas_saida', 'linhas_propostas', 'congelado', 'congelado_em'}]
+        """
+        periodos = {}
+        
+        for repositorio, campo in ((SaidaRepository, 'linhas_saida'), (PropostaRepository, 'linhas_propostas')):
+            for item in repositorio.contagem_por_periodo():
+                info = periodos.setdefault(item['_id'], {
+                    'periodo': item['_id'],
+                    'linhas_saida': 0,
+                    'linhas_propostas': 0,
+                    'congelado': False,
+                    'congelado_em': None
+                })
+                info[campo] = item['total']
+        
+        for resumo in ResumoPeriodoRepository.find(forma='status'):
+            info = periodos.get(resumo['periodo'])
+            if info:
+                info['congelado'] = True
+                info['congelado_em'] = resumo.get('congelado_em')
+        
+        return sorted(periodos.values(), key=lambda x: x['periodo'], reverse=True)
+    
+    @staticmethod
+    def congelar_periodo(periodo):
+        """Calcula e grava o resumo por vendedor de um período (congelamento)
+        
+        Um erro no cálculo é repassado e nada é gravado: um resumo vazio
+        congelado por falha ficaria valendo até o próximo upload do período.
+        
+        Returns:
+            dict: Documento do resumo congelado
+        """
+        resumo = RelatorioService._calcular_resumo_comissoes({'periodo': periodo})
+        
+        documento = {
+            'periodo': periodo,
+            'resumo_vendedor': resumo,
+            'total_vendas': float(para_reais(para_centavos([item.get('total_vendas', 0) for item in resumo]).sum())),
+            'total_comissoes': float(para_reais(para_centavos([item.get('total_comissoes', 0) for item in resumo]).sum())),
+            'congelado_em': datetime.now()
+        }
+        
+        ResumoPeriodoRepository.replace_one({'periodo': periodo}, documento, upsert=True)
+        return documento
+    
+    @staticmethod
+    def descongelar_periodos(periodos):
+        """Remove os resumos congelados dos períodos informados
+        
+        Returns:
+            int: Quantidade de resumos removidos
+        """
+        resultado = ResumoPeriodoRepository.delete_many({'periodo': {'$in': list(periodos)}})
+        return resultado.deleted_count
+    
+    @staticmethod
+    def descartar_resumos():
+        """Remove todos os resumos congelados
+        
+        Chamado quando muda um parâmetro do cálculo que vale para todos os
+        períodos (alíquotas, vendedor interno/externo, tipo de moto, VP das
+        formas). Os resumos são refeitos na próxima consulta.
+        
+        Returns:
+            int: Quantidade de resumos removidos
+        """
+        return ResumoPeriodoRepository.delete_many({}).deleted_count
+    
+    @staticmethod
+    def obter_resumo_vendedor(periodo):
+        """Resumo por vendedor de um período
+        
+        Lê o resumo congelado se existir. Períodos anteriores ao mais recente da
+        base são congelados automaticamente no primeiro cálculo; o período
+        corrente é sempre recalculado. O congelado é descartado quando o período
+        é regravado (invalidar_periodos) ou muda um parâmetro do cálculo
+        (descartar_resumos). Erros no cálculo são repassados (nem o
+        resumo acumulado omite o período em silêncio).
+        
+        Returns:
+            tuple: (resumo, congelado)
+        """
+        congelado = ResumoPeriodoRepository.find_one({'periodo': periodo}, 'resumo')
+        registrar_cache('resumo_periodo', bool(congelado))
+        if congelado:
+            return congelado.get('resumo_vendedor', []), True
+        
+        mais_recente = PeriodoService.periodo_mais_recente()
+        if mais_recente and periodo < mais_recente:
+            return PeriodoService.congelar_periodo(periodo)['resumo_vendedor'], True
+        
+        return RelatorioService._calcular_resumo_comissoes({'periodo': periodo}), False
+    
+    @staticmethod
+    @TEMPO_RELATORIO.labels(relatorio='acumulado').time()
+    def resumo_acumulado(periodo_inicial, periodo_final):
+        """Resumo por vendedor somando todos os períodos de um intervalo
+        
+        Args:
+            periodo_inicial (str): 'YYYY-MM' (inclusive)
+            periodo_final (str): 'YYYY-MM' (inclusive)
+        
+        Returns:
+            dict: {'dados': [...], 'periodos': [{'periodo', 'congelado'}]}
+        """
+        disponiveis = [
+            p['periodo'] for p in PeriodoService.listar_periodos()
+            if periodo_inicial <= p['periodo'] <= periodo_final
+        ]
+        
+        vendedores = {}
+        periodos_lidos = []
+        
+        # Totais somados em centavos inteiros (ver app/utils/centavos.py)
+        for periodo in sorted(disponiveis):
+            resumo, congelado = PeriodoService.obter_resumo_vendedor(periodo)
+            periodos_lidos.append({'periodo': periodo, 'congelado': congelado})
+            
+            for item in resumo:
+                nome = item.get('vendor_name')
+                if nome not in vendedores:
+                    vendedores[nome] = {
+                        'vendor_name': nome,
+                        'total_vendas': 0,
+                        'total_comissoes': 0,
+                        'quantidade_propostas': 0,
+                        'eh_interno': item.get('eh_interno', False)
+                    }
+                
+                vendedores[nome]['total_vendas'] += int(para_centavos(item.get('total_vendas', 0)))
+                vendedores[nome]['total_comissoes'] += int(para_centavos(item.get('total_comissoes', 0)))
+                vendedores[nome]['quantidade_propostas'] += item.get('quantidade_propostas', 0)
+                vendedores[nome]['eh_interno'] = item.get('eh_interno', False)
+        
+        for totais in vendedores.values():
+            totais['total_vendas'] = float(para_reais(totais['total_vendas']))
+            totais['total_comissoes'] = float(para_reais(totais['total_comissoes']))
+        
+        resultado = sorted(vendedores.values(), key=lambda x: x['total_comissoes'], reverse=True)
+        
+        return {'dados': resultado, 'periodos': periodos_lidos}
+
+
+@medir_servico
+class UploadIncrementalService:
+    """Upload incremental (delta) de saida/propostas
+    
+    Cada linha normalizada recebe uma chave natural (pedido, doc fiscal, forma)
+    em 'chave_linha' e um hash do conteúdo em 'hash_linha'. No modo incremental
+    o lote enviado é comparado com o que está gravado para os mesmos períodos e
+    só as diferenças são aplicadas (bulk_write), informando os pedidos alterados.
+    """
+    
+    @staticmethod
+    def _pedido(doc):
+        """Número do pedido da linha (saida usa 'Pedido', propostas 'Nº Pedido')"""
+        return str(doc.get('Nº Pedido', '') or doc.get('N° Pedido', '') or doc.get('Pedido', '')).strip()
+    
+    @staticmethod
+    def preparar_linhas(dados):
+        """Grava 'chave_linha' e 'hash_linha' em cada linha do lote
+        
+        Linhas com a mesma chave natural (ex: duas parcelas no CARTÃO do mesmo
+        pedido) recebem sufixo de ocorrência ('#2', '#3'...) para continuarem únicas.
+        """
+        ocorrencias = {}
+        
+        for doc in dados:
+            base = '|'.join([
+                UploadIncrementalService._pedido(doc),
+                str(doc.get('Doc Fiscal', '')).strip(),
+                str(doc.get('Forma Recebimento', '')).strip()
+            ])
+            ocorrencias[base] = ocorrencias.get(base, 0) + 1
+            doc['chave_linha'] = base if ocorrencias[base] == 1 else f"{base}#{ocorrencias[base]}"
+            
+            conteudo = {k: v for k, v in doc.items() if k not in ('_id', 'chave_linha', 'hash_linha')}
+            serializado = json.dumps(conteudo, sort_keys=True, default=str, ensure_ascii=False)
+            doc['hash_linha'] = hashlib.sha1(serializado.encode('utf-8')).hexdigest()
+        
+        return dados
+    
+    @staticmethod
+    def aplicar_delta(colecao, dados, periodos, alterados=()):
+        """Aplica somente as diferenças entre o lote e o que está gravado
+        
+        Linhas gravadas são comparadas pela chave: as dos períodos informados e,
+        para chaves que não estão neles, as de qualquer outro período (ex:
+        reexportação corrigida que mudou a 'Data Venda' de mês). A linha que
+        mudou de mês é atualizada, não duplicada.
+        
+        Só nos períodos informados as linhas ausentes do lote são removidas;
+        nos demais meses o lote apenas insere/atualiza as linhas que trouxe.
+        
+        Args:
+            colecao (str): 'saida' ou 'propostas'
+            dados (list): Linhas já preparadas (preparar_linhas) e com 'periodo'
+            periodos (list): Períodos que o lote substitui (período principal)
+            alterados (list): Períodos já alterados antes do delta (renovar lote)
+        
+        Returns:
+            dict: {'inseridos', 'atualizados', 'removidos', 'inalterados',
+                   'pedidos_alterados', 'periodos_alterados'}
+        """
+        repositorio = repositorio_linhas(colecao)
+        
+        gravados = {}
+        operacoes = []
+        pedidos_alterados = set()
+        periodos_alterados = set(alterados)
+        removidos = 0
+        
+        for doc in repositorio.delta(periodos):
+            chave = doc.get('chave_linha')
+            if chave:
+                gravados[chave] = doc
+            else:
+                # Linha gravada antes do controle de chave: substitui
+                operacoes.append(DeleteOne({'_id': doc['_id']}))
+                periodos_alterados.add(doc.get('periodo'))
+                removidos += 1
+        
+        # Chaves do lote que não estão nos seus períodos: procura em todos (índice em chave_linha)
+        novas = {doc['chave_linha'] for doc in dados} - gravados.keys()
+        if novas:
+            for doc in repositorio.delta_por_chaves(novas, periodos):
+                if doc['chave_linha'] in gravados:
+                    # Cópia extra da mesma chave em outro período
+                    operacoes.append(DeleteOne({'_id': doc['_id']}))
+                    periodos_alterados.add(doc.get('periodo'))
+                    removidos += 1
+                else:
+                    gravados[doc['chave_linha']] = doc
+        
+        inseridos = atualizados = inalterados = 0
+        
+        for doc in dados:
+            existente = gravados.pop(doc['chave_linha'], None)
+            
+            if existente is None:
+                operacoes.append(InsertOne(doc))
+                inseridos += 1
+            elif existente.get('hash_linha') != doc['hash_linha']:
+                operacoes.append(ReplaceOne({'_id': existente['_id']}, doc))
+                periodos_alterados.add(existente.get('periodo'))
+                atualizados += 1
+            else:
+                inalterados += 1
+                continue
+            
+            pedidos_alterados.add(doc['chave_linha'].split('|')[0])
+            periodos_alterados.add(doc['periodo'])
+        
+        # O que sobrou do período substituído não veio no lote: foi removido do arquivo
+        for chave, existente in gravados.items():
+            operacoes.append(DeleteOne({'_id': existente['_id']}))
+            pedidos_alterados.add(chave.split('|')[0])
+            periodos_alterados.add(existente.get('periodo'))
+            removidos += 1
+        
+        if operacoes:
+            repositorio.bulk_write(operacoes, ordered=False)
+        
+        periodos_alterados.discard(None)
+        pedidos_alterados.discard('')
+        
+        repositorio.renovar_lotes(sorted(periodos_alterados))
+        if repositorio is SaidaRepository:
+            AtribuicaoService.reconstruir(sorted(periodos_alterados))
+        
+        return {
+            'inseridos': inseridos,
+            'atualizados': atualizados,
+            'removidos': removidos,
+            'inalterados': inalterados,
+            'pedidos_alterados': sorted(pedidos_alterados),
+            'periodos_alterados': sorted(periodos_alterados)
+        }
+
+
+@medir_servico
 class FormaRecebimentoService:
     """Serviço para gerenciar formas de recebimento"""
     
@@ -1447,14 +2761,13 @@ class FormaRecebimentoService:
             if not nome_forma:
                 return {'existe': False, 'criado': False, 'forma': None}
             
-            col = mongo.db.formas_recebimento
             nome_forma = nome_forma.strip()
             
             if not nome_forma or nome_forma.lower() == 'desconhecido':
                 return {'existe': False, 'criado': False, 'forma': None}
             
             # Verifica se já existe
-            existente = col.find_one({'nome': nome_forma})
+            existente = FormaRecebimentoRepository.por_nome(nome_forma)
             
             if existente:
                 return {'existe': True, 'criado': False, 'forma': existente}
@@ -1464,99 +2777,69 @@ class FormaRecebimentoService:
                 'nome': nome_forma,
                 'status': 'ativo'
             })
-            col.insert_one(forma)
+            FormaRecebimentoRepository.insert_one(forma)
             
             return {'existe': False, 'criado': True, 'forma': forma}
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao garantir forma de recebimento {nome_forma}: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao garantir forma de recebimento {nome_forma}: {str(e)}", exc_info=True)
             return {'existe': False, 'criado': False, 'forma': None}
     
     @staticmethod
     def criar_forma(dados):
         """Cria uma nova forma de recebimento"""
         try:
-            col = mongo.db.formas_recebimento
-            existente = col.find_one({'nome': dados.get('nome')})
-            
-            if existente:
+            if FormaRecebimentoRepository.por_nome(dados.get('nome'), 'id'):
                 return {'erro': 'Forma de recebimento já existe'}
             
             forma = FormaRecebimentoModel.create(dados)
-            col.insert_one(forma)
+            FormaRecebimentoRepository.insert_one(forma)
             
             return {'sucesso': True, 'id': str(forma['_id'])}
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao criar forma de recebimento: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao criar forma de recebimento: {str(e)}", exc_info=True)
             return {'erro': str(e)}
     
     @staticmethod
     def listar_formas(status='ativo'):
         """Lista formas de recebimento"""
         try:
-            col = mongo.db.formas_recebimento
-            query = {'status': status} if status else {}
-            formas = list(col.find(query).sort('nome', 1))
-            
-            # Converte ObjectId para string
-            for f in formas:
-                f['_id'] = str(f['_id'])
-            
-            return formas
+            return FormaRecebimentoRepository.listar_por_status(status, sort=[('nome', 1)])
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao listar formas de recebimento: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao listar formas de recebimento: {str(e)}", exc_info=True)
             return []
     
     @staticmethod
     def obter_forma(forma_id):
         """Obtém uma forma de recebimento por ID"""
         try:
-            from bson import ObjectId
-            col = mongo.db.formas_recebimento
-            forma = col.find_one({'_id': ObjectId(forma_id)})
-            
-            if forma:
-                forma['_id'] = str(forma['_id'])
-            
-            return forma
+            return FormaRecebimentoRepository.por_id(forma_id)
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao obter forma de recebimento: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao obter forma de recebimento: {str(e)}", exc_info=True)
             return None
     
     @staticmethod
     def desativar_forma(forma_id):
         """Desativa uma forma de recebimento (soft delete)"""
         try:
-            from bson import ObjectId
-            col = mongo.db.formas_recebimento
-            
-            result = col.update_one(
-                {'_id': ObjectId(forma_id)},
-                {'$set': {'status': 'inativo', 'data_atualizacao': datetime.now()}}
+            result = FormaRecebimentoRepository.atualizar_por_id(
+                forma_id,
+                {'status': 'inativo', 'data_atualizacao': datetime.now()}
             )
             
             return {'sucesso': result.modified_count > 0}
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao desativar forma de recebimento: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao desativar forma de recebimento: {str(e)}", exc_info=True)
             return {'erro': str(e)}
     
     @staticmethod
     def deletar_forma(forma_id):
         """Deleta uma forma de recebimento permanentemente"""
         try:
-            from bson import ObjectId
-            col = mongo.db.formas_recebimento
-            
-            result = col.delete_one({'_id': ObjectId(forma_id)})
+            result = FormaRecebimentoRepository.delete_one({'_id': ObjectId(forma_id)})
             
             return {'sucesso': result.deleted_count > 0}
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao deletar forma de recebimento: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao deletar forma de recebimento: {str(e)}", exc_info=True)
             return {'erro': str(e)}
     
     @staticmethod
@@ -1573,11 +2856,6 @@ class FormaRecebimentoService:
             dict: {'sucesso': bool, 'forma': dict}
         """
         try:
-            from bson import ObjectId
-            from datetime import datetime
-            
-            col = mongo.db.formas_recebimento
-            
             # Se está usando tabela progressiva, ignora taxa_juros fixa
             # Se não está usando tabela progressiva, usa a taxa_juros
             dados_atualizacao = {
@@ -1587,20 +2865,15 @@ class FormaRecebimentoService:
                 'data_atualizacao': datetime.now()
             }
             
-            result = col.update_one(
-                {'_id': ObjectId(forma_id)},
-                {'$set': dados_atualizacao}
-            )
+            result = FormaRecebimentoRepository.atualizar_por_id(forma_id, dados_atualizacao)
             
             if result.modified_count > 0:
-                forma_atualizada = col.find_one({'_id': ObjectId(forma_id)})
-                forma_atualizada['_id'] = str(forma_atualizada['_id'])
+                forma_atualizada = FormaRecebimentoRepository.por_id(forma_id)
                 return {'sucesso': True, 'forma': forma_atualizada}
             else:
                 return {'sucesso': False}
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao atualizar aplicar_vp: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao atualizar aplicar_vp: {str(e)}", exc_info=True)
             return {'sucesso': False, 'erro': str(e)}
     
     @staticmethod
@@ -1612,7 +2885,6 @@ class FormaRecebimentoService:
         Retorna: dict com status, novo_count, duplicado_count, novos, duplicados
         """
         try:
-            col = mongo.db.formas_recebimento
             novo_count = 0
             duplicado_count = 0
             novos = []
@@ -1633,7 +2905,7 @@ class FormaRecebimentoService:
                     continue
                 
                 # Verifica se já existe (CASE-INSENSITIVE para evitar duplicatas)
-                existente = col.find_one({'nome': {'$regex': f'^{nome}$', '$options': 'i'}})
+                existente = FormaRecebimentoRepository.por_nome_sem_caixa(nome, 'id')
                 
                 if not existente:
                     # Cria nova forma de recebimento
@@ -1641,7 +2913,7 @@ class FormaRecebimentoService:
                         'nome': nome,
                         'status': 'ativo'
                     })
-                    col.insert_one(forma)
+                    FormaRecebimentoRepository.insert_one(forma)
                     novo_count += 1
                     novos.append(nome)
                 else:
@@ -1657,6 +2929,5 @@ class FormaRecebimentoService:
                 'duplicados': duplicados
             }
         except Exception as e:
-            import logging
-            logging.error(f"Erro ao sincronizar formas de recebimento: {str(e)}", exc_info=True)
+            logger.error(f"Erro ao sincronizar formas de recebimento: {str(e)}", exc_info=True)
             return {'erro': str(e)}
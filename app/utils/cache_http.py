@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Política de cache HTTP e compressão das respostas
+
+Com CACHE_HTTP_HABILITADO (padrão em produção):
+- Arquivos estáticos: url_for('static', ...) inclui o hash do conteúdo
+  (?v=...). Com o hash atual a resposta pode ficar no navegador por
+  CACHE_ESTATICOS_MAX_AGE ('immutable'): um arquivo alterado gera outra URL.
+- GET das páginas e da API: ETag do corpo com 'no-cache'. O navegador
+  revalida a cada uso e recebe 304 sem corpo quando nada mudou.
+- Demais respostas (POST, erros, /api/saude, /metrics): 'no-store'.
+
+Sem ele (desenvolvimento) todas as respostas seguem 'no-cache, no-store'.
+
+Respostas a partir de COMPRESS_MIN_SIZE bytes são comprimidas com brotli ou
+gzip (Flask-Compress, se instalado), conforme o Accept-Encoding.
+"""
+
+import hashlib
+import logging
+import os
+from functools import lru_cache
+
+from flask import request
+
+try:
+    from flask_compress import Compress
+except ImportError:  # Opcional: só em requirements-production.txt
+    Compress = None
+
+logger = logging.getLogger(__name__)
+
+# Rotas de monitoramento: sempre consultadas de novo
+ENDPOINTS_SEM_CACHE = {'api.saude', 'main.metrics'}
+
+# O Flask-Compress acrescenta o algoritmo à ETag ("abc:gzip")
+SUFIXOS_COMPRESSAO = (':br"', ':gzip"', ':deflate"')
+
+
+@lru_cache(maxsize=256)
+def _hash_arquivo(caminho, modificado_ns):
+    """Primeiros 12 caracteres do SHA-256 do arquivo (cache por mtime)"""
+    with open(caminho, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def versao_estatico(app, filename):
+    """Hash do conteúdo de um arquivo estático (None se não existir)"""
+    caminho = os.path.join(app.static_folder, filename)
+    try:
+        return _hash_arquivo(caminho, os.stat(caminho).st_mtime_ns)
+    except OSError:
+        return None
+
+
+def _remover_sufixo_compressao():
+    """Normaliza o If-None-Match para a ETag do corpo sem compressão"""
+    valor = request.environ.get('HTTP_IF_NONE_MATCH')
+    if not valor:
+        return
+    
+    etags = []
+    for etag in valor.split(','):
+        etag = etag.strip()
+        for sufixo in SUFIXOS_COMPRESSAO:
+            if etag.endswith(sufixo):
+                etag = etag[:-len(sufixo)] + '"'
+                break
+        etags.append(etag)
+    request.environ['HTTP_IF_NONE_MATCH'] = ', '.join(etags)
+
+
+def _sem_cache(response):
+    response.cache_control.no_cache = True
+    response.cache_control.no_store = True
+    response.cache_control.must_revalidate = True
+    response.cache_control.max_age = 0
+    response.headers['Pragma'] = 'no-cache'
+    response.headers['Expires'] = '0'
+    return response
+
+
+def init_app(app):
+    """Registra a compressão e a política de cache"""
+    
+    habilitado = app.config['CACHE_HTTP_HABILITADO']
+    
+    if Compress is not None:
+        # Registrada antes da política: os after_request rodam na ordem
+        # inversa, então ETag e 304 são calculados sobre o corpo original
+        Compress(app)
+    elif habilitado:
+        logger.warning("Flask-Compress não instalado: respostas sem compressão")
+    
+    if not habilitado:
+        @app.after_request
+        def _desabilitar_cache(response):
+            return _sem_cache(response)
+        return
+    
+    @app.url_defaults
+    def _versionar_estaticos(endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            versao = versao_estatico(app, values['filename'])
+            if versao:
+                values['v'] = versao
+    
+    @app.before_request
+    def _normalizar_etag_cliente():
+        _remover_sufixo_compressao()
+    
+    @app.after_request
+    def _politica_cache(response):
+        if request.method not in ('GET', 'HEAD') or request.endpoint in ENDPOINTS_SEM_CACHE:
+            return _sem_cache(response)
+        
+        if request.endpoint == 'static':
+            # send_static_file já responde 304 pela ETag/Last-Modified
+            versao = request.args.get('v')
+            response.cache_control.public = True
+            if versao and versao == versao_estatico(app, request.view_args.get('filename', '')):
+                response.cache_control.no_cache = None
+                response.cache_control.max_age = app.config['CACHE_ESTATICOS_MAX_AGE']
+                response.cache_control.immutable = True
+            else:
+                response.cache_control.no_cache = True
+            return response
+        
+        if response.status_code != 200 or response.is_streamed or response.direct_passthrough:
+            return _sem_cache(response)
+        
+        # Dados internos: só o navegador guarda, sempre revalidando
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        response.add_etag()
+        return response.make_conditional(request)
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Aritmética de dinheiro em centavos inteiros (int64, NumPy)
+
+Os cálculos de comissão trabalham com vetores de centavos: somas e totais
+são exatos (sem o erro acumulado de somar floats) e todos os pedidos e
+linhas são calculados de uma vez. O arredondamento acontece só nestes
+pontos:
+
+1. Entrada: valores em reais (float) -> centavos (para_centavos)
+2. Valor presente de cada linha (ValorPresenteService.valores_presentes_centavos)
+3. Comissão do pedido: valor em centavos x alíquota (multiplicar)
+4. Rateio da comissão do pedido entre as linhas (ratear): maiores restos,
+   a soma das partes é exatamente a comissão do pedido
+
+Regra (1 a 3): centavo mais próximo; meio centavo exato vai para o centavo
+par (NBR 5891, como o round() do Python). Um valor a menos de
+TOLERANCIA_EMPATE do meio centavo conta como meio centavo exato: a
+diferença é erro de representação do float (ex: 0.025 * 100 = 2.5000000000000004).
+
+Reais só voltam na saída (para_reais), com 2 casas exatas.
+
+Valores de entrada não finitos (NaN, infinito) ou acima de LIMITE_CENTAVOS
+em módulo levantam ValueError: convertidos para int64 virariam lixo.
+"""
+
+import numpy as np
+
+# Distância (em centavos) até o meio centavo tratada como empate exato
+TOLERANCIA_EMPATE = 1e-6
+
+# Maior valor aceito na entrada, em módulo: R$ 10 milhões (10^9 centavos).
+# Mantém os produtos int64 de ratear (total x peso) longe do estouro
+LIMITE_CENTAVOS = 10 ** 9
+
+
+def arredondar_centavos(valores):
+    """Valores em centavos (float) -> int64, pela regra do módulo
+    
+    Raises:
+        ValueError: Se algum valor não for finito
+    """
+    valores = np.asarray(valores, dtype=float)
+    if not np.isfinite(valores).all():
+        raise ValueError("Valor monetário inválido (NaN ou infinito)")
+    
+    piso = np.floor(valores)
+    empate = np.abs(valores - piso - 0.5) < TOLERANCIA_EMPATE
+    
+    # Empate: fica no piso se ele for par, senão sobe
+    return np.where(empate, piso + piso % 2, np.rint(valores)).astype(np.int64)
+
+
+def para_centavos(reais):
+    """Valores em reais (escalar ou vetor) -> int64 de centavos
+    
+    Raises:
+        ValueError: Se algum valor não for finito ou passar de LIMITE_CENTAVOS em módulo
+    """
+    centavos = np.asarray(reais, dtype=float) * 100
+    if np.isfinite(centavos).all() and (np.abs(centavos) > LIMITE_CENTAVOS).any():
+        raise ValueError(f"Valor monetário acima do limite de R$ {LIMITE_CENTAVOS // 100:,}".replace(',', '.'))
+    return arredondar_centavos(centavos)
+
+
+def para_reais(centavos):
+    """int64 de centavos -> float de reais (o float mais próximo do valor com 2 casas)"""
+    return np.asarray(centavos, dtype=np.int64) / 100
+
+
+def multiplicar(centavos, fator):
+    """Centavos x fator (ex: alíquota), arredondado ao centavo"""
+    return arredondar_centavos(np.asarray(centavos, dtype=np.int64) * np.asarray(fator, dtype=float))
+
+
+def somar_por(centavos, grupos, quantidade):
+    """Soma exata das linhas de 'centavos' por grupo
+    
+    Args:
+        centavos: int64 [linhas] ou [linhas, colunas]
+        grupos: índice do grupo de cada linha [linhas]
+        quantidade: número de grupos
+    
+    Returns:
+        ndarray: int64 [quantidade] ou [quantidade, colunas]
+    """
+    centavos = np.asarray(centavos, dtype=np.int64)
+    somas = np.zeros((quantidade,) + centavos.shape[1:], dtype=np.int64)
+    np.add.at(somas, np.asarray(grupos, dtype=np.intp), centavos)
+    return somas
+
+
+def ratear(totais, pesos, grupos):
+    """Divide o total de cada grupo entre as suas linhas, proporcional aos pesos
+    
+    Maiores restos: cada linha recebe o piso da sua parte e os centavos que
+    sobram vão, um a um, às linhas de maior resto (no empate, a primeira).
+    A soma das partes de cada grupo é exatamente o total. Grupos cuja soma
+    dos pesos não é positiva devem ter total 0 (as linhas recebem 0).
+    
+    Os produtos total x peso são int64: totais e pesos até LIMITE_CENTAVOS
+    (R$ 10 milhões) cada.
+    
+    Args:
+        totais: int64 [grupos] em centavos
+        pesos: int64 [linhas] (ex: valor presente de cada linha em centavos)
+        grupos: índice do grupo de cada linha [linhas]
+    
+    Returns:
+        ndarray: int64 [linhas] com a parte de cada linha
+    """
+    totais = np.asarray(totais, dtype=np.int64)
+    pesos = np.asarray(pesos, dtype=np.int64)
+    grupos = np.asarray(grupos, dtype=np.intp)
+    
+    soma_pesos = somar_por(pesos, grupos, len(totais))
+    divisor = np.where(soma_pesos > 0, soma_pesos, 1)[grupos]
+    
+    produto = totais[grupos] * pesos
+    partes = produto // divisor
+    restos = produto % divisor
+    sobra = totais - somar_por(partes, grupos, len(totais))
+    
+    # Posição de cada linha no seu grupo, por resto decrescente
+    ordem = np.lexsort((np.arange(len(pesos)), -restos, grupos))
+    grupos_ordenados = grupos[ordem]
+    posicao = np.arange(len(ordem)) - np.searchsorted(grupos_ordenados, grupos_ordenados)
+    
+    partes[ordem[posicao < sobra[grupos_ordenados]]] += 1
+    return partes
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Conexão com o MongoDB: opções do cliente, estado do pool e disponibilidade
+
+- opcoes_cliente(): tamanho do pool, timeouts, compressão e read preference
+  do MongoClient a partir da configuração (MONGO_* em app/config.py).
+- ListenerPoolMongo: eventos do pool de conexões -> métricas Prometheus
+  (conexões abertas, em uso, operações esperando e falhas de checkout).
+- MonitorDisponibilidade: resultado dos heartbeats de cada servidor. Quando
+  todos os servidores conhecidos falharam no último heartbeat, as rotas da
+  API respondem 503 na hora ("falha rápida") em vez de prender o worker do
+  gunicorn até o timeout de seleção de servidor.
+"""
+
+import logging
+import threading
+
+from flask import jsonify, request
+from pymongo import monitoring
+from pymongo.errors import ConnectionFailure
+from pymongo.read_preferences import read_pref_mode_from_name
+
+from app.utils.metricas import (
+    POOL_MONGO_CONEXOES, POOL_MONGO_EM_USO, POOL_MONGO_AGUARDANDO, POOL_MONGO_FALHAS, MONGO_DISPONIVEL
+)
+
+logger = logging.getLogger(__name__)
+
+MENSAGEM_INDISPONIVEL = 'Banco de dados indisponível no momento. Tente novamente em instantes.'
+
+# Rotas que continuam respondendo com o MongoDB fora (diagnóstico)
+ENDPOINTS_SEM_BLOQUEIO = {'api.saude', 'api.metricas_mongo'}
+
+
+def _servidor(endereco):
+    """'host:porta' de um endereço de evento do pymongo"""
+    host, porta = endereco
+    return f"{host}:{porta}"
+
+
+def opcoes_cliente(config):
+    """Opções do MongoClient a partir da configuração da aplicação
+    
+    Returns:
+        dict: kwargs para PyMongo.init_app / MongoClient
+    """
+    compressores = [c.strip() for c in config['MONGO_COMPRESSORS'].split(',') if c.strip()]
+    
+    # Valida o nome (primary, primaryPreferred, secondary, secondaryPreferred, nearest)
+    read_pref_mode_from_name(config['MONGO_READ_PREFERENCE'])
+    
+    opcoes = {
+        'appname': config['MONGO_APPNAME'],
+        'maxPoolSize': config['MONGO_MAX_POOL_SIZE'],
+        'minPoolSize': config['MONGO_MIN_POOL_SIZE'],
+        'maxIdleTimeMS': config['MONGO_MAX_IDLE_TIME_MS'],
+        'waitQueueTimeoutMS': config['MONGO_WAIT_QUEUE_TIMEOUT_MS'],
+        'serverSelectionTimeoutMS': config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+        'connectTimeoutMS': config['MONGO_CONNECT_TIMEOUT_MS'],
+        'socketTimeoutMS': config['MONGO_SOCKET_TIMEOUT_MS'],
+        'readPreference': config['MONGO_READ_PREFERENCE'],
+    }
+    if compressores:
+        opcoes['compressors'] = compressores
+    
+    return opcoes
+
+
+class ListenerPoolMongo(monitoring.ConnectionPoolListener):
+    """Atualiza as métricas do pool a cada evento de conexão"""
+    
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_cleared(self, event):
+        logger.warning(f"[MONGO] Pool de {_servidor(event.address)} limpo (falha de conexão com o servidor)")
+    
+    def pool_closed(self, event):
+        pass
+    
+    def connection_created(self, event):
+        POOL_MONGO_CONEXOES.labels(servidor=_servidor(event.address)).inc()
+    
+    def connection_ready(self, event):
+        pass
+    
+    def connection_closed(self, event):
+        POOL_MONGO_CONEXOES.labels(servidor=_servidor(event.address)).dec()
+    
+    def connection_check_out_started(self, event):
+        POOL_MONGO_AGUARDANDO.labels(servidor=_servidor(event.address)).inc()
+    
+    def connection_check_out_failed(self, event):
+        servidor = _servidor(event.address)
+        POOL_MONGO_AGUARDANDO.labels(servidor=servidor).dec()
+        POOL_MONGO_FALHAS.labels(servidor=servidor, motivo=event.reason).inc()
+    
+    def connection_checked_out(self, event):
+        servidor = _servidor(event.address)
+        POOL_MONGO_AGUARDANDO.labels(servidor=servidor).dec()
+        POOL_MONGO_EM_USO.labels(servidor=servidor).inc()
+    
+    def connection_checked_in(self, event):
+        POOL_MONGO_EM_USO.labels(servidor=_servidor(event.address)).dec()
+
+
+class MonitorDisponibilidade(monitoring.ServerHeartbeatListener):
+    """Guarda o resultado do último heartbeat de cada servidor do MongoDB
+    
+    Os heartbeats rodam nas threads de monitoramento do pymongo (a cada
+    heartbeatFrequencyMS, ou a cada 500 ms enquanto alguma operação espera
+    um servidor), então o estado é atualizado sem custo para as requisições.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servidores = {}  # 'host:porta' -> (respondeu, erro)
+    
+    def started(self, event):
+        pass
+    
+    def succeeded(self, event):
+        self._registrar(_servidor(event.connection_id), True, None)
+    
+    def failed(self, event):
+        self._registrar(_servidor(event.connection_id), False, event.reply)
+    
+    def _registrar(self, servidor, respondeu, erro):
+        with self._lock:
+            anterior = self._servidores.get(servidor, (None, None))[0]
+            self._servidores[servidor] = (respondeu, erro)
+        
+        MONGO_DISPONIVEL.labels(servidor=servidor).set(1 if respondeu else 0)
+        
+        if anterior is not respondeu:
+            if respondeu:
+                logger.info(f"[MONGO] Servidor {servidor} respondendo")
+            else:
+                logger.error(f"[MONGO] Servidor {servidor} não respondeu ao heartbeat: {erro}")
+    
+    def indisponivel(self):
+        """True quando há servidores conhecidos e todos falharam no último heartbeat
+        
+        Sem nenhum heartbeat ainda (início do processo, mongomock) não bloqueia.
+        """
+        with self._lock:
+            estados = list(self._servidores.values())
+        return bool(estados) and not any(respondeu for respondeu, _ in estados)
+    
+    def estado(self):
+        """{'host:porta': {'disponivel', 'erro'}}"""
+        with self._lock:
+            return {
+                servidor: {'disponivel': respondeu, 'erro': str(erro) if erro else None}
+                for servidor, (respondeu, erro) in self._servidores.items()
+            }
+    
+    def reiniciar(self):
+        with self._lock:
+            self._servidores.clear()
+
+
+class ConexaoMongo:
+    """Listeners do cliente e tratamento de indisponibilidade do MongoDB"""
+    
+    def __init__(self):
+        self.listener_pool = ListenerPoolMongo()
+        self.monitor = MonitorDisponibilidade()
+    
+    @property
+    def listeners(self):
+        return [self.listener_pool, self.monitor]
+    
+    def init_app(self, app):
+        """Registra a falha rápida e o tratamento de erros de conexão"""
+        
+        @app.before_request
+        def _falha_rapida():
+            if request.blueprint not in ('api', 'upload') or request.endpoint in ENDPOINTS_SEM_BLOQUEIO:
+                return None
+            if self.monitor.indisponivel():
+                return _resposta_indisponivel()
+            return None
+        
+        @app.errorhandler(ConnectionFailure)
+        def _erro_conexao(erro):
+            # Timeout de seleção de servidor, de espera por conexão do pool
+            # (WaitQueueTimeoutError) ou conexão perdida
+            logger.error(f"[MONGO] {type(erro).__name__}: {str(erro)}")
+            return _resposta_indisponivel()
+
+
+def _resposta_indisponivel():
+    resposta = jsonify({'status': 'erro', 'mensagem': MENSAGEM_INDISPONIVEL})
+    resposta.status_code = 503
+    resposta.headers['Retry-After'] = '5'
+    return resposta
+
+
+# Instância global (listeners registrados no MongoClient em create_app)
+conexao_mongo = ConexaoMongo()
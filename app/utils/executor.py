@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Execução de trabalho pesado de CPU fora do loop de requisições
+
+Com workers gevent (GUNICORN_WORKER_CLASS=gevent, ver gunicorn.conf.py) todas
+as requisições de um processo dividem uma única thread e se alternam nas
+esperas de I/O (MongoDB, rede). Trechos longos de CPU (geração do PDF,
+parsing dos CSVs com pandas) não têm esperas: sem ajuda, seguram todas as
+outras requisições do worker até terminar.
+
+executar_cpu() roda esses trechos no pool de threads nativas do gevent. A
+requisição que pediu o trabalho espera o resultado cooperativamente e o loop
+continua atendendo as demais (o GIL é alternado entre as threads a cada
+poucos milissegundos). Com workers sync a função é chamada diretamente.
+
+iniciar_thread_nativa() faz o mesmo para laços de longa duração (gravação
+dos logs): com o monkey patching, threading.Thread vira um greenlet e o laço
+passaria a disputar o loop com as requisições. fila_nativa() dá a fila para
+trocar dados com esses laços.
+"""
+
+import queue
+import threading
+
+try:
+    import gevent
+    from gevent import monkey
+except ImportError:  # gevent só é necessário no modo de workers gevent
+    gevent = None
+    monkey = None
+
+
+def gevent_ativo():
+    """True se o processo roda com o monkey patching do gevent (worker gevent)"""
+    return monkey is not None and monkey.is_module_patched('threading')
+
+
+def executar_cpu(funcao, *args, **kwargs):
+    """Executa funcao(*args, **kwargs) fora do loop do gevent e retorna o resultado
+    
+    Exceções levantadas pela função são repassadas a quem chamou.
+    """
+    if not gevent_ativo():
+        return funcao(*args, **kwargs)
+    
+    return gevent.get_hub().threadpool.apply(funcao, args, kwargs)
+
+
+def fila_nativa():
+    """queue.SimpleQueue original (não cooperativa), que uma thread nativa pode ler
+    
+    Com o monkey patching, queue.SimpleQueue vira a fila do gevent; a original
+    vem de gevent.monkey.get_original. Sem gevent, é a própria queue.SimpleQueue.
+    """
+    if monkey is None:
+        return queue.SimpleQueue()
+    return monkey.get_original('queue', 'SimpleQueue')()
+
+
+def iniciar_thread_nativa(funcao):
+    """Roda funcao() em uma thread do sistema operacional, em segundo plano
+    
+    A função não deve usar primitivas do gevent (filas e locks de 'queue' e
+    'threading' ficam cooperativos com o monkey patching): para trocar dados
+    com ela use fila_nativa().
+    
+    Returns:
+        callable: espera a função terminar
+    """
+    if not gevent_ativo():
+        thread = threading.Thread(target=funcao, daemon=True)
+        thread.start()
+        return thread.join
+    
+    return gevent.get_hub().threadpool.spawn(funcao).wait
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentação das idas ao MongoDB
+
+Um CommandListener do pymongo contabiliza comandos, documentos retornados e
+tempo gasto no banco por requisição Flask e por método de serviço. Ao final
+de cada requisição é registrada uma linha de resumo no log; os totais desde
+o início do processo ficam disponíveis em /api/metricas/mongo.
+
+Padrões N+1 (o mesmo formato de comando repetido mais de K vezes na mesma
+requisição, ex: um find_one por pedido) são sinalizados com um aviso.
+"""
+
+import functools
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+from flask import g, request
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Repetições do mesmo formato de comando numa requisição a partir das quais
+# o padrão é sinalizado como N+1 (sobrescrito por MONGO_N_MAIS_1_LIMITE)
+LIMITE_N_MAIS_1 = 20
+
+# Comandos que não entram na detecção de N+1 (continuação de cursor, sessão)
+COMANDOS_IGNORADOS_N_MAIS_1 = {'getMore', 'killCursors', 'endSessions'}
+
+# Campo com o nome da coleção / o filtro, por comando
+_FILTRO_POR_COMANDO = {
+    'find': 'filter',
+    'count': 'query',
+    'distinct': 'query',
+    'findAndModify': 'query',
+}
+
+_estatisticas_atuais = ContextVar('estatisticas_mongo', default=None)
+_servico_atual = ContextVar('servico_mongo', default=None)
+
+
+def _forma_valor(valor):
+    """Estrutura de um filtro com os valores substituídos por '?'"""
+    if isinstance(valor, dict):
+        return {chave: _forma_valor(v) for chave, v in sorted(valor.items())}
+    if isinstance(valor, (list, tuple)):
+        return [_forma_valor(valor[0])] if valor else []
+    return '?'
+
+
+def forma_comando(nome, comando):
+    """Formato do comando: nome, coleção e estrutura do filtro sem valores
+    
+    Dois find_one em 'vendedores' por nomes diferentes têm o mesmo formato;
+    é isso que permite identificar consultas repetidas em laço.
+    """
+    colecao = comando.get(nome)
+    if not isinstance(colecao, str):
+        colecao = ''
+    
+    if nome == 'aggregate':
+        estagios = [next(iter(estagio), '') for estagio in comando.get('pipeline', [])]
+        return f"aggregate {colecao} {estagios}"
+    
+    if nome in ('update', 'delete'):
+        operacoes = comando.get('updates' if nome == 'update' else 'deletes') or [{}]
+        return f"{nome} {colecao} {_forma_valor(operacoes[0].get('q', {}))}"
+    
+    campo = _FILTRO_POR_COMANDO.get(nome)
+    if campo:
+        return f"{nome} {colecao} {_forma_valor(comando.get(campo, {}))}"
+    
+    return f"{nome} {colecao}".strip()
+
+
+def _documentos_retornados(resposta):
+    """Quantidade de documentos devolvidos pelo servidor em uma resposta"""
+    cursor = resposta.get('cursor')
+    if isinstance(cursor, dict):
+        return len(cursor.get('firstBatch') or cursor.get('nextBatch') or [])
+    if 'values' in resposta:  # distinct
+        return len(resposta['values'])
+    if resposta.get('value') is not None:  # findAndModify
+        return 1
+    return 0
+
+
+class EstatisticasMongo:
+    """Contadores de comandos, documentos e tempo de um escopo"""
+    
+    def __init__(self):
+        self.comandos = 0
+        self.documentos = 0
+        self.tempo_ms = 0.0
+        self.falhas = 0
+        self.por_comando = Counter()
+        self.formas = Counter()
+        self.por_servico = defaultdict(lambda: {'comandos': 0, 'documentos': 0, 'tempo_ms': 0.0})
+    
+    def registrar(self, nome, forma, documentos, tempo_ms, servico, falhou=False):
+        self.comandos += 1
+        self.documentos += documentos
+        self.tempo_ms += tempo_ms
+        self.falhas += int(falhou)
+        self.por_comando[nome] += 1
+        
+        if nome not in COMANDOS_IGNORADOS_N_MAIS_1:
+            self.formas[forma] += 1
+        
+        if servico:
+            contadores = self.por_servico[servico]
+            contadores['comandos'] += 1
+            contadores['documentos'] += documentos
+            contadores['tempo_ms'] += tempo_ms
+    
+    def suspeitas_n_mais_1(self, limite):
+        """Formatos de comando repetidos mais de `limite` vezes"""
+        return [
+            {'forma': forma, 'repeticoes': total}
+            for forma, total in self.formas.most_common()
+            if total > limite
+        ]
+    
+    def para_dict(self):
+        return {
+            'comandos': self.comandos,
+            'documentos': self.documentos,
+            'tempo_ms': round(self.tempo_ms, 2),
+            'falhas': self.falhas,
+            'por_comando': dict(self.por_comando),
+            'por_servico': {
+                servico: {**c, 'tempo_ms': round(c['tempo_ms'], 2)}
+                for servico, c in sorted(self.por_servico.items())
+            }
+        }
+
+
+class ListenerComandosMongo(monitoring.CommandListener):
+    """Recebe os eventos de comando do pymongo e atualiza os contadores
+    
+    O pymongo síncrono dispara started/succeeded na thread que executou o
+    comando, então o escopo da requisição e do serviço (ContextVar) ainda é
+    o do chamador quando o evento chega.
+    """
+    
+    def __init__(self, instrumentacao):
+        self._instrumentacao = instrumentacao
+        self._pendentes = {}
+        self._lock = threading.Lock()
+    
+    def started(self, event):
+        chave = (event.request_id, event.connection_id)
+        with self._lock:
+            self._pendentes[chave] = forma_comando(event.command_name, event.command)
+    
+    def _finalizar(self, event, documentos, falhou):
+        chave = (event.request_id, event.connection_id)
+        with self._lock:
+            forma = self._pendentes.pop(chave, event.command_name)
+        
+        self._instrumentacao.registrar(
+            event.command_name, forma, documentos, event.duration_micros / 1000.0, falhou
+        )
+    
+    def succeeded(self, event):
+        self._finalizar(event, _documentos_retornados(event.reply), falhou=False)
+    
+    def failed(self, event):
+        self._finalizar(event, 0, falhou=True)
+
+
+class InstrumentacaoMongo:
+    """Agrega as métricas do listener por requisição, por serviço e no processo
+    
+    Uso:
+        instrumentacao_mongo.init_app(app)
+        mongo.init_app(app, event_listeners=[instrumentacao_mongo.listener])
+    """
+    
+    def __init__(self):
+        self.listener = ListenerComandosMongo(self)
+        self.limite_n_mais_1 = LIMITE_N_MAIS_1
+        self._lock = threading.Lock()
+        self._totais = EstatisticasMongo()
+        self._por_rota = defaultdict(lambda: {'requisicoes': 0, 'comandos': 0, 'documentos': 0, 'tempo_ms': 0.0})
+        self._requisicoes = 0
+        self._n_mais_1 = Counter()
+    
+    def init_app(self, app):
+        """Registra os ganchos de início/fim de requisição na aplicação"""
+        self.limite_n_mais_1 = app.config.get('MONGO_N_MAIS_1_LIMITE', LIMITE_N_MAIS_1)
+        
+        @app.before_request
+        def _iniciar_contagem_mongo():
+            g.estatisticas_mongo = EstatisticasMongo()
+            g.inicio_requisicao = time.perf_counter()
+            _estatisticas_atuais.set(g.estatisticas_mongo)
+        
+        @app.teardown_request
+        def _finalizar_contagem_mongo(exc=None):
+            estatisticas = g.pop('estatisticas_mongo', None)
+            if estatisticas is None:
+                return
+            _estatisticas_atuais.set(None)
+            
+            rota = f"{request.method} {request.url_rule.rule if request.url_rule else request.path}"
+            duracao_ms = (time.perf_counter() - g.inicio_requisicao) * 1000
+            self.finalizar_requisicao(rota, estatisticas, duracao_ms)
+    
+    def registrar(self, nome, forma, documentos, tempo_ms, falhou=False):
+        """Contabiliza um comando no escopo atual e nos totais do processo"""
+        servico = _servico_atual.get()
+        
+        estatisticas = _estatisticas_atuais.get()
+        if estatisticas is not None:
+            estatisticas.registrar(nome, forma, documentos, tempo_ms, servico, falhou)
+        
+        with self._lock:
+            self._totais.registrar(nome, forma, documentos, tempo_ms, servico, falhou)
+    
+    def finalizar_requisicao(self, rota, estatisticas, duracao_ms):
+        """Loga o resumo da requisição e acumula por rota"""
+        suspeitas = estatisticas.suspeitas_n_mais_1(self.limite_n_mais_1)
+        
+        with self._lock:
+            self._requisicoes += 1
+            contadores = self._por_rota[rota]
+            contadores['requisicoes'] += 1
+            contadores['comandos'] += estatisticas.comandos
+            contadores['documentos'] += estatisticas.documentos
+            contadores['tempo_ms'] += estatisticas.tempo_ms
+            for suspeita in suspeitas:
+                self._n_mais_1[(rota, suspeita['forma'])] += 1
+        
+        if estatisticas.comandos:
+            logger.info(
+                f"[MONGO] {rota}: {estatisticas.comandos} comandos, "
+                f"{estatisticas.documentos} documentos, {estatisticas.tempo_ms:.1f} ms no banco "
+                f"({duracao_ms:.1f} ms total)"
+            )
+        
+        for suspeita in suspeitas:
+            logger.warning(
+                f"[MONGO] Possível N+1 em {rota}: '{suspeita['forma']}' "
+                f"executado {suspeita['repeticoes']}x (limite {self.limite_n_mais_1})"
+            )
+    
+    def estatisticas_requisicao(self):
+        """Contadores da requisição em andamento (None fora de requisição)"""
+        return _estatisticas_atuais.get()
+    
+    def totais(self):
+        """Totais desde o início do processo"""
+        with self._lock:
+            dados = self._totais.para_dict()
+            dados['requisicoes'] = self._requisicoes
+            dados['por_rota'] = {
+                rota: {**c, 'tempo_ms': round(c['tempo_ms'], 2)}
+                for rota, c in sorted(self._por_rota.items())
+            }
+            dados['n_mais_1'] = [
+                {'rota': rota, 'forma': forma, 'requisicoes': total}
+                for (rota, forma), total in self._n_mais_1.most_common()
+            ]
+            dados['limite_n_mais_1'] = self.limite_n_mais_1
+        return dados
+    
+    def reiniciar(self):
+        """Zera os totais do processo"""
+        with self._lock:
+            self._totais = EstatisticasMongo()
+            self._por_rota.clear()
+            self._requisicoes = 0
+            self._n_mais_1.clear()
+
+
+def medir_servico(cls):
+    """Decorador de classe: atribui os comandos dos métodos públicos ao serviço
+    
+    Cada @staticmethod público passa a marcar o escopo 'Classe.metodo'
+    enquanto executa; em chamadas aninhadas vale o método mais interno.
+    Métodos privados (prefixo '_') não são embrulhados, então o custo de um
+    helper fica com o método público que o chamou.
+    """
+    for nome, atributo in list(vars(cls).items()):
+        if nome.startswith('_') or not isinstance(atributo, staticmethod):
+            continue
+        setattr(cls, nome, staticmethod(_embrulhar(f"{cls.__name__}.{nome}", atributo.__func__)))
+    return cls
+
+
+def _embrulhar(escopo, funcao):
+    @functools.wraps(funcao)
+    def wrapper(*args, **kwargs):
+        token = _servico_atual.set(escopo)
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            _servico_atual.reset(token)
+    
+    return wrapper
+
+
+instrumentacao_mongo = InstrumentacaoMongo()
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Leitura de CSV com detecção de dialeto (encoding, delimitador e aspas)
+
+Os exports do ERP chegam em UTF-8 com BOM, UTF-8 sem BOM ou Latin-1/CP1252,
+delimitados por ';' e com campos entre aspas que podem conter vírgulas.
+O arquivo é lido do disco uma única vez: o dialeto é detectado em um prefixo
+dos bytes e o mesmo conteúdo em memória é entregue ao pandas.
+"""
+
+import codecs
+import csv
+import logging
+from collections import namedtuple
+from datetime import date
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Tamanho do prefixo analisado para detectar o dialeto
+TAMANHO_PREFIXO = 64 * 1024
+
+DELIMITADORES_CANDIDATOS = (';', ',', '\t', '|')
+
+DialetoCSV = namedtuple('DialetoCSV', ['encoding', 'delimitador', 'aspas'])
+
+
+def motor_csv():
+    """Engine do pandas para leitura de CSV: 'pyarrow' quando instalado, senão 'c'"""
+    try:
+        import pyarrow  # noqa: F401
+        return 'pyarrow'
+    except ImportError:
+        return 'c'
+
+
+def detectar_encoding(prefixo, conteudo=None):
+    """Detecta o encoding a partir do BOM ou da validade UTF-8 dos bytes
+    
+    Args:
+        prefixo (bytes): Início do arquivo
+        conteudo (bytes): Arquivo completo (opcional). Usado só quando o prefixo
+            é ASCII puro e não permite distinguir UTF-8 de Latin-1.
+    
+    Returns:
+        str: 'utf-8-sig', 'utf-16', 'utf-8', 'cp1252' ou 'latin-1'
+    """
+    if prefixo.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if prefixo.startswith(codecs.BOM_UTF16_LE) or prefixo.startswith(codecs.BOM_UTF16_BE):
+        return 'utf-16'
+    
+    amostra = prefixo
+    if conteudo is not None and prefixo.isascii():
+        amostra = conteudo
+    
+    try:
+        amostra.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError as e:
+        # Prefixo cortado no meio de um caractere multibyte ainda é UTF-8
+        if amostra is prefixo and len(prefixo) - e.start < 4 and e.reason == 'unexpected end of data':
+            return 'utf-8'
+    
+    try:
+        amostra.decode('cp1252')
+        return 'cp1252'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+
+def _contar_fora_de_aspas(linha, delimitador, aspas='"'):
+    """Conta ocorrências do delimitador ignorando as que estão entre aspas"""
+    total = 0
+    dentro_aspas = False
+    
+    for caractere in linha:
+        if caractere == aspas:
+            dentro_aspas = not dentro_aspas
+        elif caractere == delimitador and not dentro_aspas:
+            total += 1
+    
+    return total
+
+
+def detectar_delimitador(texto):
+    """Escolhe o delimitador mais consistente entre as linhas da amostra
+    
+    Para cada candidato, conta ocorrências fora de aspas em cada linha; vence
+    o que aparece no cabeçalho e se repete no mesmo número nas demais linhas.
+    
+    Returns:
+        str: Delimitador (padrão ';', formato do ERP)
+    """
+    linhas = [linha for linha in texto.splitlines() if linha.strip()]
+    
+    # A última linha do prefixo pode estar truncada
+    if len(linhas) > 2:
+        linhas = linhas[:-1]
+    linhas = linhas[:50]
+    
+    if not linhas:
+        return ';'
+    
+    melhor = None
+    melhor_pontuacao = (0, 0)
+    
+    for delimitador in DELIMITADORES_CANDIDATOS:
+        contagens = [_contar_fora_de_aspas(linha, delimitador) for linha in linhas]
+        colunas = contagens[0]
+        if colunas == 0:
+            continue
+        
+        consistentes = sum(1 for c in contagens if c == colunas)
+        pontuacao = (consistentes, colunas)
+        if pontuacao > melhor_pontuacao:
+            melhor = delimitador
+            melhor_pontuacao = pontuacao
+    
+    return melhor or ';'
+
+
+def detectar_dialeto(prefixo, conteudo=None):
+    """Detecta encoding, delimitador e caractere de aspas de um CSV
+    
+    Args:
+        prefixo (bytes): Início do arquivo (ex: primeiros 64 KB)
+        conteudo (bytes): Arquivo completo, se já estiver em memória
+    
+    Returns:
+        DialetoCSV
+    """
+    encoding = detectar_encoding(prefixo, conteudo)
+    texto = prefixo.decode(encoding, errors='ignore')
+    
+    if texto.startswith('\ufeff'):
+        texto = texto[1:]
+    
+    delimitador = detectar_delimitador(texto)
+    aspas = "'" if texto.count("'") > texto.count('"') and texto.lstrip().startswith("'") else '"'
+    
+    return DialetoCSV(encoding, delimitador, aspas)
+
+
+def ler_cabecalho(filepath):
+    """Retorna os nomes das colunas do CSV (sem ler o arquivo inteiro)"""
+    with open(filepath, 'rb') as f:
+        prefixo = f.read(TAMANHO_PREFIXO)
+    
+    dialeto = detectar_dialeto(prefixo)
+    texto = prefixo.decode(dialeto.encoding, errors='ignore').lstrip('\ufeff')
+    primeira_linha = texto.splitlines()[0] if texto else ''
+    
+    for colunas in csv.reader([primeira_linha], delimiter=dialeto.delimitador, quotechar=dialeto.aspas):
+        return [c.strip() for c in colunas]
+    return []
+
+
+def ler_csv(filepath):
+    """Lê um CSV do disco uma única vez, com dialeto detectado
+    
+    Returns:
+        tuple: (DataFrame, DialetoCSV)
+    """
+    with open(filepath, 'rb') as f:
+        conteudo = f.read()
+    
+    dialeto = detectar_dialeto(conteudo[:TAMANHO_PREFIXO], conteudo)
+    logger.debug(f"CSV {filepath}: encoding={dialeto.encoding} delimitador={dialeto.delimitador!r} aspas={dialeto.aspas!r}")
+    
+    opcoes = {'encoding': dialeto.encoding, 'sep': dialeto.delimitador, 'quotechar': dialeto.aspas}
+    motor = motor_csv()
+    df = pd.read_csv(BytesIO(conteudo), engine=motor, **opcoes)
+    
+    if motor == 'pyarrow':
+        _restaurar_datas_texto(df, conteudo, opcoes)
+    
+    return df, dialeto
+
+
+def _colunas_data(df):
+    """Colunas que o pyarrow converteu em data (datetime64 ou datetime.date)"""
+    colunas = []
+    
+    for coluna in df.columns:
+        serie = df[coluna]
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            colunas.append(coluna)
+        elif serie.dtype == object:
+            # Colunas do pyarrow têm tipo único: basta o primeiro valor preenchido
+            indice = serie.first_valid_index()
+            if indice is not None and isinstance(serie[indice], date):
+                colunas.append(coluna)
+    
+    return colunas
+
+
+def _restaurar_datas_texto(df, conteudo, opcoes):
+    """Relê como texto as colunas que o pyarrow interpretou como data
+    
+    O pyarrow converte colunas ISO ('2025-12-26') em datas, e uma célula vazia
+    vira NaT. O motor 'c' mantém o texto original; as colunas são relidas como
+    texto para que os valores gravados não dependam do motor (vazio -> NaN).
+    """
+    colunas = _colunas_data(df)
+    if not colunas:
+        return
+    
+    texto = pd.read_csv(BytesIO(conteudo), engine='pyarrow', usecols=colunas, dtype='string', **opcoes)
+    for coluna in colunas:
+        df[coluna] = texto[coluna].astype(object).where(texto[coluna].notna(), np.nan)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Leitura de planilhas XLSX em blocos de linhas
+
+O ERP também exporta saída e propostas em .xlsx. As linhas da primeira aba
+são lidas sob demanda (python-calamine quando instalado; senão openpyxl em
+modo read-only), sem montar a planilha inteira como objetos de célula, e
+entregues em blocos de até LINHAS_POR_BLOCO linhas (DataFrames) para a mesma
+normalização aplicada aos CSVs.
+
+As células tipadas da planilha são convertidas para a forma que o pandas
+produz ao ler o CSV do ERP:
+- datas -> texto no formato do ERP ('26/12/2025 12:48:24' ou '26/12/2025')
+- números sem casas decimais -> int (Pedido, Nº Parcela); demais -> float
+- células vazias -> ''
+Colunas sem nome no cabeçalho e linhas totalmente vazias são descartadas.
+"""
+
+import logging
+from datetime import date, datetime, time, timedelta
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+EXTENSOES_PLANILHA = ('.xlsx',)
+
+# Linhas por DataFrame entregue à normalização
+LINHAS_POR_BLOCO = 5000
+
+
+def eh_planilha(filepath):
+    """True se o arquivo deve ser lido como planilha (pela extensão)"""
+    return filepath.lower().endswith(EXTENSOES_PLANILHA)
+
+
+def motor_planilha():
+    """Leitor de XLSX: 'calamine' quando instalado, senão 'openpyxl'"""
+    try:
+        import python_calamine  # noqa: F401
+        return 'calamine'
+    except ImportError:
+        return 'openpyxl'
+
+
+def _linhas_calamine(filepath):
+    from python_calamine import CalamineWorkbook
+    
+    workbook = CalamineWorkbook.from_path(filepath)
+    try:
+        yield from workbook.get_sheet_by_index(0).iter_rows()
+    finally:
+        workbook.close()
+
+
+def _linhas_openpyxl(filepath):
+    from openpyxl import load_workbook
+    
+    # read_only: lê o XML da aba em streaming; data_only: valor das fórmulas
+    workbook = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _linhas(filepath):
+    """Gerador com as linhas (tuplas de valores) da primeira aba"""
+    if motor_planilha() == 'calamine':
+        return _linhas_calamine(filepath)
+    return _linhas_openpyxl(filepath)
+
+
+def _valor(celula):
+    """Valor da célula na forma em que viria do CSV lido pelo pandas"""
+    if celula is None:
+        return ''
+    if isinstance(celula, float):
+        return int(celula) if celula.is_integer() else celula
+    if isinstance(celula, datetime):
+        if celula.time() == time(0, 0):
+            return celula.strftime('%d/%m/%Y')
+        return celula.strftime('%d/%m/%Y %H:%M:%S')
+    if isinstance(celula, date):
+        return celula.strftime('%d/%m/%Y')
+    if isinstance(celula, time):
+        return celula.strftime('%H:%M:%S')
+    if isinstance(celula, timedelta):
+        # Duração (calamine): o BSON não tem um tipo equivalente
+        return str(celula)
+    return celula
+
+
+def _vazia(linha):
+    return all(celula is None or (isinstance(celula, str) and not celula.strip()) for celula in linha)
+
+
+def ler_cabecalho_planilha(filepath):
+    """Nomes das colunas (primeira linha não vazia da primeira aba)"""
+    linhas = _linhas(filepath)
+    try:
+        for linha in linhas:
+            if not _vazia(linha):
+                return [str(c).strip() for c in linha if c is not None and str(c).strip()]
+        return []
+    finally:
+        linhas.close()
+
+
+def ler_planilha(filepath, linhas_por_bloco=LINHAS_POR_BLOCO):
+    """Lê a primeira aba em blocos de linhas
+    
+    Yields:
+        DataFrame: até 'linhas_por_bloco' linhas, com as colunas do cabeçalho
+    """
+    logger.debug(f"XLSX {filepath}: leitor={motor_planilha()} blocos de {linhas_por_bloco} linha(s)")
+    
+    linhas = _linhas(filepath)
+    try:
+        cabecalho = next((linha for linha in linhas if not _vazia(linha)), None)
+        if cabecalho is None:
+            return
+        
+        indices = [i for i, nome in enumerate(cabecalho) if nome is not None and str(nome).strip()]
+        colunas = [str(cabecalho[i]) for i in indices]
+        
+        bloco = []
+        for linha in linhas:
+            if _vazia(linha):
+                continue
+            
+            bloco.append([_valor(linha[i]) if i < len(linha) else '' for i in indices])
+            if len(bloco) >= linhas_por_bloco:
+                yield pd.DataFrame(bloco, columns=colunas)
+                bloco = []
+        
+        if bloco:
+            yield pd.DataFrame(bloco, columns=colunas)
+    finally:
+        linhas.close()
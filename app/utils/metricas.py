@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Métricas no formato Prometheus
+
+Histogramas dos caminhos críticos (parsing de upload, sincronização de
+cadastros, cálculo de relatórios, geração de PDF, consultas dos
+repositórios), latência por rota, estado do pool de conexões do MongoDB e
+contadores de acerto de cache, expostos em /metrics.
+
+Com o gunicorn, cada worker é um processo com seus próprios contadores.
+Quando PROMETHEUS_MULTIPROC_DIR está definida (ver gunicorn.conf.py), os
+valores são gravados em arquivos nesse diretório e o /metrics de qualquer
+worker agrega todos os processos.
+"""
+
+import os
+import time
+
+from flask import g, request
+
+# Fora do gunicorn (CLI, scripts) o diretório pode ainda não existir
+if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess
+)
+
+# Buckets em segundos: de requisições simples (ms) a fechamentos de mês (min)
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+BUCKETS_BYTES = (10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 5_000_000)
+
+TEMPO_UPLOAD_PARSE = Histogram(
+    'comissao_upload_parse_segundos',
+    'Tempo de leitura e conversão de um arquivo de upload',
+    ['tipo'],
+    buckets=BUCKETS_SEGUNDOS
+)
+
+TEMPO_SINCRONIZACAO = Histogram(
+    'comissao_sincronizacao_segundos',
+    'Tempo de sincronização de cadastros (vendedores, motos, formas) após upload',
+    ['origem'],
+    buckets=BUCKETS_SEGUNDOS
+)
+
+TEMPO_RELATORIO = Histogram(
+    'comissao_relatorio_segundos',
+    'Tempo de cálculo de relatórios de comissão',
+    ['relatorio'],
+    buckets=BUCKETS_SEGUNDOS
+)
+
+TEMPO_PDF = Histogram(
+    'comissao_pdf_render_segundos',
+    'Tempo de geração do PDF de comissões',
+    buckets=BUCKETS_SEGUNDOS
+)
+
+TAMANHO_PDF = Histogram(
+    'comissao_pdf_bytes',
+    'Tamanho do PDF de comissões gerado',
+    buckets=BUCKETS_BYTES
+)
+
+LATENCIA_HTTP = Histogram(
+    'comissao_http_requisicao_segundos',
+    'Latência das requisições HTTP por rota',
+    ['metodo', 'rota', 'status'],
+    buckets=BUCKETS_SEGUNDOS
+)
+
+TEMPO_CONSULTA_MONGO = Histogram(
+    'comissao_mongo_consulta_segundos',
+    'Tempo das consultas dos repositórios por collection e forma de consulta',
+    ['colecao', 'forma'],
+    buckets=BUCKETS_SEGUNDOS
+)
+
+# Pool de conexões do MongoDB (um pool por processo: somados entre workers)
+POOL_MONGO_CONEXOES = Gauge(
+    'comissao_mongo_pool_conexoes',
+    'Conexões abertas no pool do MongoDB',
+    ['servidor'],
+    multiprocess_mode='livesum'
+)
+
+POOL_MONGO_EM_USO = Gauge(
+    'comissao_mongo_pool_em_uso',
+    'Conexões do pool do MongoDB em uso por uma operação',
+    ['servidor'],
+    multiprocess_mode='livesum'
+)
+
+POOL_MONGO_AGUARDANDO = Gauge(
+    'comissao_mongo_pool_aguardando',
+    'Operações esperando uma conexão livre no pool do MongoDB',
+    ['servidor'],
+    multiprocess_mode='livesum'
+)
+
+POOL_MONGO_FALHAS = Counter(
+    'comissao_mongo_pool_falhas_total',
+    'Falhas ao obter conexão do pool do MongoDB (timeout, erro de conexão, pool fechado)',
+    ['servidor', 'motivo']
+)
+
+MONGO_DISPONIVEL = Gauge(
+    'comissao_mongo_disponivel',
+    'Resultado do último heartbeat do MongoDB (1 = respondeu, 0 = falhou)',
+    ['servidor'],
+    multiprocess_mode='min'
+)
+
+CONSULTAS_CACHE = Counter(
+    'comissao_cache_consultas_total',
+    'Consultas a caches da aplicação (taxa de acerto = acerto / total)',
+    ['cache', 'resultado']
+)
+
+
+def registrar_cache(cache, acerto):
+    """Contabiliza uma consulta a um cache (acerto ou falha)"""
+    CONSULTAS_CACHE.labels(cache=cache, resultado='acerto' if acerto else 'falha').inc()
+
+
+def init_app(app):
+    """Registra a medição de latência por rota"""
+    
+    @app.before_request
+    def _iniciar_cronometro():
+        g.inicio_metricas = time.perf_counter()
+    
+    @app.after_request
+    def _registrar_latencia(response):
+        inicio = g.pop('inicio_metricas', None)
+        if inicio is not None:
+            # Usa o padrão da rota (ex: /api/vendedores/<vendor_id>) para não
+            # criar uma série por id
+            rota = request.url_rule.rule if request.url_rule else 'sem_rota'
+            LATENCIA_HTTP.labels(
+                metodo=request.method, rota=rota, status=str(response.status_code)
+            ).observe(time.perf_counter() - inicio)
+        return response
+
+
+def gerar_metricas():
+    """Texto das métricas no formato de exposição do Prometheus
+    
+    Returns:
+        tuple: (conteúdo em bytes, content-type)
+    """
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    
+    return generate_latest(registry), CONTENT_TYPE_LATEST
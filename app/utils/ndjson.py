@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Respostas em streaming NDJSON para listagens grandes
+
+Com 'Accept: application/x-ndjson' ou '?stream=1', as rotas de relatório
+enviam uma linha JSON por item de 'dados' à medida que são gerados, em vez
+de montar a resposta inteira na memória do worker:
+
+    {"Pessoa": "...", "comissao": 12.5, ...}
+    {"Pessoa": "...", "comissao": 8.0, ...}
+    {"fim": true, "status": "sucesso", "itens": 2, "eh_interno": false}
+
+A última linha ('fim') traz os demais campos da resposta JSON (avisos,
+totais, período). Sem ela, a resposta foi interrompida. Um erro depois do
+início do envio não muda mais o status HTTP (200): vai na linha final com
+"status": "erro" e a "mensagem".
+
+Rotas que recebem listas grandes também aceitam o corpo em NDJSON
+(Content-Type application/x-ndjson), lido com ler_ndjson.
+"""
+
+import logging
+
+from flask import Response, current_app, jsonify, request, stream_with_context
+
+logger = logging.getLogger(__name__)
+
+MIMETYPE = 'application/x-ndjson'
+
+
+def streaming_solicitado():
+    """True se a requisição pediu NDJSON (?stream=1 ou Accept)"""
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        return True
+    return request.accept_mimetypes.best_match(['application/json', MIMETYPE]) == MIMETYPE
+
+
+def ler_ndjson(corpo):
+    """Itens de um corpo NDJSON (uma linha JSON por item; linhas vazias são ignoradas)
+    
+    Uma linha que não é JSON válido vira None no lugar do item, para que a
+    rota informe o erro naquele item sem descartar os demais.
+    """
+    provedor = current_app.json
+    itens = []
+    for linha in corpo.splitlines():
+        if not linha.strip():
+            continue
+        try:
+            itens.append(provedor.loads(linha))
+        except ValueError:
+            itens.append(None)
+    return itens
+
+
+def _metadados(metadados):
+    if callable(metadados):
+        return metadados()
+    return metadados or {}
+
+
+def resposta_ndjson(itens, metadados=None):
+    """Resposta em streaming: uma linha por item e a linha final 'fim'
+    
+    Args:
+        itens: iterável (de preferência um gerador) com os itens de 'dados'
+        metadados: dict ou função sem argumentos que o retorna, chamada depois
+            do último item (ex: avisos acumulados durante o cálculo)
+    """
+    provedor = current_app.json
+    
+    def gerar():
+        quantidade = 0
+        try:
+            for item in itens:
+                yield provedor.dumps_bytes(item) + b'\n'
+                quantidade += 1
+            fim = {'fim': True, 'status': 'sucesso', 'itens': quantidade, **_metadados(metadados)}
+        except Exception as e:
+            logger.error(f"Erro durante o streaming NDJSON: {str(e)}", exc_info=True)
+            fim = {'fim': True, 'status': 'erro', 'itens': quantidade, 'mensagem': str(e)}
+        yield provedor.dumps_bytes(fim) + b'\n'
+    
+    resposta = Response(stream_with_context(gerar()), mimetype=MIMETYPE)
+    # Proxies (nginx) repassam cada linha sem acumular a resposta
+    resposta.headers['X-Accel-Buffering'] = 'no'
+    return resposta
+
+
+def resposta_dados(itens, metadados=None):
+    """Resposta de sucesso com a lista 'dados', em JSON ou NDJSON conforme a requisição
+    
+    No modo JSON os itens são consumidos aqui, dentro do try da rota: erros
+    do cálculo continuam virando a resposta de erro da própria rota.
+    """
+    if streaming_solicitado():
+        return resposta_ndjson(itens, metadados)
+    
+    dados = list(itens)
+    return jsonify({'status': 'sucesso', 'dados': dados, **_metadados(metadados)})
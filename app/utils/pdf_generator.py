@@ -7,6 +7,8 @@ from datetime import datetime
 from io import BytesIO
 import logging
 
+from app.utils.metricas import TEMPO_PDF, TAMANHO_PDF
+
 logger = logging.getLogger(__name__)
 
 def gerar_pdf_comissoes(resumo_vendedor, nome_arquivo="comissoes.pdf"):
@@ -24,18 +26,18 @@ def gerar_pdf_comissoes(resumo_vendedor, nome_arquivo="comissoes.pdf"):
     
     try:
         logger.info(f"[PDF_GEN] Iniciando geração de PDF...")
-        logger.info(f"[PDF_GEN] Python: {sys.executable}")
-        logger.info(f"[PDF_GEN] sys.path: {sys.path[:3]}...")  # Log primeiras 3 linhas
+        logger.debug(f"[PDF_GEN] Python: {sys.executable}")
+        logger.debug(f"[PDF_GEN] sys.path: {sys.path[:3]}...")  # Log primeiras 3 linhas
         
         # Importa reportlab aqui para garantir que está disponível
-        logger.info("[PDF_GEN] Tentando importar reportlab...")
+        logger.debug("[PDF_GEN] Tentando importar reportlab...")
         from reportlab.lib.pagesizes import A4
         from reportlab.lib import colors
         from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
         from reportlab.lib.units import cm
         from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
         
-        logger.info("[PDF_GEN] ReportLab importado com sucesso")
+        logger.debug("[PDF_GEN] ReportLab importado com sucesso")
         
         # Cria buffer para PDF
         buffer = BytesIO()
@@ -148,10 +150,16 @@ def gerar_pdf_comissoes(resumo_vendedor, nome_arquivo="comissoes.pdf"):
         elements.append(table)
         
         # Constrói PDF
-        doc.build(elements)
+        with TEMPO_PDF.time():
+            doc.build(elements)
         buffer.seek(0)
+        tamanho = buffer.getbuffer().nbytes
+        TAMANHO_PDF.observe(tamanho)
         
-        logger.info("[PDF_GEN] PDF de comissões gerado com sucesso")
+        logger.info(
+            f"[PDF_GEN] PDF de comissões gerado com sucesso: {tamanho} bytes",
+            extra={'vendedores': len(resumo_vendedor), 'bytes': tamanho}
+        )
         return buffer
         
     except ImportError as e:
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Profiler opcional de requisições
+
+Middleware WSGI que perfila uma requisição quando:
+- o cabeçalho 'X-Perfil' está presente (valor 'cprofile' ou 'amostragem'), ou
+- a query string contém 'perfil=cprofile' / 'perfil=amostragem', ou
+- a requisição passou de PROFILER_LIMIAR_MS (modo amostragem em todas as
+  requisições; o perfil só é gravado para as lentas).
+
+O modo 'cprofile' grava um .pstats (cProfile) e um .collapsed; o modo
+'amostragem' grava apenas o .collapsed, coletado por uma thread que lê a
+pilha da thread da requisição a cada PROFILER_INTERVALO_MS. O .collapsed
+está no formato de pilhas colapsadas ('a;b;c 12') aceito por flamegraph.pl
+e speedscope.
+
+Com workers gevent a requisição é um greenlet na thread do worker, que
+alterna entre as requisições em andamento. A thread de amostragem é nativa
+(um greenlet só rodaria quando a requisição cedesse o loop) e lê a pilha do
+greenlet da requisição; o cProfile fica ligado só enquanto esse greenlet
+roda (greenlet.settrace), sem contar o tempo das outras requisições.
+
+Os arquivos ficam em PROFILER_PASTA (padrão logs/perfis), limitada a
+PROFILER_MAX_ARQUIVOS perfis; os mais antigos são apagados.
+Nada é perfilado se PROFILER_HABILITADO for falso.
+"""
+
+import cProfile
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from importlib import import_module
+from urllib.parse import parse_qs
+
+from app.utils.executor import gevent_ativo
+
+try:
+    import greenlet
+    from gevent import monkey
+except ImportError:  # gevent só é necessário no modo de workers gevent
+    greenlet = None
+    monkey = None
+
+logger = logging.getLogger(__name__)
+
+MODOS = ('cprofile', 'amostragem')
+
+EXTENSOES = ('.pstats', '.collapsed')
+
+
+def _original(modulo, nome):
+    """Função do módulo sem o monkey patching do gevent (thread nativa)"""
+    if gevent_ativo():
+        return monkey.get_original(modulo, nome)
+    return getattr(import_module(modulo), nome)
+
+
+class AmostradorPilha:
+    """Amostra periodicamente a pilha da requisição atual (sys._current_frames)
+    
+    Com gevent, amostra o greenlet da requisição: a pilha suspensa (gr_frame)
+    enquanto ele espera I/O ou a pilha da thread enquanto é ele que roda.
+    """
+    
+    def __init__(self, intervalo_s):
+        self.thread_id = _original('_thread', 'get_ident')()
+        self.greenlet = greenlet.getcurrent() if gevent_ativo() else None
+        self.intervalo_s = intervalo_s
+        self.pilhas = Counter()
+        self._parar = False
+        self._terminou = _original('_thread', 'allocate_lock')()
+    
+    def iniciar(self):
+        self._terminou.acquire()
+        _original('_thread', 'start_new_thread')(self._executar, ())
+    
+    def parar(self):
+        self._parar = True
+        self._terminou.acquire()
+        self._terminou.release()
+    
+    def _executar(self):
+        dormir = _original('time', 'sleep')
+        try:
+            while True:
+                dormir(self.intervalo_s)
+                if self._parar:
+                    break
+                self._amostrar()
+        finally:
+            self._terminou.release()
+    
+    def _amostrar(self):
+        frame = self.greenlet.gr_frame if self.greenlet is not None else None
+        if frame is None:
+            frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        
+        pilha = []
+        while frame is not None:
+            codigo = frame.f_code
+            pilha.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})")
+            frame = frame.f_back
+        
+        self.pilhas[';'.join(reversed(pilha))] += 1
+    
+    def colapsado(self):
+        """Texto no formato de pilhas colapsadas"""
+        return ''.join(f"{pilha} {total}\n" for pilha, total in self.pilhas.most_common())
+
+
+# cProfile de cada greenlet perfilado (gevent): ligado só enquanto o greenlet roda
+_perfis_greenlet = {}
+_rastreio_anterior = None
+
+
+def _trocar_greenlet(evento, argumentos):
+    """greenlet.settrace: liga o perfil do greenlet que entra e desliga o do que sai"""
+    if evento in ('switch', 'throw'):
+        origem, destino = argumentos
+        perfil = _perfis_greenlet.get(origem)
+        if perfil is not None:
+            perfil.disable()
+        perfil = _perfis_greenlet.get(destino)
+        if perfil is not None:
+            perfil.enable()
+    
+    if _rastreio_anterior is not None:
+        _rastreio_anterior(evento, argumentos)
+
+
+def _ligar_perfil(perfil):
+    global _rastreio_anterior
+    
+    if gevent_ativo():
+        if not _perfis_greenlet:
+            _rastreio_anterior = greenlet.settrace(_trocar_greenlet)
+        _perfis_greenlet[greenlet.getcurrent()] = perfil
+    perfil.enable()
+
+
+def _desligar_perfil(perfil):
+    global _rastreio_anterior
+    
+    perfil.disable()
+    if gevent_ativo():
+        _perfis_greenlet.pop(greenlet.getcurrent(), None)
+        if not _perfis_greenlet:
+            greenlet.settrace(_rastreio_anterior)
+            _rastreio_anterior = None
+
+
+class MiddlewareProfiler:
+    """Envolve app.wsgi_app e grava o perfil das requisições selecionadas"""
+    
+    def __init__(self, wsgi_app, config):
+        self.wsgi_app = wsgi_app
+        self.config = config
+    
+    @property
+    def pasta(self):
+        return self.config['PROFILER_PASTA']
+    
+    def _modo_solicitado(self, environ):
+        """Modo pedido pelo cliente (cabeçalho ou query string), ou None"""
+        valor = environ.get('HTTP_X_PERFIL')
+        if valor is None:
+            valores = parse_qs(environ.get('QUERY_STRING', '')).get('perfil')
+            valor = valores[0] if valores else None
+        
+        if valor is None:
+            return None
+        valor = valor.strip().lower()
+        return valor if valor in MODOS else 'cprofile'
+    
+    def __call__(self, environ, start_response):
+        if not self.config.get('PROFILER_HABILITADO'):
+            return self.wsgi_app(environ, start_response)
+        
+        modo = self._modo_solicitado(environ)
+        limiar_ms = self.config.get('PROFILER_LIMIAR_MS') or 0
+        
+        if modo is None and limiar_ms <= 0:
+            return self.wsgi_app(environ, start_response)
+        
+        amostrador = AmostradorPilha(self.config['PROFILER_INTERVALO_MS'] / 1000.0)
+        perfil = cProfile.Profile() if modo == 'cprofile' else None
+        status = []
+        
+        def _start_response(status_http, headers, exc_info=None):
+            status.append(status_http.split(' ', 1)[0])
+            return start_response(status_http, headers, exc_info)
+        
+        inicio = time.perf_counter()
+        amostrador.iniciar()
+        if perfil:
+            _ligar_perfil(perfil)
+        try:
+            return self.wsgi_app(environ, _start_response)
+        finally:
+            if perfil:
+                _desligar_perfil(perfil)
+            amostrador.parar()
+            duracao_ms = (time.perf_counter() - inicio) * 1000
+            
+            if modo or duracao_ms >= limiar_ms:
+                try:
+                    self._gravar(environ, status[0] if status else '000', duracao_ms, perfil, amostrador)
+                except Exception as e:
+                    logger.error(f"[PERFIL] Erro ao gravar perfil: {str(e)}", exc_info=True)
+    
+    def _gravar(self, environ, status, duracao_ms, perfil, amostrador):
+        os.makedirs(self.pasta, exist_ok=True)
+        
+        rota = re.sub(r'[^A-Za-z0-9]+', '_', environ.get('PATH_INFO', '')).strip('_') or 'raiz'
+        base = (
+            f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{environ.get('REQUEST_METHOD', 'GET')}"
+            f"_{rota[:60]}_{status}_{int(duracao_ms)}ms"
+        )
+        
+        if perfil:
+            perfil.dump_stats(os.path.join(self.pasta, base + '.pstats'))
+        with open(os.path.join(self.pasta, base + '.collapsed'), 'w', encoding='utf-8') as f:
+            f.write(amostrador.colapsado())
+        
+        logger.info(f"[PERFIL] {environ.get('REQUEST_METHOD')} {environ.get('PATH_INFO')} ({duracao_ms:.0f} ms) gravado em {base}")
+        self._limitar_pasta()
+    
+    def _limitar_pasta(self):
+        """Apaga os perfis mais antigos além de PROFILER_MAX_ARQUIVOS"""
+        perfis = listar_perfis(self.pasta)
+        excedentes = {p['base'] for p in perfis[self.config['PROFILER_MAX_ARQUIVOS']:]}
+        
+        for nome in os.listdir(self.pasta):
+            if os.path.splitext(nome)[0] in excedentes:
+                try:
+                    os.remove(os.path.join(self.pasta, nome))
+                except OSError:
+                    pass
+
+
+def listar_perfis(pasta):
+    """Perfis gravados, do mais recente para o mais antigo
+    
+    Returns:
+        list: [{'base', 'arquivos', 'tamanho_bytes', 'criado_em'}]
+    """
+    if not os.path.isdir(pasta):
+        return []
+    
+    perfis = {}
+    for nome in os.listdir(pasta):
+        base, extensao = os.path.splitext(nome)
+        if extensao not in EXTENSOES:
+            continue
+        
+        caminho = os.path.join(pasta, nome)
+        perfil = perfis.setdefault(base, {'base': base, 'arquivos': [], 'tamanho_bytes': 0, 'criado_em': 0})
+        perfil['arquivos'].append(nome)
+        perfil['tamanho_bytes'] += os.path.getsize(caminho)
+        perfil['criado_em'] = max(perfil['criado_em'], os.path.getmtime(caminho))
+    
+    resultado = sorted(perfis.values(), key=lambda p: (p['criado_em'], p['base']), reverse=True)
+    for perfil in resultado:
+        perfil['arquivos'].sort()
+        perfil['criado_em'] = datetime.fromtimestamp(perfil['criado_em']).isoformat()
+    return resultado
+
+
+def init_app(app):
+    """Instala o middleware de profiling na aplicação"""
+    app.wsgi_app = MiddlewareProfiler(app.wsgi_app, app.config)
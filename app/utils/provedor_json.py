@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Serialização JSON das respostas com orjson
+
+Substitui o provider padrão do Flask (app.json). Tipos que vêm do MongoDB e
+do pandas são convertidos direto na serialização, sem laços nas rotas e
+serviços:
+- ObjectId -> string
+- datetime/date -> ISO 8601 (ex: 2025-10-01T14:30:00)
+- Decimal128/Decimal -> string (sem perder precisão)
+- escalares e arrays do NumPy -> número/lista; NaN -> null
+
+JSON_SORT_KEYS e JSONIFY_PRETTYPRINT_REGULAR (app/config.py) controlam a
+ordenação das chaves e a indentação.
+"""
+
+import decimal
+from datetime import date
+
+import orjson
+from bson import Decimal128, ObjectId
+from flask.json.provider import JSONProvider
+
+
+def _converter(obj):
+    """Tipos que o orjson não serializa nativamente"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return str(obj.to_decimal())
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, date):
+        # Subclasses (ex: pandas.Timestamp)
+        return obj.isoformat()
+    if hasattr(obj, 'tolist'):
+        # Escalares/arrays do NumPy fora dos tipos nativos (float16, object)
+        return obj.tolist()
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Objeto do tipo {type(obj).__name__} não é serializável em JSON")
+
+
+class ProvedorJSON(JSONProvider):
+    """JSONProvider do Flask sobre orjson"""
+    
+    mimetype = 'application/json'
+    
+    def _opcoes(self, sort_keys=None, indent=None):
+        opcoes = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if sort_keys is None:
+            sort_keys = self._app.config.get('JSON_SORT_KEYS')
+        if sort_keys:
+            opcoes |= orjson.OPT_SORT_KEYS
+        if indent:
+            opcoes |= orjson.OPT_INDENT_2
+        return opcoes
+    
+    def dumps_bytes(self, obj, sort_keys=None, indent=None):
+        """JSON em bytes UTF-8 (sem decodificar para str)"""
+        return orjson.dumps(obj, default=_converter, option=self._opcoes(sort_keys, indent))
+    
+    def dumps(self, obj, **kwargs):
+        return self.dumps_bytes(obj, kwargs.get('sort_keys'), kwargs.get('indent')).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self._app.config.get('JSONIFY_PRETTYPRINT_REGULAR')
+        return self._app.response_class(self.dumps_bytes(obj, indent=indent) + b'\n', mimetype=self.mimetype)
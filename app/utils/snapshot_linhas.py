@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshots colunares (Arrow IPC) das linhas de saida/propostas
+
+Cada gravação de um período (upload, delta, limpeza) gera um novo lote
+('lotes_linhas', ver LinhasRepository.renovar_lotes). O primeiro relatório
+que lê o período grava as linhas do lote em
+
+    SNAPSHOT_LINHAS_PASTA/<colecao>/<periodo>/<lote>.arrow
+
+com colunas tipadas, e os seguintes leem só as colunas usadas direto do
+arquivo, sem buscar e decodificar os documentos no MongoDB. Um arquivo
+ausente (pasta limpa, outro servidor, deploy novo) é refeito na leitura;
+arquivos de lotes anteriores são apagados quando o novo é gravado.
+
+O arquivo é Arrow IPC sem compressão, mapeado em memória (mmap, somente
+leitura): a tabela Arrow aponta direto para as páginas do arquivo, que ficam
+no page cache do sistema uma única vez para todos os workers do gunicorn.
+A conversão para DataFrame (to_pandas) copia as colunas pedidas para a
+memória do worker a cada leitura; o ganho está em não consultar o MongoDB
+nem decodificar BSON, e em copiar só as colunas usadas.
+Cada worker mantém o mapeamento do lote vigente de cada período;
+o lote é a versão: quando o registro aponta outro lote (novo upload), o
+worker mapeia o arquivo novo e solta o anterior.
+
+Tipos das colunas (valores vazios '' viram nulos no arquivo):
+- só inteiros -> Int64; inteiros e decimais -> Float64; só bool -> boolean
+- só texto -> dicionário (cada texto distinto guardado uma vez); só datas -> datetime64
+- tipos misturados -> texto (str() de cada valor)
+Na leitura (valores) os nulos voltam a ser '', como nos documentos.
+
+Requer pyarrow; sem ele (ou com SNAPSHOT_LINHAS_HABILITADO desligado) os
+relatórios leem do MongoDB.
+"""
+
+import logging
+import os
+from datetime import datetime
+
+import pandas as pd
+from flask import current_app
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # Opcional: sem ele os relatórios leem do MongoDB
+    pa = feather = None
+
+from app.utils.metricas import registrar_cache
+
+logger = logging.getLogger(__name__)
+
+EXTENSAO = '.arrow'
+
+# (colecao, periodo) -> (lote, tabela mapeada) do lote vigente, por processo
+_mapeados = {}
+
+
+def habilitado():
+    """True se os relatórios devem ler dos snapshots"""
+    return pa is not None and current_app.config.get('SNAPSHOT_LINHAS_HABILITADO', False)
+
+
+def _pasta(colecao, periodo):
+    return os.path.join(current_app.config['SNAPSHOT_LINHAS_PASTA'], colecao, periodo)
+
+
+def _caminho(colecao, periodo, lote):
+    return os.path.join(_pasta(colecao, periodo), lote + EXTENSAO)
+
+
+def _vazio(valor):
+    return valor is None or valor == '' or (isinstance(valor, float) and valor != valor)
+
+
+def _tipar(serie):
+    """Coluna com o dtype dos seus valores (vazios -> nulo)"""
+    tipos = {type(v) for v in serie if not _vazio(v)}
+    serie = serie.map(lambda v: None if _vazio(v) else v)
+    
+    if tipos and tipos <= {bool}:
+        return serie.astype('boolean')
+    if tipos and tipos <= {int}:
+        return serie.astype('Int64')
+    if tipos and tipos <= {int, float}:
+        return serie.astype('Float64')
+    if tipos and tipos <= {datetime}:
+        return pd.to_datetime(serie)
+    if tipos - {str}:
+        serie = serie.map(lambda v: None if v is None else str(v))
+    # Categoria -> dicionário no Arrow: nomes, modelos e formas se repetem muito
+    return serie.astype('category')
+
+
+def tabela(documentos):
+    """DataFrame tipado com as linhas (documentos sem _id)"""
+    df = pd.DataFrame(documentos, dtype=object)
+    return df.apply(_tipar) if len(df.columns) else df
+
+
+def gravar(colecao, periodo, lote, documentos):
+    """Grava o snapshot do lote e apaga os de lotes anteriores do período
+    
+    Returns:
+        DataFrame: Linhas gravadas (tipadas)
+    """
+    df = tabela(documentos)
+    pasta = _pasta(colecao, periodo)
+    caminho = _caminho(colecao, periodo, lote)
+    
+    os.makedirs(pasta, exist_ok=True)
+    
+    # Grava em arquivo temporário e renomeia: outro worker nunca lê um arquivo pela metade.
+    # Sem compressão: o mmap só lê sem cópia buffers gravados como estão na memória
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    feather.write_feather(df, temporario, compression='uncompressed')
+    os.replace(temporario, caminho)
+    
+    for nome in os.listdir(pasta):
+        if nome != lote + EXTENSAO and nome.endswith(EXTENSAO):
+            try:
+                os.remove(os.path.join(pasta, nome))
+            except OSError:
+                pass
+    
+    logger.debug(f"Snapshot gravado: {colecao}/{periodo} lote {lote} ({len(df)} linha(s))")
+    return df
+
+
+def _mapear(colecao, periodo, lote):
+    """Tabela Arrow do lote mapeada em memória (reaproveita o mapeamento do worker)"""
+    atual = _mapeados.get((colecao, periodo))
+    if atual is not None and atual[0] == lote:
+        return atual[1]
+    
+    with pa.memory_map(_caminho(colecao, periodo, lote), 'r') as arquivo:
+        tabela = pa.ipc.open_file(arquivo).read_all()
+    
+    # Substitui o lote anterior: o mapeamento antigo é solto com a última referência
+    _mapeados[(colecao, periodo)] = (lote, tabela)
+    return tabela
+
+
+def ler(colecao, periodo, lote, colunas=None):
+    """Colunas do snapshot do lote (None se o arquivo não existir ou estiver ilegível)
+    
+    Colunas pedidas que não existem no arquivo vêm vazias. O DataFrame é uma
+    cópia das colunas na memória do worker (to_pandas), não uma visão do mmap.
+    """
+    try:
+        tabela = _mapear(colecao, periodo, lote)
+    except FileNotFoundError:
+        registrar_cache('snapshot_linhas', False)
+        return None
+    except Exception as e:
+        logger.warning(f"Snapshot {_caminho(colecao, periodo, lote)} ilegível, será refeito: {str(e)}")
+        registrar_cache('snapshot_linhas', False)
+        return None
+    
+    registrar_cache('snapshot_linhas', True)
+    
+    if colunas is None:
+        return tabela.to_pandas()
+    
+    df = tabela.select([c for c in colunas if c in tabela.column_names]).to_pandas()
+    return df.reindex(columns=colunas)
+
+
+def descartar(colecao, periodos):
+    """Apaga os snapshots locais dos períodos (qualquer lote)"""
+    for periodo in periodos:
+        _mapeados.pop((colecao, periodo), None)
+        
+        pasta = _pasta(colecao, periodo)
+        if not os.path.isdir(pasta):
+            continue
+        for nome in os.listdir(pasta):
+            try:
+                os.remove(os.path.join(pasta, nome))
+            except OSError:
+                pass
+
+
+def valores(df, *colunas):
+    """Listas com os valores das colunas (nulos e colunas ausentes -> '')
+    
+    Para iterar as linhas com zip(*valores(df, 'Pessoa', 'Vendedor')).
+    """
+    listas = []
+    for coluna in colunas:
+        if coluna not in df.columns:
+            listas.append([''] * len(df))
+            continue
+        
+        serie = df[coluna]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            # Um objeto str por texto distinto; código -1 (nulo) cai no '' do fim
+            categorias = serie.cat.categories.tolist() + ['']
+            listas.append([categorias[codigo] for codigo in serie.cat.codes.tolist()])
+            continue
+        
+        serie = serie.astype(object)
+        listas.append(serie.where(serie.notna(), '').tolist())
+    return listas
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark dos cálculos por linha dos relatórios
+
+Mede o custo por chamada de ValorPresenteService.calcular_valor_com_juro_simples
+e RelatorioService._converter_valor, executados para cada proposta em
+resumo_comissoes / resumo_por_cidade / vendedor_vendas.
+
+Para comparação, o script inclui as implementações anteriores (import e
+try/except dentro da função, str() em todo valor) e mede as duas versões
+sobre os mesmos dados, conferindo antes que os resultados são idênticos.
+
+Uso:
+    python benchmarks/bench_calculos.py
+    python benchmarks/bench_calculos.py --repeticoes 200000
+"""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from app.services import ValorPresenteService, RelatorioService  # noqa: E402
+
+
+# =====================================================
+# Implementações anteriores (referência)
+# =====================================================
+
+def juro_simples_anterior(valor_total, numero_parcelas, taxa_juros):
+    try:
+        if not valor_total or numero_parcelas <= 0 or taxa_juros < 0:
+            return valor_total
+        if numero_parcelas == 1:
+            return valor_total
+        pmt = valor_total / numero_parcelas
+        taxa_mais_1 = 1 + taxa_juros
+        potencia_n = taxa_mais_1 ** numero_parcelas
+        numerador = potencia_n - 1
+        denominador = taxa_juros * potencia_n
+        if denominador == 0:
+            return valor_total
+        pv = pmt * (numerador / denominador)
+        return round(pv, 2)
+    except Exception as e:
+        import logging
+        logging.error(f"Erro ao calcular valor com juro simples: {str(e)}", exc_info=True)
+        return valor_total
+
+
+def converter_valor_anterior(valor):
+    if not valor:
+        return 0
+    try:
+        valor_str = str(valor).strip()
+        if ',' in valor_str:
+            valor_str = valor_str.replace('.', '').replace(',', '.')
+        return float(valor_str)
+    except:  # noqa: E722
+        return 0
+
+
+# =====================================================
+# Dados de entrada (mistura típica dos CSVs do ERP)
+# =====================================================
+
+ENTRADAS_JURO = [(8000.0, 10, 0.0159), (15990.0, 24, 0.0199), (4000.0, 2, 0.015), (12500.0, 1, 0.02)]
+
+# 'Valor Total' das propostas vem como texto brasileiro; 'Valor Tabela' da
+# saída e valores já gravados chegam como número
+ENTRADAS_VALOR = ['-4.000,00', '15.990,00', '800,50', 12990.0, 8500, '0', None]
+
+
+def _cronometrar(funcao, entradas, repeticoes):
+    def executar():
+        for args in entradas:
+            funcao(*args)
+
+    return timeit.timeit(executar, number=repeticoes)
+
+
+def medir(anterior, atual, entradas, repeticoes, rodadas=7):
+    """Tempo por chamada (ns) das duas versões, melhor de N rodadas alternadas
+
+    Alternar as rodadas evita que aquecimento ou variação de frequência da CPU
+    favoreçam a versão medida por último.
+    """
+    tempos_anterior, tempos_atual = [], []
+    for _ in range(rodadas):
+        tempos_anterior.append(_cronometrar(anterior, entradas, repeticoes))
+        tempos_atual.append(_cronometrar(atual, entradas, repeticoes))
+
+    chamadas = repeticoes * len(entradas)
+    return min(tempos_anterior) / chamadas * 1e9, min(tempos_atual) / chamadas * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark dos cálculos por linha')
+    parser.add_argument('--repeticoes', type=int, default=50000, help='Execuções de cada lote de entradas')
+    args = parser.parse_args()
+
+    # Mesmo resultado nas duas versões
+    for entrada in ENTRADAS_JURO:
+        assert juro_simples_anterior(*entrada) == ValorPresenteService.calcular_valor_com_juro_simples(*entrada)
+    for valor in ENTRADAS_VALOR:
+        assert converter_valor_anterior(valor) == RelatorioService._converter_valor(valor)
+
+    casos = [
+        ('calcular_valor_com_juro_simples', juro_simples_anterior,
+         ValorPresenteService.calcular_valor_com_juro_simples, ENTRADAS_JURO),
+        ('_converter_valor', converter_valor_anterior,
+         RelatorioService._converter_valor, [(v,) for v in ENTRADAS_VALOR]),
+    ]
+
+    print(f"{'função':<34} {'anterior (ns)':>14} {'atual (ns)':>12} {'ganho':>8}")
+    for nome, anterior, atual, entradas in casos:
+        ns_anterior, ns_atual = medir(anterior, atual, entradas, args.repeticoes)
+        print(f"{nome:<34} {ns_anterior:>14.1f} {ns_atual:>12.1f} {ns_anterior / ns_atual:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
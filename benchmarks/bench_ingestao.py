@@ -0,0 +1,384 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark de ingestão e relatórios
+
+Gera datasets escalados (10x, 100x, 1000x...) a partir dos CSVs de amostra
+da raiz do projeto e mede as etapas críticas do fechamento do mês:
+    
+    processar_saida, processar_proposta, gravacao (períodos),
+    sincronizacao (vendedores/motos/formas), resumo_comissoes, gerar_pdf_comissoes
+
+Para cada etapa registra tempo, throughput (linhas/s), pico de RSS e número de
+round-trips ao MongoDB. O resultado é gravado em JSON e comparado com um
+baseline para sinalizar regressões.
+
+Uso:
+    python benchmarks/bench_ingestao.py                          # mongomock, escalas 10 e 100
+    python benchmarks/bench_ingestao.py --escalas 10,100,1000
+    python benchmarks/bench_ingestao.py --uri mongodb://localhost:27017/comissao_bench
+    python benchmarks/bench_ingestao.py --salvar-baseline        # grava o baseline
+    python benchmarks/bench_ingestao.py --tolerancia 0.25        # regressão se > 25% mais lento
+
+ATENÇÃO: com --uri o banco informado é APAGADO a cada escala. Use um banco
+dedicado ao benchmark, nunca o de produção.
+"""
+
+import argparse
+import csv
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+AMOSTRA_SAIDA = next(RAIZ.glob('Sa*da de Ve*culo*.csv'))
+AMOSTRA_PROPOSTA = next(RAIZ.glob('Pedido de Venda*.csv'))
+
+BASELINE_PADRAO = RAIZ / 'benchmarks' / 'baseline.json'
+
+# Offset somado ao número do pedido em cada cópia do dataset
+OFFSET_PEDIDO = 1000000
+
+
+# =====================================================
+# Medição de memória e round-trips
+# =====================================================
+
+class MonitorRSS:
+    """Amostra o RSS do processo em uma thread para obter o pico de cada etapa"""
+    
+    def __init__(self, intervalo=0.01):
+        self.intervalo = intervalo
+        self.pico = 0
+        self._parar = threading.Event()
+        self._thread = None
+    
+    @staticmethod
+    def rss_atual():
+        """RSS atual em bytes (/proc no Linux, ru_maxrss como fallback)"""
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError):
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return maxrss if sys.platform == 'darwin' else maxrss * 1024
+    
+    def _amostrar(self):
+        while not self._parar.is_set():
+            self.pico = max(self.pico, self.rss_atual())
+            time.sleep(self.intervalo)
+    
+    def __enter__(self):
+        self.pico = self.rss_atual()
+        self._thread = threading.Thread(target=self._amostrar, daemon=True)
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *args):
+        self._parar.set()
+        self._thread.join()
+        self.pico = max(self.pico, self.rss_atual())
+
+
+class ContadorRoundTrips:
+    """Conta comandos enviados ao MongoDB
+    
+    Com pymongo real usa um CommandListener; com mongomock (que não tem
+    protocolo de rede) conta as chamadas aos métodos de Collection.
+    """
+    
+    METODOS_MONGOMOCK = (
+        'find', 'find_one', 'insert_one', 'insert_many', 'update_one', 'update_many',
+        'replace_one', 'delete_one', 'delete_many', 'bulk_write', 'aggregate',
+        'count_documents', 'create_index', 'distinct'
+    )
+    
+    def __init__(self):
+        self.total = 0
+    
+    def listener(self):
+        """CommandListener do pymongo (para MongoClient(event_listeners=[...]))"""
+        from pymongo import monitoring
+        
+        contador = self
+        
+        class _Listener(monitoring.CommandListener):
+            def started(self, event):
+                contador.total += 1
+            
+            def succeeded(self, event):
+                pass
+            
+            def failed(self, event):
+                pass
+        
+        return _Listener()
+    
+    def instrumentar_mongomock(self):
+        """Envolve os métodos de mongomock.Collection para contar chamadas"""
+        import mongomock
+        
+        contador = self
+        
+        for nome in self.METODOS_MONGOMOCK:
+            original = getattr(mongomock.collection.Collection, nome, None)
+            if original is None:
+                continue
+            
+            def _envolver(func):
+                def _contado(*args, **kwargs):
+                    contador.total += 1
+                    return func(*args, **kwargs)
+                return _contado
+            
+            setattr(mongomock.collection.Collection, nome, _envolver(original))
+
+
+# =====================================================
+# Geração de datasets
+# =====================================================
+
+def _ler_amostra(caminho):
+    with open(caminho, encoding='utf-8-sig', newline='') as f:
+        leitor = csv.reader(f, delimiter=';')
+        cabecalho = next(leitor)
+        return cabecalho, list(leitor)
+
+
+def gerar_dataset(escala, pasta):
+    """Gera saida/propostas com `escala` cópias das amostras
+    
+    Cada cópia recebe pedidos, documentos fiscais e clientes próprios, mantendo
+    os mesmos vendedores, modelos e formas de recebimento (mais vendas por
+    vendedor, como num mês mais movimentado).
+    
+    Returns:
+        tuple: (caminho_saida, caminho_proposta, linhas_saida, linhas_proposta)
+    """
+    cab_saida, linhas_saida = _ler_amostra(AMOSTRA_SAIDA)
+    cab_prop, linhas_prop = _ler_amostra(AMOSTRA_PROPOSTA)
+    
+    i_pedido_s, i_doc_s, i_pessoa_s = (cab_saida.index(c) for c in ('Pedido', 'Doc Fiscal', 'Pessoa'))
+    i_pedido_p, i_doc_p, i_pessoa_p = (cab_prop.index(c) for c in ('Nº Pedido', 'Doc Fiscal', 'Pessoa'))
+    
+    def _escrever(caminho, cabecalho, linhas, i_pedido, i_doc, i_pessoa):
+        with open(caminho, 'w', encoding='utf-8-sig', newline='') as f:
+            escritor = csv.writer(f, delimiter=';', quoting=csv.QUOTE_ALL)
+            escritor.writerow(cabecalho)
+            for copia in range(escala):
+                for linha in linhas:
+                    nova = list(linha)
+                    if copia:
+                        nova[i_pedido] = str(int(nova[i_pedido]) + copia * OFFSET_PEDIDO)
+                        nova[i_doc] = f"{nova[i_doc]}-{copia}"
+                        nova[i_pessoa] = f"{nova[i_pessoa]} #{copia}"
+                    escritor.writerow(nova)
+    
+    caminho_saida = os.path.join(pasta, f'saida_{escala}x.csv')
+    caminho_prop = os.path.join(pasta, f'proposta_{escala}x.csv')
+    _escrever(caminho_saida, cab_saida, linhas_saida, i_pedido_s, i_doc_s, i_pessoa_s)
+    _escrever(caminho_prop, cab_prop, linhas_prop, i_pedido_p, i_doc_p, i_pessoa_p)
+    
+    return caminho_saida, caminho_prop, len(linhas_saida) * escala, len(linhas_prop) * escala
+
+
+# =====================================================
+# Execução
+# =====================================================
+
+def criar_app(uri, contador):
+    """Cria a aplicação apontando para mongomock ou para o MongoDB informado"""
+    from app import create_app, mongo
+    
+    app = create_app('testing')
+    
+    if uri:
+        from pymongo import MongoClient
+        cliente = MongoClient(uri, event_listeners=[contador.listener()], serverSelectionTimeoutMS=5000)
+        mongo.cx = cliente
+        mongo.db = cliente.get_default_database('comissao_bench')
+    else:
+        import mongomock
+        contador.instrumentar_mongomock()
+        cliente = mongomock.MongoClient()
+        mongo.cx = cliente
+        mongo.db = cliente['comissao_bench']
+    
+    return app, mongo
+
+
+def medir(nome, linhas, contador, func):
+    """Executa uma etapa medindo tempo, pico de RSS e round-trips"""
+    antes = contador.total
+    with MonitorRSS() as monitor:
+        inicio = time.perf_counter()
+        retorno = func()
+        tempo = time.perf_counter() - inicio
+    
+    resultado = {
+        'tempo_s': round(tempo, 4),
+        'linhas': linhas,
+        'linhas_por_s': round(linhas / tempo, 1) if tempo > 0 else None,
+        'pico_rss_mb': round(monitor.pico / (1024 * 1024), 1),
+        'round_trips': contador.total - antes
+    }
+    print(f"    {nome:<22} {tempo:>9.3f}s  {resultado['linhas_por_s'] or 0:>12,.0f} linhas/s  "
+          f"{resultado['pico_rss_mb']:>8.1f} MB  {resultado['round_trips']:>8} round-trips")
+    return retorno, resultado
+
+
+def executar_escala(escala, mongo, contador, pasta):
+    """Roda todas as etapas para uma escala e retorna as medições"""
+    from app.services import CSVProcessadorService, PeriodoService, UploadIncrementalService, RelatorioService
+    from app.utils.pdf_generator import gerar_pdf_comissoes
+    
+    caminho_saida, caminho_prop, n_saida, n_prop = gerar_dataset(escala, pasta)
+    
+    for colecao in mongo.db.list_collection_names():
+        mongo.db.drop_collection(colecao)
+    
+    print(f"\n  Escala {escala}x: {n_saida:,} linhas de saída, {n_prop:,} linhas de propostas")
+    etapas = {}
+    
+    saida, etapas['processar_saida'] = medir(
+        'processar_saida', n_saida, contador,
+        lambda: CSVProcessadorService.processar_saida(caminho_saida)['dados'])
+    
+    propostas, etapas['processar_proposta'] = medir(
+        'processar_proposta', n_prop, contador,
+        lambda: CSVProcessadorService.processar_proposta(caminho_prop)['dados'])
+    
+    def _gravar():
+        PeriodoService.garantir_indices()
+        for colecao, dados, atribuir in (('saida', saida, PeriodoService.atribuir_periodos_saida),
+                                         ('propostas', propostas, PeriodoService.atribuir_periodos_proposta)):
+            periodos = atribuir(dados)
+            UploadIncrementalService.preparar_linhas(dados)
+            PeriodoService.substituir_periodos(colecao, dados, periodos)
+    
+    _, etapas['gravacao'] = medir('gravacao', n_saida + n_prop, contador, _gravar)
+    
+    # Sincronização com cadastros já existentes (caso comum no re-upload)
+    def _sincronizar():
+        CSVProcessadorService.sincronizar_cadastros_saida(saida)
+        CSVProcessadorService.sincronizar_formas_proposta(propostas)
+    
+    _, etapas['sincronizacao'] = medir('sincronizacao', n_saida + n_prop, contador, _sincronizar)
+    
+    resumo, etapas['resumo_comissoes'] = medir(
+        'resumo_comissoes', n_prop, contador, RelatorioService.resumo_comissoes)
+    
+    pdf, etapas['gerar_pdf_comissoes'] = medir(
+        'gerar_pdf_comissoes', len(resumo), contador, lambda: gerar_pdf_comissoes(resumo))
+    etapas['gerar_pdf_comissoes']['bytes'] = len(pdf.getvalue())
+    
+    return {'linhas_saida': n_saida, 'linhas_proposta': n_prop, 'etapas': etapas}
+
+
+def comparar(resultado, baseline, tolerancia, minimo_s=0.05):
+    """Compara com o baseline e retorna a lista de regressões encontradas
+    
+    Diferenças de tempo menores que `minimo_s` são ignoradas (ruído de medição
+    em etapas muito rápidas).
+    """
+    regressoes = []
+    
+    for escala, dados in resultado['escalas'].items():
+        base_escala = baseline.get('escalas', {}).get(escala)
+        if not base_escala:
+            continue
+        
+        for etapa, medicao in dados['etapas'].items():
+            base = base_escala['etapas'].get(etapa)
+            if not base:
+                continue
+            
+            if (base['tempo_s'] > 0 and medicao['tempo_s'] > base['tempo_s'] * (1 + tolerancia)
+                    and medicao['tempo_s'] - base['tempo_s'] > minimo_s):
+                regressoes.append(
+                    f"{escala}x {etapa}: tempo {medicao['tempo_s']:.3f}s vs baseline {base['tempo_s']:.3f}s "
+                    f"(+{(medicao['tempo_s'] / base['tempo_s'] - 1) * 100:.0f}%)")
+            
+            if medicao['round_trips'] > base['round_trips']:
+                regressoes.append(
+                    f"{escala}x {etapa}: round-trips {medicao['round_trips']} vs baseline {base['round_trips']}")
+            
+            if base['pico_rss_mb'] > 0 and medicao['pico_rss_mb'] > base['pico_rss_mb'] * (1 + tolerancia):
+                regressoes.append(
+                    f"{escala}x {etapa}: pico RSS {medicao['pico_rss_mb']:.1f} MB vs baseline {base['pico_rss_mb']:.1f} MB")
+    
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de ingestão e relatórios de comissão')
+    parser.add_argument('--escalas', default='10,100', help='Escalas separadas por vírgula (ex: 10,100,1000)')
+    parser.add_argument('--uri', default=None, help='URI de um MongoDB dedicado (padrão: mongomock)')
+    parser.add_argument('--saida', default=None, help='Arquivo JSON para gravar o resultado')
+    parser.add_argument('--baseline', default=str(BASELINE_PADRAO), help='Arquivo de baseline')
+    parser.add_argument('--salvar-baseline', action='store_true', help='Grava o resultado como novo baseline')
+    parser.add_argument('--tolerancia', type=float, default=0.20, help='Tolerância de regressão (0.20 = 20%%)')
+    parser.add_argument('--minimo-ms', type=float, default=50, help='Diferença mínima de tempo para acusar regressão')
+    args = parser.parse_args()
+    
+    import logging
+    logging.disable(logging.WARNING)
+    
+    escalas = [int(e) for e in args.escalas.split(',') if e.strip()]
+    contador = ContadorRoundTrips()
+    app, mongo = criar_app(args.uri, contador)
+    
+    resultado = {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'backend': 'mongodb' if args.uri else 'mongomock',
+        'escalas': {}
+    }
+    
+    print(f"Benchmark de ingestão ({resultado['backend']})")
+    
+    with app.app_context(), tempfile.TemporaryDirectory() as pasta:
+        for escala in escalas:
+            resultado['escalas'][str(escala)] = executar_escala(escala, mongo, contador, pasta)
+    
+    if args.saida:
+        Path(args.saida).write_text(json.dumps(resultado, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"\nResultado gravado em {args.saida}")
+    
+    if args.salvar_baseline:
+        Path(args.baseline).write_text(json.dumps(resultado, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"\nBaseline gravado em {args.baseline}")
+        return 0
+    
+    if not Path(args.baseline).exists():
+        print(f"\nSem baseline em {args.baseline} (use --salvar-baseline para criar)")
+        return 0
+    
+    baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+    if baseline.get('backend') != resultado['backend']:
+        print(f"\nBaseline é de outro backend ({baseline.get('backend')}); comparação ignorada")
+        return 0
+    
+    regressoes = comparar(resultado, baseline, args.tolerancia, args.minimo_ms / 1000)
+    if regressoes:
+        print(f"\n❌ {len(regressoes)} regressão(ões) em relação ao baseline:")
+        for regressao in regressoes:
+            print(f"  - {regressao}")
+        return 1
+    
+    print("\n✅ Nenhuma regressão em relação ao baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark do cálculo paralelo por vendedor (RELATORIO_WORKERS)
+
+Gera pedidos sintéticos (vendedores, linhas com formas de VP, Valor Tabela)
+e mede RelatorioService._calcular_particionado, a etapa de resumo_comissoes
+e da simulação que roda em paralelo, com 1 processo e com cada número de
+processos pedido. Antes de medir, confere que o resultado paralelo é
+idêntico ao de um só processo.
+
+O ganho depende dos núcleos livres do servidor: com um só núcleo o cálculo
+paralelo só acrescenta o custo de iniciar os processos e copiar as matrizes.
+
+Uso:
+    python benchmarks/bench_resumo_paralelo.py
+    python benchmarks/bench_resumo_paralelo.py --pedidos 400000 --cenarios 8 --workers 1 2 4 8
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from app.services import RelatorioService  # noqa: E402
+from app.utils.centavos import para_centavos  # noqa: E402
+
+
+# =====================================================
+# Dados sintéticos
+# =====================================================
+
+def _tabela(deslocamento):
+    """Tabela de faixas normalizada (formato de ComissaoService.tabela_faixas)"""
+    faixas = []
+    for eh_interno, tipo_moto, base in ((True, 'Alta CC', 0.012), (True, 'Baixa CC', 0.015), (False, None, 0.010)):
+        for meta_min, meta_max, acrescimo in ((0, 94.999, 0), (95, 99.999, 0.003), (100, None, 0.006)):
+            faixas.append({
+                'eh_interno': eh_interno,
+                'tipo_moto': tipo_moto,
+                'meta_min': float(meta_min),
+                'meta_max': meta_max,
+                'aliquota': base + acrescimo + deslocamento
+            })
+    return faixas
+
+
+def gerar(pedidos, vendedores, cenarios, semente=42):
+    """Argumentos de _calcular_particionado para pedidos sintéticos"""
+    gerador = np.random.default_rng(semente)
+
+    linhas_pedido = gerador.integers(1, 4, pedidos)
+    pedido_linha = np.repeat(np.arange(pedidos), linhas_pedido)
+    linhas = len(pedido_linha)
+
+    # Taxas de VP de 5 formas (a primeira sem VP) em cada cenário
+    taxas_forma = np.column_stack([[0, 0.0159, 0.0199, 0.015, 0.02 + 0.001 * k] for k in range(cenarios)])
+    forma_linha = gerador.integers(0, 5, linhas)
+
+    argumentos = (
+        pedido_linha.astype(np.intp),
+        para_centavos(gerador.uniform(500, 20000, linhas).round(2)),
+        gerador.integers(1, 37, linhas).astype(np.int64),
+        taxas_forma[forma_linha],
+        para_centavos(np.where(gerador.random(pedidos) < 0.9, gerador.uniform(5000, 40000, pedidos).round(2), 0)),
+        gerador.random(pedidos) < 0.7,
+        gerador.random(pedidos) < 0.2
+    )
+    vendedor_pedido = gerador.integers(0, vendedores, pedidos).astype(np.intp)
+    tabelas = [_tabela(0.001 * k) for k in range(cenarios)]
+    return argumentos, vendedor_pedido, tabelas
+
+
+# =====================================================
+# Medição
+# =====================================================
+
+def medir(argumentos, vendedor_pedido, tabelas, workers, rodadas):
+    """Melhor tempo (s) de N rodadas e o resultado da última"""
+    tempos = []
+    for _ in range(rodadas):
+        inicio = time.perf_counter()
+        calculo = RelatorioService._calcular_particionado(argumentos, vendedor_pedido, tabelas, workers)
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), calculo
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do cálculo paralelo por vendedor')
+    parser.add_argument('--pedidos', type=int, default=200000, help='Pedidos sintéticos')
+    parser.add_argument('--vendedores', type=int, default=120, help='Vendedores')
+    parser.add_argument('--cenarios', type=int, default=4, help='Configurações (K) calculadas juntas, como na simulação')
+    parser.add_argument('--workers', type=int, nargs='+', help='Processos a medir (padrão: 2, 4... até o nº de CPUs)')
+    parser.add_argument('--rodadas', type=int, default=3, help='Rodadas por medição (vale a melhor)')
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    workers = args.workers or [2 ** i for i in range(1, cpus.bit_length()) if 2 ** i <= cpus] or [2]
+
+    argumentos, vendedor_pedido, tabelas = gerar(args.pedidos, args.vendedores, args.cenarios)
+    print(f"{args.pedidos} pedido(s), {len(argumentos[0])} linha(s), {args.vendedores} vendedor(es), "
+          f"{args.cenarios} cenário(s), {cpus} CPU(s)")
+
+    base, esperado = medir(argumentos, vendedor_pedido, tabelas, 1, args.rodadas)
+
+    print(f"{'processos':>10} {'partições':>10} {'tempo (ms)':>12} {'ganho':>8}")
+    print(f"{1:>10} {1:>10} {base * 1000:>12.1f} {1:>7.2f}x")
+
+    for quantidade in workers:
+        particoes = min(quantidade, args.pedidos // RelatorioService.PEDIDOS_POR_PROCESSO_MIN, args.vendedores)
+        tempo, calculo = medir(argumentos, vendedor_pedido, tabelas, quantidade, args.rodadas)
+
+        # Mesmo resultado que o cálculo num só processo
+        for chave, matriz in esperado.items():
+            assert np.array_equal(matriz, calculo[chave], equal_nan=True), chave
+
+        print(f"{quantidade:>10} {max(particoes, 1):>10} {tempo * 1000:>12.1f} {base / tempo:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Teste de carga HTTP
+
+Dispara requisições concorrentes contra uma instância em execução e mede
+throughput (req/s) e latência (p50/p95/p99) por rota. Serve para comparar os
+modos do gunicorn (GUNICORN_WORKER_CLASS=sync x gevent) com a mesma base:
+    
+    GUNICORN_WORKER_CLASS=sync gunicorn --config gunicorn.conf.py run:app
+    python benchmarks/carga_http.py --saida /tmp/sync.json
+    
+    GUNICORN_WORKER_CLASS=gevent gunicorn --config gunicorn.conf.py run:app
+    python benchmarks/carga_http.py --saida /tmp/gevent.json --comparar /tmp/sync.json
+
+Por padrão só usa rotas de leitura (cadastros e relatórios). Com --pdf, parte
+dos clientes chama POST /api/comissoes/processar, que GRAVA as comissões do
+período no banco e gera o PDF: use apenas em bancos de teste.
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+ROTAS_PADRAO = [
+    '/api/vendedores',
+    '/api/motos',
+    '/api/formas-recebimento',
+    '/api/resumo/vendedor',
+    '/api/resumo/cidade',
+]
+
+ROTA_PDF = '/api/comissoes/processar'
+
+
+def _requisitar(url, metodo):
+    """Executa uma requisição e retorna (status, segundos)"""
+    inicio = time.perf_counter()
+    try:
+        requisicao = urllib.request.Request(url, method=metodo, data=b'' if metodo == 'POST' else None)
+        with urllib.request.urlopen(requisicao, timeout=120) as resposta:
+            resposta.read()
+            status = resposta.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = 0
+    return status, time.perf_counter() - inicio
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def executar(base, rotas, concorrencia, duracao, clientes_pdf):
+    """Roda a carga e retorna o resumo por rota
+    
+    Os primeiros 'clientes_pdf' clientes repetem só a rota de PDF; os demais
+    percorrem as rotas de leitura em sequência.
+    """
+    amostras = {}
+    lock = threading.Lock()
+    fim = time.perf_counter() + duracao
+    
+    def cliente(indice):
+        if indice < clientes_pdf:
+            sequencia = [('POST', ROTA_PDF)]
+        else:
+            # Desloca o início para os clientes não baterem na mesma rota juntos
+            sequencia = [('GET', rota) for rota in rotas[indice % len(rotas):] + rotas[:indice % len(rotas)]]
+        
+        locais = {}
+        i = 0
+        while time.perf_counter() < fim:
+            metodo, rota = sequencia[i % len(sequencia)]
+            status, segundos = _requisitar(base + rota, metodo)
+            locais.setdefault(rota, []).append((status, segundos))
+            i += 1
+        
+        with lock:
+            for rota, lista in locais.items():
+                amostras.setdefault(rota, []).extend(lista)
+    
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=cliente, args=(i,), daemon=True) for i in range(concorrencia)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    decorrido = time.perf_counter() - inicio
+    
+    resultado = {'rotas': {}, 'total': {}}
+    total_ok = total_erros = 0
+    for rota, lista in sorted(amostras.items()):
+        tempos = [s for status, s in lista if 200 <= status < 400]
+        erros = len(lista) - len(tempos)
+        total_ok += len(tempos)
+        total_erros += erros
+        resultado['rotas'][rota] = {
+            'requisicoes': len(tempos),
+            'erros': erros,
+            'req_por_s': round(len(tempos) / decorrido, 1),
+            'p50_ms': round(_percentil(tempos, 50) * 1000, 1),
+            'p95_ms': round(_percentil(tempos, 95) * 1000, 1),
+            'p99_ms': round(_percentil(tempos, 99) * 1000, 1),
+        }
+    
+    resultado['total'] = {
+        'requisicoes': total_ok,
+        'erros': total_erros,
+        'req_por_s': round(total_ok / decorrido, 1),
+        'duracao_s': round(decorrido, 1),
+    }
+    return resultado
+
+
+def imprimir(resultado, anterior=None):
+    print(f"{'rota':<28} {'req':>7} {'erros':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for rota, dados in resultado['rotas'].items():
+        print(
+            f"{rota:<28} {dados['requisicoes']:>7} {dados['erros']:>6} {dados['req_por_s']:>8.1f} "
+            f"{dados['p50_ms']:>8.1f} {dados['p95_ms']:>8.1f} {dados['p99_ms']:>8.1f}"
+        )
+    
+    total = resultado['total']
+    print(f"\nTotal: {total['requisicoes']} requisições, {total['erros']} erros, {total['req_por_s']} req/s")
+    
+    if anterior:
+        base = anterior['total']['req_por_s']
+        if base:
+            print(f"Comparado a {anterior.get('rotulo') or 'execução anterior'}: "
+                  f"{base} -> {total['req_por_s']} req/s ({total['req_por_s'] / base:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga HTTP da aplicação de comissão')
+    parser.add_argument('--url', default='http://localhost:5000', help='Endereço da aplicação')
+    parser.add_argument('--concorrencia', type=int, default=32, help='Clientes simultâneos')
+    parser.add_argument('--duracao', type=float, default=20, help='Duração em segundos')
+    parser.add_argument('--rotas', default=','.join(ROTAS_PADRAO), help='Rotas GET separadas por vírgula')
+    parser.add_argument('--pdf', type=int, default=0, help='Clientes gerando PDF (GRAVA comissões no banco)')
+    parser.add_argument('--rotulo', default='', help='Nome da execução (ex: sync, gevent)')
+    parser.add_argument('--saida', default=None, help='Arquivo JSON para gravar o resultado')
+    parser.add_argument('--comparar', default=None, help='Resultado JSON anterior para comparar o throughput')
+    args = parser.parse_args()
+    
+    rotas = [r.strip() for r in args.rotas.split(',') if r.strip()]
+    if args.pdf >= args.concorrencia:
+        parser.error('--pdf precisa ser menor que --concorrencia')
+    
+    print(f"Carga em {args.url}: {args.concorrencia} clientes ({args.pdf} gerando PDF) por {args.duracao:.0f}s\n")
+    resultado = executar(args.url.rstrip('/'), rotas, args.concorrencia, args.duracao, args.pdf)
+    resultado.update({
+        'rotulo': args.rotulo,
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'concorrencia': args.concorrencia,
+        'clientes_pdf': args.pdf,
+    })
+    
+    anterior = None
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            anterior = json.load(f)
+    
+    imprimir(resultado, anterior)
+    
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"\nResultado gravado em {args.saida}")
+    
+    return 1 if resultado['total']['erros'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
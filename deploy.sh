@@ -145,11 +145,9 @@ User=$USER
 Group=$GROUP
 WorkingDirectory=$APP_DIR
 Environment="PATH=$APP_DIR/venv/bin"
+Environment="PROMETHEUS_MULTIPROC_DIR=/tmp/comissao_metricas"
 ExecStart=$APP_DIR/venv/bin/gunicorn \\
-    --workers 4 \\
-    --worker-class sync \\
-    --bind 0.0.0.0:5000 \\
-    --timeout 120 \\
+    --config $APP_DIR/gunicorn.conf.py \\
     --access-logfile $APP_DIR/logs/access.log \\
     --error-logfile $APP_DIR/logs/error.log \\
     run:app
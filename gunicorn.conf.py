@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Configuração do gunicorn
+
+Modo de atendimento (GUNICORN_WORKER_CLASS):
+- gevent (padrão): cada worker atende até GUNICORN_WORKER_CONNECTIONS
+  requisições ao mesmo tempo, alternando entre elas nas esperas de I/O
+  (MongoDB). O gunicorn aplica o monkey patching do gevent antes de carregar
+  a aplicação, o que torna o pymongo cooperativo. PDF e parsing de CSV rodam
+  fora do loop (app/utils/executor.py).
+- sync: uma requisição por worker (comportamento anterior).
+
+Também prepara o diretório compartilhado das métricas Prometheus para que o
+/metrics agregue os valores de todos os workers.
+"""
+
+import os
+import shutil
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+# WORKERS: nome usado no docker-compose.yml e no .env
+workers = int(os.getenv('GUNICORN_WORKERS', os.getenv('WORKERS', 4)))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 100))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+
+# Precisa estar definida antes de qualquer import do prometheus_client
+PROMETHEUS_MULTIPROC_DIR = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/comissao_metricas')
+
+
+def on_starting(server):
+    """Limpa as métricas de execuções anteriores ao subir o master"""
+    shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Descarta os valores 'ao vivo' de um worker encerrado"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)